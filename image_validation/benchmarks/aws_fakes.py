@@ -0,0 +1,225 @@
+"""In-process fakes for the AWS services the handlers call, with injected latency and errors.
+
+Each fake sleeps for a latency drawn from a log-normal distribution and
+fails a configurable fraction of calls with the service's throttling error,
+so handlers can be driven at realistic speeds without deploying. Batch
+DynamoDB operations return items as unprocessed instead of failing outright,
+as the real service does under throttling.
+
+    fakes = install({"s3": parse_latency("15:0.4"), "dynamodb": parse_latency("6:0.3:0.01")})
+"""
+import io
+import os
+import sys
+import json
+import math
+import time
+import base64
+import random
+import hashlib
+import threading
+import types
+from collections import Counter
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'infra'))
+
+from utils.aws_clients import register_client, register_resource
+
+class FakeServiceError(Exception):
+    """Shaped like botocore's ClientError: the error code is in `response['Error']['Code']`."""
+
+    def __init__(self, code, operation):
+        super().__init__(f"An error occurred ({code}) when calling the {operation} operation (injected)")
+        self.response = {"Error": {"Code": code, "Message": "injected"}}
+
+class NoSuchKey(FakeServiceError):
+    def __init__(self, operation):
+        super().__init__("NoSuchKey", operation)
+
+class LatencyModel:
+    """Log-normal latency with a given median and shape, plus an error rate."""
+
+    def __init__(self, median_ms=10.0, sigma=0.3, error_rate=0.0):
+        self.median_ms = median_ms
+        self.sigma = sigma
+        self.error_rate = error_rate
+
+    def sample(self, rng):
+        return self.median_ms * math.exp(rng.gauss(0, self.sigma)) / 1000
+
+    def describe(self):
+        return {"median_ms": self.median_ms, "sigma": self.sigma, "error_rate": self.error_rate}
+
+def parse_latency(spec):
+    """Parses "median_ms[:sigma[:error_rate]]", e.g. "40:0.5:0.01"."""
+    values = [float(v) for v in spec.split(':')]
+    return LatencyModel(*values)
+
+def person_score(data):
+    # Deterministic per image, so repeated images get repeated verdicts
+    return int.from_bytes(hashlib.sha256(data).digest()[:2], 'big') / 65535
+
+class FakeService:
+    throttle_code = "ThrottlingException"
+
+    def __init__(self, model=None, seed=0):
+        self.model = model or LatencyModel()
+        self.calls = Counter()
+        self.errors = Counter()
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _call(self, operation, latency_scale=1.0):
+        with self._lock:
+            self.calls[operation] += 1
+            delay = self.model.sample(self._rng) * latency_scale
+            failed = self._rng.random() < self.model.error_rate
+            if failed:
+                self.errors[operation] += 1
+        time.sleep(delay)
+        if failed:
+            raise FakeServiceError(self.throttle_code, operation)
+
+    def _unprocessed(self):
+        # Per-item throttling for batch operations
+        with self._lock:
+            return self._rng.random() < self.model.error_rate
+
+    def stats(self):
+        return {"calls": dict(self.calls), "errors": dict(self.errors)}
+
+class FakeS3(FakeService):
+    throttle_code = "SlowDown"
+    # Mirrors client.exceptions, which callers use to catch missing keys
+    exceptions = types.SimpleNamespace(NoSuchKey=NoSuchKey)
+
+    def __init__(self, model=None, seed=0):
+        super().__init__(model, seed)
+        self.objects = {}
+
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        self._call("PutObject")
+        self.objects[(Bucket, Key)] = bytes(Body)
+        return {"ETag": '"' + hashlib.md5(self.objects[(Bucket, Key)]).hexdigest() + '"'}
+
+    def get_object(self, Bucket, Key, Range=None, **kwargs):
+        self._call("GetObject")
+        if (Bucket, Key) not in self.objects:
+            raise NoSuchKey("GetObject")
+        data = self.objects[(Bucket, Key)]
+        if Range is None:
+            return {"Body": io.BytesIO(data)}
+        # Only the "bytes=start-end" form the handlers send
+        start, end = (int(v) for v in Range[len("bytes="):].split('-'))
+        end = min(end, len(data) - 1)
+        return {"Body": io.BytesIO(data[start:end + 1]), "ContentRange": f"bytes {start}-{end}/{len(data)}"}
+
+class FakeSageMakerRuntime(FakeService):
+    """Answers single-image and {"instances": [...]} batch invocations; batches cost 20% more per extra image."""
+
+    def invoke_endpoint(self, EndpointName, Body, ContentType, Accept=None, **kwargs):
+        if ContentType == 'application/json':
+            images = [base64.b64decode(i["b64"]) for i in json.loads(Body)["instances"]]
+        else:
+            images = [bytes(Body)]
+        self._call("InvokeEndpoint", latency_scale=1 + 0.2 * (len(images) - 1))
+
+        predictions = [[{"class": "person", "confidence": person_score(image)}] for image in images]
+        body = {"predictions": predictions if ContentType == 'application/json' else predictions[0]}
+        return {"Body": io.BytesIO(json.dumps(body).encode())}
+
+class FakeRekognition(FakeService):
+    def __init__(self, model=None, seed=0, s3=None):
+        super().__init__(model, seed)
+        self.s3 = s3
+
+    def detect_labels(self, Image, **kwargs):
+        self._call("DetectLabels")
+        if "Bytes" in Image:
+            data = Image["Bytes"]
+        else:
+            data = self.s3.objects[(Image["S3Object"]["Bucket"], Image["S3Object"]["Name"])]
+        # Independent of the SageMaker score, so the two backends disagree some of the time
+        score = person_score(data[::-1])
+        return {"Labels": [{"Name": "Person", "Confidence": score * 100}] if score >= 0.5 else []}
+
+class FakeTable:
+    def __init__(self, service, name):
+        self.service = service
+        self.name = name
+        self.key = None
+        self.items = {}
+
+    def _key(self, key_or_item):
+        # Without a configured key attribute, the first attribute of the first Key or Item is used
+        if self.key is None:
+            self.key = next(iter(key_or_item))
+        return key_or_item[self.key]
+
+    def put_item(self, Item, **kwargs):
+        self.service._call("PutItem")
+        self.items[self._key(Item)] = Item
+        return {}
+
+    def get_item(self, Key, **kwargs):
+        self.service._call("GetItem")
+        item = self.items.get(self._key(Key))
+        return {"Item": item} if item is not None else {}
+
+class FakeDynamoDB(FakeService):
+    throttle_code = "ProvisionedThroughputExceededException"
+
+    def __init__(self, model=None, seed=0, key_attributes=None):
+        super().__init__(model, seed)
+        self.key_attributes = key_attributes or {}
+        self.tables = {}
+
+    def Table(self, name):
+        table = self.tables.get(name)
+        if table is None:
+            table = self.tables[name] = FakeTable(self, name)
+            table.key = self.key_attributes.get(name)
+        return table
+
+    def batch_write_item(self, RequestItems):
+        self._call("BatchWriteItem")
+        unprocessed = {}
+        for name, requests in RequestItems.items():
+            table = self.Table(name)
+            for request in requests:
+                if self._unprocessed():
+                    unprocessed.setdefault(name, []).append(request)
+                    continue
+                item = request["PutRequest"]["Item"]
+                table.items[table._key(item)] = item
+        return {"UnprocessedItems": unprocessed}
+
+    def batch_get_item(self, RequestItems):
+        self._call("BatchGetItem")
+        responses, unprocessed = {}, {}
+        for name, request in RequestItems.items():
+            table = self.Table(name)
+            for key in request["Keys"]:
+                if self._unprocessed():
+                    unprocessed.setdefault(name, {"Keys": []})["Keys"].append(key)
+                    continue
+                item = table.items.get(table._key(key))
+                if item is not None:
+                    responses.setdefault(name, []).append(item)
+        return {"Responses": responses, "UnprocessedKeys": unprocessed}
+
+def install(models, seed=0, key_attributes=None):
+    """Registers fakes for every service the handlers use. Returns them by service name."""
+    s3 = FakeS3(models.get("s3"), seed)
+    fakes = {
+        "s3": s3,
+        "sagemaker-runtime": FakeSageMakerRuntime(models.get("sagemaker-runtime"), seed + 1),
+        "rekognition": FakeRekognition(models.get("rekognition"), seed + 2, s3=s3),
+        "dynamodb": FakeDynamoDB(models.get("dynamodb"), seed + 3, key_attributes)
+    }
+    for name, fake in fakes.items():
+        if name == "dynamodb":
+            register_resource(name, fake)
+        else:
+            register_client(name, fake)
+    return fakes
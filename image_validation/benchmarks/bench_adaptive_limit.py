@@ -0,0 +1,160 @@
+"""Measures goodput of Rekognition calls under bursty overload, with and without the adaptive limiter.
+
+The fake service serves at most `--capacity` calls at once, each taking
+about `--latency-ms`; calls beyond that are rejected with
+ThrottlingException, like an account TPS limit. Requests arrive open-loop,
+alternating between bursts above capacity and lulls below it, so the
+average load is about what the service can sustain.
+
+Without the limiter, every call over capacity during a burst fails. With
+it, excess calls wait for a slot and are served in the following lull;
+only calls that would wait past the queue timeout are shed.
+
+Usage: python benchmarks/bench_adaptive_limit.py --capacity 8 --burst-load 1.6 --lull-load 0.4
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCHMARKS)
+sys.path.insert(0, os.path.join(BENCHMARKS, '..', 'infra'))
+
+import logging
+logging.disable(logging.ERROR)
+
+import adaptive_limit
+import rekognition_infer
+from aws_fakes import FakeServiceError
+from utils.aws_clients import register_client
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(round(p / 100 * (len(sorted_values) - 1))))]
+
+class CapacityLimitedRekognition:
+    """Serves `capacity` concurrent DetectLabels calls; the rest are throttled after `reject_ms`."""
+
+    def __init__(self, capacity, latency_ms, reject_ms=2.0, seed=0):
+        self.capacity = capacity
+        self.latency_ms = latency_ms
+        self.reject_ms = reject_ms
+        self.in_flight = 0
+        self.calls = 0
+        self.throttled = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def detect_labels(self, Image, **kwargs):
+        with self._lock:
+            self.calls += 1
+            admitted = self.in_flight < self.capacity
+            if admitted:
+                self.in_flight += 1
+            else:
+                self.throttled += 1
+            delay = self.latency_ms * self._rng.uniform(0.8, 1.2)
+        if not admitted:
+            time.sleep(self.reject_ms / 1000)
+            raise FakeServiceError("ThrottlingException", "DetectLabels")
+        try:
+            time.sleep(delay / 1000)
+            return {"Labels": [{"Name": "Person", "Confidence": 90.0}]}
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+class FakePayload:
+    def rekognition_image(self):
+        return {"Bytes": b"image"}
+
+def arrivals(args):
+    """Arrival offsets in seconds: alternating burst and lull phases of `--phase-seconds` each."""
+    capacity_rps = args.capacity / (args.latency_ms / 1000)
+    offsets, t = [], 0.0
+    phase = 0
+    while t < args.duration:
+        rate = capacity_rps * (args.burst_load if phase % 2 == 0 else args.lull_load)
+        end = min(args.duration, (phase + 1) * args.phase_seconds)
+        while t < end:
+            offsets.append(t)
+            t += 1 / rate
+        phase += 1
+    return offsets
+
+def run(limiting, args):
+    service = CapacityLimitedRekognition(args.capacity, args.latency_ms, seed=args.seed)
+    register_client('rekognition', service)
+    adaptive_limit.ADAPTIVE_LIMIT_ENABLED = limiting
+    adaptive_limit._limiters.clear()
+    adaptive_limit.LIMIT_QUEUE_TIMEOUT_MS = args.queue_timeout_ms
+
+    outcomes = {"ok": 0, "error": 0, "unavailable": 0}
+    latencies = []
+    lock = threading.Lock()
+    payload = FakePayload()
+
+    def one(scheduled):
+        score = rekognition_infer.classify_with_rekognition(payload)
+        elapsed = time.perf_counter() - scheduled
+        with lock:
+            key = score if isinstance(score, str) else "ok"
+            outcomes[key] += 1
+            if key == "ok":
+                latencies.append(elapsed)
+
+    offsets = arrivals(args)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.max_threads) as pool:
+        for offset in offsets:
+            delay = start + offset - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            pool.submit(one, start + offset)
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    limiter = adaptive_limit._limiters.get('Rekognition')
+    return {
+        "limiting": limiting,
+        "requests": len(offsets),
+        "succeeded": outcomes["ok"],
+        "failed": outcomes["error"],
+        "shed": outcomes["unavailable"],
+        "goodput_rps": round(outcomes["ok"] / elapsed, 1),
+        "success_ratio": round(outcomes["ok"] / len(offsets), 3),
+        "service_calls": service.calls,
+        "service_throttles": service.throttled,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 1),
+        "final_limit": round(limiter.limit, 1) if limiter else None
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the adaptive concurrency limiter under bursty overload")
+    parser.add_argument("--capacity", type=int, default=8, help="Concurrent calls the service admits")
+    parser.add_argument("--latency-ms", type=float, default=50)
+    parser.add_argument("--burst-load", type=float, default=1.6, help="Offered load during bursts, as a multiple of capacity")
+    parser.add_argument("--lull-load", type=float, default=0.4)
+    parser.add_argument("--phase-seconds", type=float, default=1.0)
+    parser.add_argument("--duration", type=float, default=8.0)
+    parser.add_argument("--queue-timeout-ms", type=float, default=2000)
+    parser.add_argument("--max-threads", type=int, default=512)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    report = [run(False, args), run(True, args)]
+    for row in report:
+        print(f"limiting={str(row['limiting']):<5} goodput={row['goodput_rps']:>6}/s success={row['success_ratio']:>5} "
+              f"failed={row['failed']:>4} shed={row['shed']:>4} service calls={row['service_calls']:>5} "
+              f"throttles={row['service_throttles']:>5} p50={row['p50_ms']:>6}ms p99={row['p99_ms']:>6}ms")
+    print(json.dumps(report))
+
+if __name__ == "__main__":
+    main()
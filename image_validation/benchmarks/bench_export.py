@@ -0,0 +1,282 @@
+"""Throughput of tools/export_results.py against a synthetic million-row results table.
+
+The table is an in-process stand-in for DynamoDB that generates items on
+demand from their position, so a million rows cost no memory. It serves
+parallel Scan segments and HumanDay index queries in 1 MB pages, each page
+taking a log-normal service time like the real service. The benchmark:
+
+  scaling      full exports with each --segments value, in rows/s
+  resume       an export that fails partway, then resumes; the output must
+               hold every row exactly once
+  incremental  an export --since a few days back, which must read only the
+               index partitions in the window and match the expected count
+
+Usage: python benchmarks/bench_export.py --rows 1000000 --segments 1,4,16
+       python benchmarks/bench_export.py --rows 200000 --format parquet   (needs pyarrow)
+"""
+import os
+import sys
+import glob
+import gzip
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import threading
+import resource
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'tools'))
+
+from aws_fakes import FakeService, parse_latency
+from utils import result_schema
+from utils.aws_clients import register_resource
+
+import export_results
+
+# DynamoDB returns at most 1 MB per Scan or Query page
+PAGE_BYTES = 1024 * 1024
+TABLE = 'results'
+
+class SyntheticResultsTable:
+    """Results table of `rows` generated items, stored evenly over `days` days ending at `end`.
+
+    Item i is a copy of one of a few hundred encoded templates with its own
+    key and timestamp. Scan segments are contiguous ranges of positions;
+    index queries walk the positions whose timestamps fall in the range.
+    """
+
+    def __init__(self, service, rows, days, end, templates=499):
+        self.service = service
+        self.rows = rows
+        self.end_ms = int(end.timestamp() * 1000)
+        self.start_ms = self.end_ms - days * 86400 * 1000
+        self.step_ms = (self.end_ms - self.start_ms) / rows
+        self.templates = [self._template(t) for t in range(templates)]
+        self.item_bytes = len(json.dumps(result_schema.from_dynamodb(
+            {k: v for k, v in self.templates[0].items() if k != "ch"}))) + 32
+        self.page_items = PAGE_BYTES // self.item_bytes
+        self.fail_after_pages = None
+        self._pages = 0
+        self._lock = threading.Lock()
+
+    def _template(self, t):
+        sagemaker, rekognition = (t * 7919 % 1000) / 1000, (t * 104729 % 1000) / 1000
+        labels = ["human" if s >= 0.5 else "not_human" for s in (sagemaker, rekognition)]
+        result = {
+            "image_id": "", "content_hash": f"{t:064x}", "confidence": 0.85 if labels[0] == labels[1] else 0.5,
+            "sagemaker_result": labels[0], "sagemaker_score": sagemaker,
+            "rekognition_result": labels[1], "rekognition_score": rekognition,
+            "agreement": labels[0] == labels[1], "is_human": "human" in labels, "timed_out": []
+        }
+        return result_schema.encode(result, stored_at=0)
+
+    def key(self, position):
+        return f"synthetic/{position:08d}.jpg"
+
+    def is_human(self, position):
+        return self.templates[position % len(self.templates)]["hd"].startswith("1#")
+
+    def timestamp(self, position):
+        return int(self.start_ms + position * self.step_ms)
+
+    def item(self, position):
+        item = dict(self.templates[position % len(self.templates)])
+        ts = self.timestamp(position)
+        item.update({
+            result_schema.KEY_ATTRIBUTE: self.key(position),
+            "ts": ts,
+            "hd": result_schema.human_day(self.is_human(position), result_schema.day(ts)),
+            "exp": ts // 1000 + 90 * 86400
+        })
+        return item
+
+    def _page(self, operation, positions, limit):
+        with self._lock:
+            self._pages += 1
+            if self.fail_after_pages is not None and self._pages > self.fail_after_pages:
+                raise RuntimeError("Injected failure")
+        limit = min(limit or self.page_items, self.page_items)
+        items, last = [], None
+        for position in positions:
+            items.append(self.item(position))
+            last = position
+            if len(items) == limit:
+                break
+        self.service._call(operation, latency_scale=max(len(items), 1) / self.page_items)
+        response = {"Items": items}
+        if len(items) == limit:
+            # Like DynamoDB, a full page returns a key even when nothing follows it
+            response["LastEvaluatedKey"] = {result_schema.KEY_ATTRIBUTE: self.key(last), "ts": self.timestamp(last)}
+        return response
+
+    def _position(self, key):
+        return int(key[result_schema.KEY_ATTRIBUTE].split('/')[1].split('.')[0])
+
+    def scan(self, Segment, TotalSegments, ExclusiveStartKey=None, Limit=None, **kwargs):
+        first = self.rows * Segment // TotalSegments
+        end = self.rows * (Segment + 1) // TotalSegments
+        if ExclusiveStartKey:
+            first = self._position(ExclusiveStartKey) + 1
+        return self._page("Scan", range(first, end), Limit)
+
+    def query(self, IndexName, KeyConditionExpression, ExclusiveStartKey=None, Limit=None, **kwargs):
+        # Only the export's shape: hd = :partition AND ts BETWEEN :since AND :until, ascending
+        partition_condition, range_condition = KeyConditionExpression.get_expression()['values']
+        partition = partition_condition.get_expression()['values'][1]
+        since_ms, until_ms = range_condition.get_expression()['values'][1:]
+        human, day = partition.split('#')
+        day_ms = int(datetime.strptime(day, '%Y-%m-%d').replace(tzinfo=timezone.utc).timestamp() * 1000)
+        low, high = max(since_ms, day_ms), min(until_ms, day_ms + 86400 * 1000 - 1)
+
+        first = min(self.rows, max(0, int((low - self.start_ms) / self.step_ms) - 1))
+        if ExclusiveStartKey:
+            first = self._position(ExclusiveStartKey) + 1
+        return self._page("Query", self._partition(first, low, high, human == '1'), Limit)
+
+    def _partition(self, first, low, high, human):
+        # Positions are in timestamp order, so the walk stops past the window
+        for position in range(first, self.rows):
+            ts = self.timestamp(position)
+            if ts > high:
+                return
+            if ts >= low and self.is_human(position) == human:
+                yield position
+
+    def count_between(self, since_ms, until_ms):
+        first = max(0, int((since_ms - self.start_ms) / self.step_ms) - 1)
+        count = 0
+        for position in range(first, self.rows):
+            ts = self.timestamp(position)
+            if ts > until_ms:
+                break
+            count += ts >= since_ms
+        return count
+
+class SyntheticDynamoDB(FakeService):
+    throttle_code = "ProvisionedThroughputExceededException"
+
+    def __init__(self, model, rows, days, end, seed=0):
+        super().__init__(model, seed)
+        self.table = SyntheticResultsTable(self, rows, days, end)
+
+    def Table(self, name):
+        return self.table
+
+def read_ids(output):
+    """Image IDs in every JSON-lines shard of an export (Parquet shards are counted from the manifest)."""
+    ids = []
+    for path in sorted(glob.glob(os.path.join(output, '*.jsonl.gz'))):
+        with gzip.open(path, 'rt') as f:
+            ids.extend(json.loads(line)["image_id"] for line in f)
+    return ids
+
+def check_output(output, fmt, expected):
+    manifest = json.load(open(os.path.join(output, export_results.MANIFEST_FILE)))
+    ok = manifest["rows"] == expected
+    if fmt == 'jsonl':
+        ids = read_ids(output)
+        ok = ok and len(ids) == expected and len(set(ids)) == expected
+    return ok, manifest
+
+def bench_scaling(fake, segment_counts, args, workdir):
+    rows = []
+    for segments in segment_counts:
+        output = os.path.join(workdir, f'full-{segments}')
+        fake.calls.clear()
+        start = time.perf_counter()
+        export_results.run_export(TABLE, output, segments=segments, fmt=args.format,
+                                  processes=args.processes, shard_rows=args.shard_rows)
+        elapsed = time.perf_counter() - start
+        ok, manifest = check_output(output, args.format, args.rows)
+        rows.append({
+            "segments": segments,
+            "seconds": round(elapsed, 2),
+            "rows_per_second": round(args.rows / elapsed),
+            "pages": manifest["pages"],
+            "shards": len(manifest["shards"]),
+            "output_bytes": sum(os.path.getsize(os.path.join(output, s)) for s in manifest["shards"]),
+            "complete": ok
+        })
+        shutil.rmtree(output)
+    return rows
+
+def bench_resume(fake, args, workdir):
+    output = os.path.join(workdir, 'resume')
+    table = fake.table
+    # Fail roughly halfway through
+    table._pages, table.fail_after_pages = 0, max(1, args.rows // table.page_items // 2)
+    # Small shards, so segments checkpoint several times before the failure
+    shard_rows = table.page_items * 2
+    try:
+        export_results.run_export(TABLE, output, segments=args.resume_segments, fmt=args.format,
+                                  shard_rows=shard_rows)
+        failed = False
+    except RuntimeError:
+        failed = True
+    checkpointed = sum(json.load(open(p))["rows"] for p in glob.glob(os.path.join(output, export_results.CHECKPOINT_DIR, '*.json')))
+    table.fail_after_pages = None
+    export_results.run_export(TABLE, output, segments=args.resume_segments, fmt=args.format, shard_rows=shard_rows)
+    ok, manifest = check_output(output, args.format, args.rows)
+    shutil.rmtree(output)
+    return {"failed_first_run": failed, "rows_checkpointed_before_failure": checkpointed,
+            "pages_after_resume": manifest["pages"], "complete": ok}
+
+def bench_incremental(fake, args, workdir):
+    output = os.path.join(workdir, 'incremental')
+    since = datetime.now(timezone.utc) - timedelta(days=args.since_days)
+    fake.calls.clear()
+    start = time.perf_counter()
+    manifest = export_results.run_export(TABLE, output, fmt=args.format, since=since, shard_rows=args.shard_rows)
+    elapsed = time.perf_counter() - start
+    until = datetime.fromisoformat(manifest["until"])
+    expected = fake.table.count_between(int(since.timestamp() * 1000), int(until.timestamp() * 1000))
+    ok, manifest = check_output(output, args.format, expected)
+    shutil.rmtree(output)
+    return {"since_days": args.since_days, "rows": manifest["rows"], "expected": expected,
+            "partitions": manifest["units"], "pages": manifest["pages"], "seconds": round(elapsed, 2), "complete": ok}
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the results exporter on a synthetic table")
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument("--days", type=int, default=30, help="Days the synthetic results are spread over")
+    parser.add_argument("--segments", default="1,4,16")
+    parser.add_argument("--resume-segments", type=int, default=8)
+    parser.add_argument("--since-days", type=float, default=3)
+    parser.add_argument("--format", choices=["jsonl", "parquet"], default="jsonl")
+    parser.add_argument("--processes", action="store_true")
+    parser.add_argument("--shard-rows", type=int, default=export_results.SHARD_ROWS)
+    parser.add_argument("--page-latency", default="120:0.3", help="Service time of a full 1 MB page, median_ms[:sigma]")
+    args = parser.parse_args()
+
+    import logging
+    logging.disable(logging.INFO)
+    fake = SyntheticDynamoDB(parse_latency(args.page_latency), args.rows, args.days, datetime.now(timezone.utc))
+    register_resource('dynamodb', fake)
+
+    workdir = tempfile.mkdtemp(prefix='bench-export-')
+    try:
+        report = {
+            "rows": args.rows,
+            "format": args.format,
+            "items_per_page": fake.table.page_items,
+            "cpus": os.cpu_count(),
+            "scaling": bench_scaling(fake, [int(s) for s in args.segments.split(',')], args, workdir),
+            "resume": bench_resume(fake, args, workdir),
+            "incremental": bench_incremental(fake, args, workdir),
+            "max_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024)
+        }
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    for row in report["scaling"]:
+        print(f"segments {row['segments']:>3}: {row['seconds']:>7} s  {row['rows_per_second']:>8} rows/s  "
+              f"{row['pages']} pages, {row['shards']} shards, {row['output_bytes'] / 1e6:.1f} MB, complete={row['complete']}")
+    print(f"resume: {json.dumps(report['resume'])}")
+    print(f"incremental: {json.dumps(report['incremental'])}")
+    print(f"max RSS {report['max_rss_mb']} MB")
+    print(json.dumps(report))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""Verifies SageMaker micro-batching against a local fake endpoint and measures its effect.
+
+The fake endpoint charges a fixed per-invocation cost plus a smaller
+per-image cost, like a detector container scoring a batch on one GPU.
+Each image encodes its expected score, so the benchmark also checks that
+every caller gets its own prediction back.
+
+Usage: python benchmarks/bench_microbatch.py --requests 400 --concurrency 32
+"""
+import io
+import os
+import sys
+import json
+import time
+import base64
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'infra'))
+
+import sagemaker_infer
+from utils.aws_clients import register_client
+
+class FakeEndpoint:
+    """Stands in for the sagemaker-runtime client; the score of an image is its first byte / 255."""
+
+    def __init__(self, invocation_ms, per_image_ms):
+        self.invocation_ms = invocation_ms
+        self.per_image_ms = per_image_ms
+        self.invocations = 0
+        self.images = 0
+        self.busy_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def invoke_endpoint(self, EndpointName, ContentType, Body, Accept=None):
+        if ContentType == 'application/json':
+            images = [base64.b64decode(i["b64"]) for i in json.loads(Body)["instances"]]
+        else:
+            images = [Body]
+
+        cost = (self.invocation_ms + self.per_image_ms * len(images)) / 1000
+        time.sleep(cost)
+        with self._lock:
+            self.invocations += 1
+            self.images += len(images)
+            self.busy_seconds += cost
+
+        predictions = [[{"class": "person", "confidence": image[0] / 255}] for image in images]
+        body = {"predictions": predictions if ContentType == 'application/json' else predictions[0]}
+        return {"Body": io.BytesIO(json.dumps(body).encode())}
+
+class FakePayload:
+    def __init__(self, data):
+        self.data = data
+
+    def inference_bytes(self):
+        return self.data
+
+def run(batching, args):
+    endpoint = FakeEndpoint(args.invocation_ms, args.per_image_ms)
+    register_client('sagemaker-runtime', endpoint)
+    sagemaker_infer.SAGEMAKER_MICROBATCH = batching
+    sagemaker_infer.SAGEMAKER_BATCH_SIZE = args.batch_size
+    sagemaker_infer.SAGEMAKER_BATCH_WAIT_MS = args.wait_ms
+    sagemaker_infer._batcher = None
+
+    payloads = [FakePayload(bytes([i % 256]) + b'image') for i in range(args.requests)]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        scores = list(pool.map(sagemaker_infer.classify_with_sagemaker, payloads))
+    elapsed = time.perf_counter() - start
+
+    mismatched = sum(1 for p, s in zip(payloads, scores) if s != p.data[0] / 255)
+    return {
+        "batching": batching,
+        "requests": args.requests,
+        "invocations": endpoint.invocations,
+        "mean_batch_size": round(endpoint.images / endpoint.invocations, 2),
+        "images_per_endpoint_second": round(endpoint.images / endpoint.busy_seconds, 1),
+        "wall_throughput_rps": round(args.requests / elapsed, 1),
+        "mismatched_results": mismatched
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark SageMaker micro-batching")
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--wait-ms", type=float, default=20)
+    parser.add_argument("--invocation-ms", type=float, default=40, help="Fixed cost per endpoint call")
+    parser.add_argument("--per-image-ms", type=float, default=5, help="Marginal cost per image in a call")
+    args = parser.parse_args()
+
+    report = [run(False, args), run(True, args)]
+    for row in report:
+        print(f"batching={str(row['batching']):<5} invocations={row['invocations']:>4} "
+              f"mean batch={row['mean_batch_size']:>5} images/endpoint-s={row['images_per_endpoint_second']:>7} "
+              f"rps={row['wall_throughput_rps']:>7} mismatched={row['mismatched_results']}")
+    print(json.dumps(report))
+    if any(row["mismatched_results"] for row in report):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
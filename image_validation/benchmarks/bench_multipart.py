@@ -0,0 +1,101 @@
+"""Parse time and peak memory of the multipart parser vs. the legacy cgi.FieldStorage path.
+
+The full path starts from the base64 body API Gateway delivers and ends
+with the image bytes ready to upload; "parse only" excludes the base64
+decode, which both paths share.
+
+Usage: python benchmarks/bench_multipart.py --sizes-mb 1 2 4 6
+"""
+import io
+import os
+import sys
+import json
+import time
+import base64
+import argparse
+import warnings
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'infra'))
+
+from multipart import extract_file
+
+with warnings.catch_warnings():
+    warnings.simplefilter("ignore", DeprecationWarning)
+    try:
+        import cgi
+    except ImportError:  # removed in Python 3.13
+        cgi = None
+
+BOUNDARY = "----benchboundary7MA4YWxkTrZu0gW"
+CONTENT_TYPE = f"multipart/form-data; boundary={BOUNDARY}"
+
+def build_event_body(image):
+    body = (
+        f"--{BOUNDARY}\r\n"
+        'Content-Disposition: form-data; name="image"; filename="frame.jpg"\r\n'
+        "Content-Type: image/jpeg\r\n\r\n"
+    ).encode() + image + f"\r\n--{BOUNDARY}--\r\n".encode()
+    return base64.b64encode(body).decode()
+
+def legacy_parse(body):
+    fp = io.BytesIO(body)
+    form = cgi.FieldStorage(fp=fp, environ={'REQUEST_METHOD': 'POST', 'CONTENT_TYPE': CONTENT_TYPE})
+    return form['image'].file.read()
+
+def streaming_parse(body):
+    # bytes() mirrors the single copy ImagePayload makes for botocore
+    return bytes(extract_file(body, CONTENT_TYPE, 'image', 16 * 1024 * 1024))
+
+def legacy_path(event_body):
+    return legacy_parse(base64.b64decode(event_body))
+
+def streaming_path(event_body):
+    return streaming_parse(base64.b64decode(event_body))
+
+def measure(fn, event_body, repeat):
+    timings = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn(event_body)
+        timings.append(time.perf_counter() - t0)
+
+    tracemalloc.start()
+    fn(event_body)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return min(timings) * 1000, peak / (1024 * 1024)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark multipart parsing")
+    parser.add_argument("--sizes-mb", type=float, nargs="+", default=[1, 2, 4, 6])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    report = []
+    for size_mb in args.sizes_mb:
+        image = os.urandom(int(size_mb * 1024 * 1024))
+        event_body = build_event_body(image)
+        assert streaming_path(event_body) == image
+
+        body = base64.b64decode(event_body)
+        row = {"size_mb": size_mb}
+        row["streaming_ms"], row["streaming_peak_mb"] = measure(streaming_path, event_body, args.repeat)
+        row["streaming_parse_ms"], row["streaming_parse_peak_mb"] = measure(streaming_parse, body, args.repeat)
+        if cgi is not None:
+            assert legacy_path(event_body) == image
+            row["legacy_ms"], row["legacy_peak_mb"] = measure(legacy_path, event_body, args.repeat)
+            row["legacy_parse_ms"], row["legacy_parse_peak_mb"] = measure(legacy_parse, body, args.repeat)
+        report.append({k: round(v, 2) for k, v in row.items()})
+
+        line = (f"{size_mb:>4} MB  streaming {row['streaming_ms']:7.2f} ms / {row['streaming_peak_mb']:6.2f} MB peak"
+                f" (parse only {row['streaming_parse_ms']:6.2f} ms / {row['streaming_parse_peak_mb']:6.2f} MB)")
+        if cgi is not None:
+            line += (f"  legacy {row['legacy_ms']:7.2f} ms / {row['legacy_peak_mb']:6.2f} MB peak"
+                     f" (parse only {row['legacy_parse_ms']:6.2f} ms / {row['legacy_parse_peak_mb']:6.2f} MB)")
+        print(line)
+
+    print(json.dumps({"results": report}))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""Bytes sent to the backends and preprocessing latency, before and after normalization.
+
+Runs over a fixture corpus directory of images, or a synthetic corpus at
+common camera resolutions when --corpus is omitted. With --rekognition,
+each image is also sent to DetectLabels both ways to measure the backend
+latency (requires AWS credentials).
+
+Usage: python benchmarks/bench_normalize.py --corpus ./fixtures --max-side 640 --quality 85
+"""
+import io
+import os
+import sys
+import json
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'infra'))
+
+from PIL import Image, ImageDraw
+
+import preprocess
+
+SYNTHETIC_SIZES = [(1280, 720), (1920, 1080), (3024, 4032), (4032, 3024)]
+
+def synthetic_corpus(count, seed):
+    rng = random.Random(seed)
+    for i in range(count):
+        width, height = SYNTHETIC_SIZES[i % len(SYNTHETIC_SIZES)]
+        img = Image.new('RGB', (width, height), tuple(rng.randrange(256) for _ in range(3)))
+        draw = ImageDraw.Draw(img)
+        for _ in range(200):
+            x, y = rng.randrange(width), rng.randrange(height)
+            draw.ellipse([x, y, x + rng.randrange(20, 400), y + rng.randrange(20, 400)],
+                         fill=tuple(rng.randrange(256) for _ in range(3)))
+        out = io.BytesIO()
+        img.save(out, 'JPEG', quality=92)
+        yield f"synthetic-{i}-{width}x{height}.jpg", out.getvalue()
+
+def file_corpus(directory):
+    for name in sorted(os.listdir(directory)):
+        with open(os.path.join(directory, name), 'rb') as f:
+            yield name, f.read()
+
+def detect_labels_ms(client, data):
+    t0 = time.perf_counter()
+    client.detect_labels(Image={"Bytes": data}, MaxLabels=10, MinConfidence=70)
+    return (time.perf_counter() - t0) * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark server-side image normalization")
+    parser.add_argument("--corpus", help="Directory of fixture images (default: synthetic corpus)")
+    parser.add_argument("--count", type=int, default=8, help="Synthetic corpus size")
+    parser.add_argument("--max-side", type=int, default=preprocess.NORMALIZE_MAX_SIDE)
+    parser.add_argument("--quality", type=int, default=preprocess.NORMALIZE_JPEG_QUALITY)
+    parser.add_argument("--rekognition", action="store_true", help="Also time DetectLabels with both payloads")
+    args = parser.parse_args()
+
+    client = None
+    if args.rekognition:
+        import boto3
+        client = boto3.client('rekognition')
+
+    corpus = file_corpus(args.corpus) if args.corpus else synthetic_corpus(args.count, seed=11)
+    rows = []
+    for name, data in corpus:
+        t0 = time.perf_counter()
+        normalized = preprocess.normalize(data, max_side=args.max_side, quality=args.quality)
+        row = {
+            "image": name,
+            "original_bytes": len(data),
+            "normalized_bytes": len(normalized),
+            "normalize_ms": round((time.perf_counter() - t0) * 1000, 2)
+        }
+        if client is not None and len(data) <= 5 * 1024 * 1024:
+            row["rekognition_original_ms"] = round(detect_labels_ms(client, data), 1)
+            row["rekognition_normalized_ms"] = round(detect_labels_ms(client, normalized), 1)
+        rows.append(row)
+        print(f"{name:<40} {row['original_bytes']:>9} -> {row['normalized_bytes']:>8} bytes  {row['normalize_ms']:>7} ms")
+
+    total_before = sum(r["original_bytes"] for r in rows)
+    total_after = sum(r["normalized_bytes"] for r in rows)
+    print(f"Total bytes sent per backend: {total_before} -> {total_after} ({total_after / total_before:.1%})")
+    print(json.dumps({"max_side": args.max_side, "quality": args.quality, "results": rows}))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+"""Throughput of the in-process ONNX backend on CPU.
+
+Builds a small synthetic person classifier (a stride-2 conv stack, global
+pooling and a sigmoid head, about the cost of a tiny MobileNet), optionally
+quantizes it to int8 with ONNX Runtime's static quantizer, then measures:
+
+  batch     raw model throughput per batch size, images/s
+  backend   classify_with_onnx end to end (decode, resize, micro-batched run)
+            from concurrent callers, as the fan-out pool calls it
+
+The weights are random, so only speed is meaningful, not the scores.
+
+Usage: pip install onnx onnxruntime numpy Pillow
+       python benchmarks/bench_onnx.py --quantize --concurrency 8
+"""
+import io
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import onnx
+from onnx import helper, numpy_helper, TensorProto
+from PIL import Image, ImageDraw
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'infra'))
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(round(p / 100 * (len(sorted_values) - 1))))]
+
+def build_model(path, size, channels, seed):
+    """Writes a conv classifier taking [N, 3, size, size] and returning [N, 1] probabilities."""
+    rng = np.random.default_rng(seed)
+    nodes, initializers = [], []
+    previous, in_channels = "input", 3
+    for i, out_channels in enumerate(channels):
+        weight = rng.normal(0, (2 / (9 * in_channels)) ** 0.5, (out_channels, in_channels, 3, 3)).astype(np.float32)
+        initializers += [numpy_helper.from_array(weight, f"w{i}"),
+                         numpy_helper.from_array(np.zeros(out_channels, np.float32), f"b{i}")]
+        nodes += [helper.make_node("Conv", [previous, f"w{i}", f"b{i}"], [f"conv{i}"],
+                                   kernel_shape=[3, 3], strides=[2, 2], pads=[1, 1, 1, 1]),
+                  helper.make_node("Relu", [f"conv{i}"], [f"relu{i}"])]
+        previous, in_channels = f"relu{i}", out_channels
+
+    head = rng.normal(0, 0.05, (in_channels, 1)).astype(np.float32)
+    initializers += [numpy_helper.from_array(head, "head_w"), numpy_helper.from_array(np.zeros(1, np.float32), "head_b")]
+    nodes += [helper.make_node("GlobalAveragePool", [previous], ["pooled"]),
+              helper.make_node("Flatten", ["pooled"], ["flat"]),
+              helper.make_node("Gemm", ["flat", "head_w", "head_b"], ["logit"]),
+              helper.make_node("Sigmoid", ["logit"], ["person"])]
+
+    graph = helper.make_graph(
+        nodes, "person_classifier",
+        [helper.make_tensor_value_info("input", TensorProto.FLOAT, ["N", 3, size, size])],
+        [helper.make_tensor_value_info("person", TensorProto.FLOAT, ["N", 1])],
+        initializers
+    )
+    # IR version 8 loads in every ONNX Runtime release that supports opset 13
+    model = helper.make_model(graph, opset_imports=[helper.make_opsetid("", 13)], ir_version=8)
+    onnx.checker.check_model(model)
+    onnx.save(model, path)
+
+def quantize(path, quantized_path, size, seed):
+    from onnxruntime.quantization import quantize_static, CalibrationDataReader, QuantFormat, QuantType
+
+    class RandomCalibration(CalibrationDataReader):
+        def __init__(self):
+            rng = np.random.default_rng(seed)
+            self.batches = iter([{"input": rng.normal(0, 1, (1, 3, size, size)).astype(np.float32)} for _ in range(16)])
+
+        def get_next(self):
+            return next(self.batches, None)
+
+    quantize_static(path, quantized_path, RandomCalibration(), quant_format=QuantFormat.QDQ,
+                    activation_type=QuantType.QUInt8, weight_type=QuantType.QInt8)
+
+def make_jpegs(count, width, height, seed):
+    rng = random.Random(seed)
+    images = []
+    for _ in range(count):
+        img = Image.new('RGB', (width, height), tuple(rng.randrange(256) for _ in range(3)))
+        draw = ImageDraw.Draw(img)
+        for _ in range(8):
+            x, y = rng.randrange(width), rng.randrange(height)
+            draw.ellipse([x, y, x + rng.randrange(20, width // 2), y + rng.randrange(20, height // 2)],
+                         fill=tuple(rng.randrange(256) for _ in range(3)))
+        out = io.BytesIO()
+        img.save(out, 'JPEG', quality=85)
+        images.append(out.getvalue())
+    return images
+
+class FakePayload:
+    def __init__(self, data):
+        self.data = data
+
+    def inference_bytes(self):
+        return self.data
+
+def bench_batches(onnx_infer, batch_sizes, size, repeats):
+    rows = []
+    tensor = np.random.default_rng(0).normal(0, 1, (3, size, size)).astype(np.float32)
+    onnx_infer.run_batch([tensor])  # warm-up: session creation and first-run allocations
+    for batch_size in batch_sizes:
+        tensors = [tensor] * batch_size
+        start = time.perf_counter()
+        for _ in range(repeats):
+            onnx_infer.run_batch(tensors)
+        elapsed = time.perf_counter() - start
+        rows.append({
+            "batch_size": batch_size,
+            "ms_per_batch": round(elapsed / repeats * 1000, 2),
+            "images_per_second": round(batch_size * repeats / elapsed, 1)
+        })
+    return rows
+
+def bench_backend(onnx_infer, images, concurrency):
+    latencies = []
+
+    def one(data):
+        start = time.perf_counter()
+        score = onnx_infer.classify_with_onnx(FakePayload(data))
+        latencies.append(time.perf_counter() - start)
+        return score
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        scores = list(pool.map(one, images))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    batcher = onnx_infer._batcher
+    return {
+        "concurrency": concurrency,
+        "images_per_second": round(len(images) / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 1),
+        "mean_batch_size": round(batcher.items_sent / max(1, batcher.batches_sent), 2),
+        "errors": sum(1 for s in scores if not isinstance(s, float))
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the in-process ONNX backend")
+    parser.add_argument("--input-size", type=int, default=224)
+    parser.add_argument("--channels", default="16,32,64,128,256", help="Output channels of each stride-2 conv")
+    parser.add_argument("--quantize", action="store_true", help="Quantize the model to int8 (QDQ)")
+    parser.add_argument("--batch-sizes", default="1,2,4,8,16")
+    parser.add_argument("--repeats", type=int, default=20)
+    parser.add_argument("--images", type=int, default=200)
+    parser.add_argument("--image-size", default="640x480", help="Size of the JPEGs the backend decodes")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--threads", type=int, default=0, help="ONNX_THREADS")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='bench-onnx-')
+    model = os.path.join(workdir, 'person.onnx')
+    build_model(model, args.input_size, [int(c) for c in args.channels.split(',')], args.seed)
+    if args.quantize:
+        quantized = os.path.join(workdir, 'person.int8.onnx')
+        quantize(model, quantized, args.input_size, args.seed)
+        model = quantized
+
+    os.environ.update({
+        "ONNX_MODEL_URI": model,
+        "ONNX_INPUT_SIZE": str(args.input_size),
+        "ONNX_THREADS": str(args.threads)
+    })
+    import logging
+    logging.disable(logging.INFO)
+    import onnx_infer
+
+    width, height = (int(v) for v in args.image_size.split('x'))
+    report = {
+        "model_bytes": os.path.getsize(model),
+        "quantized": args.quantize,
+        "cpus": os.cpu_count(),
+        "batch": bench_batches(onnx_infer, [int(b) for b in args.batch_sizes.split(',')], args.input_size, args.repeats),
+        "backend": bench_backend(onnx_infer, make_jpegs(args.images, width, height, args.seed), args.concurrency)
+    }
+
+    print(f"model {report['model_bytes'] / 1024:.0f} KiB, quantized={args.quantize}, {report['cpus']} CPUs")
+    for row in report["batch"]:
+        print(f"  batch {row['batch_size']:>3}: {row['ms_per_batch']:>8} ms/batch  {row['images_per_second']:>8} images/s")
+    backend = report["backend"]
+    print(f"  backend x{backend['concurrency']}: {backend['images_per_second']} images/s, p50 {backend['p50_ms']} ms, "
+          f"p99 {backend['p99_ms']} ms, mean batch {backend['mean_batch_size']}, errors {backend['errors']}")
+    print(json.dumps(report))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""Lookup latency of the perceptual-hash near-duplicate index as it grows.
+
+Usage: python benchmarks/bench_phash_index.py --sizes 10000 100000 1000000 --distance 4
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'infra'))
+
+from utils.near_duplicate import MultiIndexHash
+
+def flip_bits(value, count, rng):
+    for position in rng.sample(range(64), count):
+        value ^= 1 << position
+    return value
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the perceptual-hash index")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 1000000])
+    parser.add_argument("--distance", type=int, default=4, help="Max Hamming distance for lookups")
+    parser.add_argument("--chunks", type=int, default=3)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    index = MultiIndexHash(chunks=args.chunks)
+    report = []
+
+    for size in sorted(args.sizes):
+        start = time.perf_counter()
+        while len(index) < size:
+            index.insert(rng.getrandbits(64), "{}")
+        insert_seconds = time.perf_counter() - start
+
+        # Half the queries are near-duplicates of stored hashes, half are random misses
+        latencies = []
+        hits = 0
+        for i in range(args.queries):
+            if i % 2 == 0:
+                stored = index.hashes[rng.randrange(len(index))]
+                query = flip_bits(stored, rng.randint(0, args.distance), rng)
+            else:
+                query = rng.getrandbits(64)
+            t0 = time.perf_counter()
+            hits += index.search(query, args.distance) is not None
+            latencies.append((time.perf_counter() - t0) * 1e6)
+
+        row = {
+            "entries": len(index),
+            "insert_seconds": round(insert_seconds, 3),
+            "lookup_p50_us": round(percentile(latencies, 50), 1),
+            "lookup_p99_us": round(percentile(latencies, 99), 1),
+            "hit_rate": round(hits / args.queries, 3)
+        }
+        report.append(row)
+        print(f"{row['entries']:>10} entries  p50 {row['lookup_p50_us']:>8} us  p99 {row['lookup_p99_us']:>8} us  hits {row['hit_rate']}")
+
+    print(json.dumps({"distance": args.distance, "chunks": args.chunks, "results": report}))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""Measures hedged requests and circuit breaking on synthetic inference backends.
+
+Two scenarios, each run with the mechanism off and on:
+
+  straggler  a backend with a log-normal latency where a small fraction of
+             calls stall (a cold container, a GC pause); hedging should cut
+             p99 at the cost of a few extra calls
+  dead       a backend that only ever times out; the breaker should stop
+             requests from waiting on it and report it as unavailable
+
+Usage: python benchmarks/bench_resilience.py --requests 600 --concurrency 16
+"""
+import os
+import sys
+import json
+import math
+import time
+import random
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'infra'))
+
+from fanout import TIMEOUT
+from resilience import ResilientBackend, CircuitBreaker, UNAVAILABLE
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(round(p / 100 * (len(sorted_values) - 1))))]
+
+class SyntheticBackend:
+    """Log-normal latency around `median_ms`; `stall_rate` of calls take `stall_ms` instead."""
+
+    def __init__(self, median_ms, sigma, stall_rate=0.0, stall_ms=0.0, seed=0):
+        self.median_ms = median_ms
+        self.sigma = sigma
+        self.stall_rate = stall_rate
+        self.stall_ms = stall_ms
+        self.calls = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def __call__(self, payload):
+        with self._lock:
+            self.calls += 1
+            stalled = self._rng.random() < self.stall_rate
+            delay = self.stall_ms if stalled else self.median_ms * math.exp(self._rng.gauss(0, self.sigma))
+        time.sleep(delay / 1000)
+        return 0.9
+
+def drive(backend, args):
+    """Calls `backend` from `args.concurrency` threads; returns sorted latencies and result counts."""
+    latencies, outcomes = [], {}
+    lock = threading.Lock()
+
+    def one(i):
+        start = time.perf_counter()
+        result = backend(i)
+        elapsed = time.perf_counter() - start
+        with lock:
+            latencies.append(elapsed)
+            key = result if isinstance(result, str) else "ok"
+            outcomes[key] = outcomes.get(key, 0) + 1
+
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        list(pool.map(one, range(args.requests)))
+    return sorted(latencies), outcomes
+
+def attempt_pool(args):
+    # A fresh pool per run, so attempts abandoned by an earlier run can't queue up this one's
+    return ThreadPoolExecutor(max_workers=args.concurrency * 4)
+
+def straggler(hedge, args):
+    backend = SyntheticBackend(args.median_ms, args.sigma, args.stall_rate, args.stall_ms, seed=args.seed)
+    wrapped = ResilientBackend(
+        "straggler", backend, hedge=hedge, hedge_percentile=args.hedge_percentile,
+        hedge_min_delay=args.hedge_min_delay_ms / 1000, hedge_min_samples=20, hedge_budget=args.hedge_budget,
+        breaker=CircuitBreaker("straggler", failure_threshold=10 ** 9), timeout=args.timeout,
+        executor=attempt_pool(args)
+    )
+    latencies, outcomes = drive(wrapped, args)
+    return {
+        "scenario": "straggler",
+        "hedge": hedge,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 1),
+        "backend_calls_per_request": round(backend.calls / args.requests, 3),
+        "outcomes": outcomes
+    }
+
+def dead(breaker, args):
+    # Stalls past the timeout on every call, like an endpoint that accepts connections but never answers
+    backend = SyntheticBackend(args.timeout * 2000, 0.0, seed=args.seed)
+    threshold = 5 if breaker else 10 ** 9
+    wrapped = ResilientBackend(
+        "dead", backend, hedge=False,
+        breaker=CircuitBreaker("dead", failure_threshold=threshold, reset_timeout=60), timeout=args.timeout,
+        executor=attempt_pool(args)
+    )
+    latencies, outcomes = drive(wrapped, args)
+    return {
+        "scenario": "dead",
+        "breaker": breaker,
+        "mean_ms": round(sum(latencies) / len(latencies) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 1),
+        "backend_calls": backend.calls,
+        "timeouts": outcomes.get(TIMEOUT, 0),
+        "unavailable": outcomes.get(UNAVAILABLE, 0)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark hedging and circuit breaking")
+    parser.add_argument("--requests", type=int, default=600)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--median-ms", type=float, default=20)
+    parser.add_argument("--sigma", type=float, default=0.3)
+    parser.add_argument("--stall-rate", type=float, default=0.03, help="Fraction of calls that stall")
+    parser.add_argument("--stall-ms", type=float, default=400)
+    parser.add_argument("--hedge-percentile", type=float, default=95)
+    parser.add_argument("--hedge-min-delay-ms", type=float, default=10)
+    parser.add_argument("--hedge-budget", type=float, default=0.1, help="Max hedges per call")
+    parser.add_argument("--timeout", type=float, default=0.5, help="Per-call timeout in seconds")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    report = [straggler(False, args), straggler(True, args)]
+    # A dead backend is only interesting for the first few requests with the breaker; keep the run short
+    args.requests = min(args.requests, 64)
+    report += [dead(False, args), dead(True, args)]
+
+    for row in report:
+        if row["scenario"] == "straggler":
+            print(f"straggler hedge={str(row['hedge']):<5} p50={row['p50_ms']:>7}ms p99={row['p99_ms']:>7}ms "
+                  f"calls/request={row['backend_calls_per_request']}")
+        else:
+            print(f"dead      breaker={str(row['breaker']):<5} mean={row['mean_ms']:>7}ms p99={row['p99_ms']:>7}ms "
+                  f"backend calls={row['backend_calls']:>3} timeouts={row['timeouts']:>3} unavailable={row['unavailable']:>3}")
+    print(json.dumps(report))
+
+if __name__ == "__main__":
+    main()
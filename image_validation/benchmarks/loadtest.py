@@ -0,0 +1,260 @@
+"""Load test for the Lambda handlers against latency-injecting AWS fakes.
+
+Each stage runs in its own subprocess, so module-level caches and peak
+RSS are measured per stage:
+
+  api        POST /classify as API Gateway v2 events (base64 multipart bodies)
+  processor  SQS batches of S3 upload notifications, as the event source mapping delivers them
+
+Every request uses a distinct image. Service behaviour is set per service
+as "median_ms[:sigma[:error_rate]]" with a log-normal latency.
+
+With --metrics, the handlers' EMF records are captured in memory and
+summarized per operation, breaking latency down by stage.
+
+Usage:
+    python benchmarks/loadtest.py --requests 500 --concurrency 32 \\
+        --sagemaker 60:0.5 --rekognition 120:0.4:0.01 --output run.json
+    python benchmarks/loadtest.py --baseline run.json   # report deltas against an earlier run
+"""
+import io
+import os
+import sys
+import json
+import time
+import uuid
+import types
+import base64
+import random
+import argparse
+import resource
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCHMARKS)
+sys.path.insert(0, os.path.join(BENCHMARKS, '..', 'infra'))
+
+STAGES = ("api", "processor")
+
+BUCKET = "loadtest-images"
+TABLES = {"results": "ImageKey", "cache": "ContentHash"}
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(round(p / 100 * (len(sorted_values) - 1))))]
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+def make_images(count, width, height, seed):
+    """Distinct JPEGs when Pillow is available, otherwise distinct random blobs."""
+    rng = random.Random(seed)
+    try:
+        from PIL import Image, ImageDraw
+    except ImportError:
+        return [rng.randbytes(width * height // 10) for _ in range(count)]
+
+    images = []
+    for _ in range(count):
+        img = Image.new('RGB', (width, height), tuple(rng.randrange(256) for _ in range(3)))
+        draw = ImageDraw.Draw(img)
+        for _ in range(12):
+            x, y = rng.randrange(width), rng.randrange(height)
+            draw.rectangle([x, y, x + rng.randrange(40, width // 2), y + rng.randrange(40, height // 2)],
+                           fill=tuple(rng.randrange(256) for _ in range(3)))
+        out = io.BytesIO()
+        img.save(out, 'JPEG', quality=90)
+        images.append(out.getvalue())
+    return images
+
+def api_event(image):
+    boundary = uuid.uuid4().hex
+    body = (
+        f'--{boundary}\r\nContent-Disposition: form-data; name="image"; filename="image.jpg"\r\n'
+        f'Content-Type: image/jpeg\r\n\r\n'
+    ).encode() + image + f'\r\n--{boundary}--\r\n'.encode()
+    return {
+        "version": "2.0",
+        "routeKey": "POST /classify",
+        "rawPath": "/classify",
+        "headers": {"content-type": f"multipart/form-data; boundary={boundary}"},
+        "requestContext": {"http": {"method": "POST", "path": "/classify"}, "requestId": uuid.uuid4().hex},
+        "body": base64.b64encode(body).decode('ascii'),
+        "isBase64Encoded": True
+    }
+
+def sqs_event(keys):
+    records = []
+    for key in keys:
+        notification = {"Records": [{
+            "eventSource": "aws:s3",
+            "eventName": "ObjectCreated:Put",
+            "s3": {"bucket": {"name": BUCKET}, "object": {"key": key}}
+        }]}
+        records.append({
+            "messageId": uuid.uuid4().hex,
+            "receiptHandle": uuid.uuid4().hex,
+            "body": json.dumps(notification),
+            "attributes": {"ApproximateReceiveCount": "1"},
+            "eventSource": "aws:sqs"
+        })
+    return {"Records": records}
+
+def context():
+    return types.SimpleNamespace(aws_request_id=str(uuid.uuid4()), function_name="loadtest")
+
+def run_stage(stage, args):
+    """Runs one stage in this process and returns its report."""
+    os.environ.update({
+        "TABLE_NAME": "results",
+        "CACHE_TABLE_NAME": "cache",
+        "BUCKET_NAME": BUCKET,
+        "SAGEMAKER_ENDPOINT": "loadtest",
+        "METRICS_ENABLED": "1" if args.metrics else "0"
+    })
+
+    import aws_fakes
+    models = {
+        "s3": aws_fakes.parse_latency(args.s3),
+        "sagemaker-runtime": aws_fakes.parse_latency(args.sagemaker),
+        "rekognition": aws_fakes.parse_latency(args.rekognition),
+        "dynamodb": aws_fakes.parse_latency(args.dynamodb)
+    }
+    fakes = aws_fakes.install(models, seed=args.seed, key_attributes=TABLES)
+
+    from utils import metrics
+    sink = metrics.MemorySink()
+    metrics.set_sink(sink)
+
+    width, height = (int(v) for v in args.image_size.split('x'))
+    images = make_images(args.requests, width, height, args.seed)
+
+    if stage == "api":
+        import api_handler
+        handler = api_handler.lambda_handler
+        events = [api_event(image) for image in images]
+        ok = lambda response: response.get("statusCode") == 200
+    else:
+        import image_processor
+        handler = image_processor.lambda_handler
+        keys = [f"uploads/{uuid.uuid4()}.jpg" for _ in images]
+        for key, image in zip(keys, images):
+            fakes["s3"].objects[(BUCKET, key)] = image
+        events = [sqs_event(keys[i:i + args.batch_size]) for i in range(0, len(keys), args.batch_size)]
+        ok = lambda response: not response.get("batchItemFailures")
+
+    rss_before = peak_rss_mb()
+    latencies, failures = [], 0
+
+    def invoke(event):
+        start = time.perf_counter()
+        try:
+            succeeded = ok(handler(event, context()))
+        except Exception:
+            succeeded = False
+        return time.perf_counter() - start, succeeded
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        for latency, succeeded in pool.map(invoke, events):
+            latencies.append(latency)
+            failures += not succeeded
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "invocations": len(events),
+        "images": len(images),
+        "failed_invocations": failures,
+        "elapsed_seconds": round(elapsed, 3),
+        "invocations_per_second": round(len(events) / elapsed, 1),
+        "images_per_second": round(len(images) / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 1),
+        "max_ms": round(latencies[-1] * 1000, 1) if latencies else 0.0,
+        "rss_before_mb": rss_before,
+        "peak_rss_mb": peak_rss_mb(),
+        "services": {name: fake.stats() for name, fake in fakes.items()},
+        "spans": summarize_spans(sink.records)
+    }
+
+def summarize_spans(records):
+    """p50/p95 of every per-request EMF metric, grouped by operation."""
+    values = {}
+    for record in records:
+        for metric in record["_aws"]["CloudWatchMetrics"][0]["Metrics"]:
+            values.setdefault(record["Operation"], {}).setdefault(metric["Name"], []).append(record[metric["Name"]])
+    return {
+        operation: {
+            name: {"count": len(v), "p50": percentile(sorted(v), 50), "p95": percentile(sorted(v), 95)}
+            for name, v in metrics.items()
+        }
+        for operation, metrics in values.items()
+    }
+
+def compare(report, baseline):
+    """Prints the relative change of each headline metric against a baseline report."""
+    for stage, current in report["stages"].items():
+        previous = baseline.get("stages", {}).get(stage)
+        if not previous:
+            continue
+        changes = []
+        for metric in ("images_per_second", "p50_ms", "p95_ms", "p99_ms", "peak_rss_mb"):
+            if previous.get(metric):
+                delta = (current[metric] - previous[metric]) / previous[metric] * 100
+                changes.append(f"{metric} {previous[metric]} -> {current[metric]} ({delta:+.1f}%)")
+        print(f"{stage}: " + ", ".join(changes), file=sys.stderr)
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the Lambda handlers against local AWS fakes")
+    parser.add_argument("--stages", default=",".join(STAGES), help="Comma-separated stages to run")
+    parser.add_argument("--requests", type=int, default=400, help="Images per stage")
+    parser.add_argument("--concurrency", type=int, default=16, help="Concurrent handler invocations")
+    parser.add_argument("--batch-size", type=int, default=10, help="SQS messages per processor invocation")
+    parser.add_argument("--image-size", default="1280x720")
+    parser.add_argument("--s3", default="15:0.4", help="median_ms[:sigma[:error_rate]]")
+    parser.add_argument("--sagemaker", default="60:0.5")
+    parser.add_argument("--rekognition", default="120:0.4")
+    parser.add_argument("--dynamodb", default="6:0.3")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--metrics", action="store_true", help="Enable EMF metrics and summarize per-stage spans")
+    parser.add_argument("--output", help="Write the JSON report to this file as well as stdout")
+    parser.add_argument("--baseline", help="Earlier JSON report to compare against")
+    parser.add_argument("--stage", choices=STAGES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.stage:
+        # Child process: quiet the handlers' INFO logging so it doesn't dominate the run
+        import logging
+        logging.disable(logging.INFO)
+        print(json.dumps(run_stage(args.stage, args)))
+        return
+
+    report = {
+        "config": {k: v for k, v in vars(args).items() if k not in ("stage", "output", "baseline")},
+        "stages": {}
+    }
+    for stage in args.stages.split(','):
+        child = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), *sys.argv[1:], "--stage", stage],
+            capture_output=True, text=True
+        )
+        if child.returncode != 0:
+            sys.stderr.write(child.stderr)
+            sys.exit(f"Stage {stage} failed")
+        report["stages"][stage] = json.loads(child.stdout.strip().splitlines()[-1])
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            compare(report, json.load(f))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
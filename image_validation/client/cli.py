@@ -1,23 +1,240 @@
+import os
+import sys
+import json
+import time
+import random
 import argparse
+import mimetypes
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
 import requests
+from requests.adapters import HTTPAdapter
+
+BASE_URL = os.environ.get("API_BASE_URL", "https://your-api-gateway-url")
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png"}
+
+# Worth retrying: throttling and transient server-side failures
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
 
-BASE_URL = "https://your-api-gateway-url"
+_local = threading.local()
 
-def upload_image(image_path):
-    files = {'file': open(image_path, 'rb')}
-    response = requests.post(f"{BASE_URL}/classify", files=files)
+def get_session(pool_size=1):
+    """Returns this thread's Session, which keeps its connection alive between uploads."""
+    session = getattr(_local, "session", None)
+    if session is None:
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        _local.session = session
+    return session
+
+def post_image(base_url, image_path, data=None, asynchronous=False, timeout=60):
+    content_type = mimetypes.guess_type(image_path)[0] or "application/octet-stream"
+    if data is None:
+        with open(image_path, "rb") as f:
+            data = f.read()
+    files = {"image": (os.path.basename(image_path), data, content_type)}
+    params = {"mode": "async"} if asynchronous else None
+    return get_session().post(f"{base_url}/classify", files=files, params=params, timeout=timeout)
+
+def upload_image(base_url, image_path):
+    response = post_image(base_url, image_path)
     print(response.json())
 
-def query_result(image_id):
-    response = requests.get(f"{BASE_URL}/results/{image_id}")
+def query_result(base_url, image_id):
+    response = get_session().get(f"{base_url}/results/{image_id}")
     print(response.json())
 
-parser = argparse.ArgumentParser(description="CLI for Image Classification")
-parser.add_argument("--upload", help="Path to image file")
-parser.add_argument("--query", help="Image ID to query results")
+# --------------------------------------
+# Bulk upload
+# --------------------------------------
+def iter_images(source):
+    """Yields image paths from a directory tree, or from a manifest with one path per line."""
+    if os.path.isdir(source):
+        for root, dirs, files in os.walk(source):
+            dirs.sort()
+            for name in sorted(files):
+                if os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS:
+                    yield os.path.join(root, name)
+        return
+
+    base = os.path.dirname(os.path.abspath(source))
+    with open(source) as manifest:
+        for line in manifest:
+            path = line.strip()
+            if path and not path.startswith("#"):
+                yield path if os.path.isabs(path) else os.path.join(base, path)
+
+def load_checkpoint(path):
+    """Returns the image paths a previous run already uploaded successfully."""
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path) as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                # A run killed mid-write leaves a truncated last line
+                continue
+            if entry.get("ok"):
+                done.add(entry["path"])
+    return done
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(p / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+class Progress:
+    """Thread-safe counters and latencies, with a checkpoint line per finished image."""
+
+    def __init__(self, checkpoint_path, skipped):
+        self.skipped = skipped
+        self.succeeded = 0
+        self.failed = 0
+        self.retries = 0
+        self.latencies = []
+        self.started = time.monotonic()
+        self._lock = threading.Lock()
+        self._checkpoint = open(checkpoint_path, "a", buffering=1)
+
+    def record(self, path, ok, latency, attempts, detail):
+        with self._lock:
+            if ok:
+                self.succeeded += 1
+                self.latencies.append(latency)
+            else:
+                self.failed += 1
+            self.retries += attempts - 1
+            self._checkpoint.write(json.dumps({
+                "path": path, "ok": ok, "latency_ms": round(latency * 1000, 1),
+                "attempts": attempts, **detail
+            }) + "\n")
+
+    def summary(self):
+        with self._lock:
+            latencies = sorted(self.latencies)
+            done = self.succeeded + self.failed
+        elapsed = time.monotonic() - self.started
+        return {
+            "succeeded": self.succeeded,
+            "failed": self.failed,
+            "skipped": self.skipped,
+            "retries": self.retries,
+            "elapsed_seconds": round(elapsed, 1),
+            "throughput_per_second": round(done / elapsed, 1) if elapsed else 0.0,
+            "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+            "p95_ms": round(percentile(latencies, 95) * 1000, 1),
+            "p99_ms": round(percentile(latencies, 99) * 1000, 1)
+        }
+
+    def close(self):
+        self._checkpoint.close()
+
+def upload_with_retries(base_url, path, retries, asynchronous, timeout):
+    """Uploads one image. Returns `(ok, attempts, detail)`."""
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except OSError as e:
+        return False, 1, {"error": str(e)}
+
+    for attempt in range(1, retries + 2):
+        delay = None
+        try:
+            response = post_image(base_url, path, data, asynchronous, timeout)
+            if response.status_code < 400:
+                body = response.json()
+                return True, attempt, {"image_id": body.get("image_id"), "job_id": body.get("job_id")}
+            if response.status_code not in RETRYABLE_STATUS or attempt > retries:
+                return False, attempt, {"status": response.status_code, "error": response.text[:200]}
+            retry_after = response.headers.get("Retry-After")
+            delay = float(retry_after) if retry_after and retry_after.isdigit() else None
+        except requests.RequestException as e:
+            if attempt > retries:
+                return False, attempt, {"error": str(e)}
+
+        # Full-jitter exponential backoff unless the server said how long to wait
+        time.sleep(delay if delay is not None else random.uniform(0, min(20.0, 0.5 * (2 ** (attempt - 1)))))
+
+def bulk_upload(base_url, source, workers, retries, checkpoint_path, asynchronous=False,
+                timeout=60, report_every=2.0):
+    done = load_checkpoint(checkpoint_path)
+    pending = (path for path in iter_images(source) if path not in done)
+    progress = Progress(checkpoint_path, skipped=len(done))
+
+    stop = threading.Event()
+
+    def report():
+        while not stop.wait(report_every):
+            s = progress.summary()
+            sys.stderr.write(
+                f"\r{s['succeeded']} ok, {s['failed']} failed, {s['throughput_per_second']}/s, "
+                f"p50 {s['p50_ms']}ms p95 {s['p95_ms']}ms p99 {s['p99_ms']}ms   "
+            )
+            sys.stderr.flush()
+
+    reporter = threading.Thread(target=report, daemon=True)
+    reporter.start()
+
+    def run(path):
+        start = time.monotonic()
+        ok, attempts, detail = upload_with_retries(base_url, path, retries, asynchronous, timeout)
+        progress.record(path, ok, time.monotonic() - start, attempts, detail)
+
+    # Keep a bounded window of in-flight uploads instead of queueing the whole backlog
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            in_flight = set()
+            for path in pending:
+                if len(in_flight) >= workers * 2:
+                    finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        future.result()
+                in_flight.add(pool.submit(run, path))
+            for future in in_flight:
+                future.result()
+    finally:
+        stop.set()
+        reporter.join()
+        progress.close()
+        sys.stderr.write("\n")
+
+    return progress.summary()
+
+def main():
+    parser = argparse.ArgumentParser(description="CLI for Image Classification")
+    parser.add_argument("--base-url", default=BASE_URL, help="API base URL (default: $API_BASE_URL)")
+    parser.add_argument("--upload", help="Path to image file")
+    parser.add_argument("--query", help="Image ID to query results")
+    parser.add_argument("--bulk", help="Directory of images, or a manifest file with one path per line")
+    parser.add_argument("--workers", type=int, default=16, help="Concurrent uploads in bulk mode")
+    parser.add_argument("--retries", type=int, default=5, help="Retries per image on throttling or 5xx")
+    parser.add_argument("--timeout", type=float, default=60, help="Per-request timeout in seconds")
+    parser.add_argument("--checkpoint", default="bulk-upload.checkpoint.jsonl",
+                        help="JSONL progress file; images already uploaded in it are skipped")
+    parser.add_argument("--async", dest="asynchronous", action="store_true",
+                        help="Submit async jobs instead of waiting for classification")
+    args = parser.parse_args()
+
+    base_url = args.base_url.rstrip("/")
+    if args.bulk:
+        summary = bulk_upload(base_url, args.bulk, args.workers, args.retries, args.checkpoint,
+                              args.asynchronous, args.timeout)
+        print(json.dumps(summary))
+        if summary["failed"]:
+            sys.exit(1)
+    elif args.upload:
+        upload_image(base_url, args.upload)
+    elif args.query:
+        query_result(base_url, args.query)
+    else:
+        parser.print_help()
 
-args = parser.parse_args()
-if args.upload:
-    upload_image(args.upload)
-elif args.query:
-    query_result(args.query)
+if __name__ == "__main__":
+    main()
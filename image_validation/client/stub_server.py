@@ -0,0 +1,91 @@
+"""Local stand-in for the classification API, for exercising cli.py without AWS.
+
+Answers POST /classify like the API handler, with configurable latency and
+a fraction of 503 responses to exercise retries. Remembers results so
+GET /results/{image_id} works afterwards.
+
+Usage:
+    python client/stub_server.py --port 8080 --latency-ms 50 --error-rate 0.05
+    python client/cli.py --base-url http://localhost:8080 --bulk ./images
+"""
+import json
+import time
+import uuid
+import random
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+_results = {}
+_lock = threading.Lock()
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like API Gateway
+    latency = 0.05
+    jitter = 0.02
+    error_rate = 0.0
+
+    def _send(self, status, body, headers=None):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        body = self.rfile.read(length)
+        if not self.path.startswith("/classify"):
+            return self._send(404, {"error": "Not found"})
+
+        time.sleep(max(0.0, random.gauss(self.latency, self.jitter)))
+        if random.random() < self.error_rate:
+            return self._send(503, {"error": "Service unavailable"}, {"Retry-After": "0"})
+        if b'name="image"' not in body:
+            return self._send(400, {"error": "No image file provided"})
+
+        image_id = f"uploads/{uuid.uuid4()}.jpg"
+        result = {
+            "image_id": image_id,
+            "is_human": random.random() < 0.5,
+            "confidence": 0.85,
+            "details": {"agreement": True, "timed_out": []}
+        }
+        with _lock:
+            _results[image_id] = result
+        if "mode=async" in self.path:
+            return self._send(202, {"job_id": image_id, "status": "queued", "status_url": f"/jobs/{image_id}"})
+        self._send(200, result)
+
+    def do_GET(self):
+        if not self.path.startswith("/results/"):
+            return self._send(404, {"error": "Not found"})
+        with _lock:
+            result = _results.get(self.path[len("/results/"):])
+        if result is None:
+            return self._send(404, {"error": "Result not found"})
+        self._send(200, result)
+
+    def log_message(self, format, *args):
+        pass
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stub of the classification API")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--latency-ms", type=float, default=50)
+    parser.add_argument("--jitter-ms", type=float, default=20)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of uploads answered with 503")
+    args = parser.parse_args()
+
+    StubHandler.latency = args.latency_ms / 1000
+    StubHandler.jitter = args.jitter_ms / 1000
+    StubHandler.error_rate = args.error_rate
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), StubHandler)
+    print(f"Stub API listening on http://127.0.0.1:{args.port}")
+    server.serve_forever()
+
+if __name__ == "__main__":
+    main()
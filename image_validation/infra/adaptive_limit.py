@@ -0,0 +1,133 @@
+import os
+import time
+import logging
+import threading
+
+from utils import metrics
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# Concurrent calls per service start at the initial limit, grow by one per
+# limit's worth of successes, and shrink by the backoff factor on throttling
+ADAPTIVE_LIMIT_ENABLED = os.environ.get('ADAPTIVE_LIMIT_ENABLED', '1') == '1'
+# A full SQS batch puts BATCH_MAX_WORKERS (10) calls on each service at once, plus hedges
+LIMIT_INITIAL = float(os.environ.get('LIMIT_INITIAL', '16'))
+LIMIT_MIN = float(os.environ.get('LIMIT_MIN', '1'))
+LIMIT_MAX = float(os.environ.get('LIMIT_MAX', '64'))
+LIMIT_BACKOFF = float(os.environ.get('LIMIT_BACKOFF', '0.7'))
+
+# Calls that can't get a slot within this long are shed rather than queued further
+LIMIT_QUEUE_TIMEOUT_MS = float(os.environ.get('LIMIT_QUEUE_TIMEOUT_MS', '2000'))
+
+# Error codes that mean "slow down" rather than "broken"
+THROTTLE_CODES = {
+    'ThrottlingException',
+    'Throttling',
+    'TooManyRequestsException',
+    'ProvisionedThroughputExceededException',
+    'RequestLimitExceeded',
+    'SlowDown'
+}
+
+class Overloaded(Exception):
+    """Raised instead of calling the service when no slot freed up in time."""
+
+def is_throttle(error):
+    # botocore ClientErrors carry the service error code in their response
+    return getattr(error, 'response', {}).get('Error', {}).get('Code') in THROTTLE_CODES
+
+class AdaptiveLimiter:
+    """AIMD limit on concurrent calls to one service, shared by every thread in the container.
+
+    Each success raises the limit by 1/limit (about one per limit's worth of
+    calls); a throttle multiplies it by `backoff`. Throttles from calls that
+    started before the last decrease are ignored, so a burst of rejections
+    from one overloaded moment shrinks the limit once, not once per call.
+    Callers wait for a free slot for up to `queue_timeout` seconds, then
+    Overloaded is raised without calling the service.
+    """
+
+    def __init__(self, name, initial=16.0, minimum=1.0, maximum=64.0, backoff=0.7, queue_timeout=2.0):
+        self.name = name
+        self.minimum = minimum
+        self.maximum = maximum
+        self.backoff = backoff
+        self.queue_timeout = queue_timeout
+        self.limit = min(maximum, max(minimum, initial))
+        self.in_flight = 0
+        self.throttled = 0
+        self.shed = 0
+        self._last_decrease = 0.0
+        self._cond = threading.Condition()
+
+    def _acquire(self):
+        deadline = time.monotonic() + self.queue_timeout
+        with self._cond:
+            while self.in_flight >= int(self.limit):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.shed += 1
+                    raise Overloaded(f"{self.name}: no slot within {self.queue_timeout}s at limit {int(self.limit)}")
+                self._cond.wait(remaining)
+            self.in_flight += 1
+            return time.monotonic()
+
+    def _release(self, started, throttled):
+        with self._cond:
+            self.in_flight -= 1
+            if throttled:
+                self.throttled += 1
+                if started >= self._last_decrease:
+                    self.limit = max(self.minimum, self.limit * self.backoff)
+                    self._last_decrease = time.monotonic()
+                    logger.warning(f"{self.name} throttled, concurrency limit now {int(self.limit)}")
+            else:
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            self._cond.notify()
+
+    def call(self, fn, *args, **kwargs):
+        """Runs `fn` in a slot. Throttling errors shrink the limit and are re-raised."""
+        try:
+            started = self._acquire()
+        except Overloaded:
+            metrics.add_value(f"{self.name}Shed", 1)
+            raise
+
+        throttled = False
+        try:
+            return fn(*args, **kwargs)
+        except Exception as e:
+            throttled = is_throttle(e)
+            if throttled:
+                metrics.add_value(f"{self.name}Throttled", 1)
+            raise
+        finally:
+            self._release(started, throttled)
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+def get_limiter(name):
+    """Returns the container-wide limiter for `name`, creating it on first use."""
+    limiter = _limiters.get(name)
+    if limiter is None:
+        with _limiters_lock:
+            limiter = _limiters.get(name)
+            if limiter is None:
+                limiter = AdaptiveLimiter(
+                    name,
+                    initial=LIMIT_INITIAL,
+                    minimum=LIMIT_MIN,
+                    maximum=LIMIT_MAX,
+                    backoff=LIMIT_BACKOFF,
+                    queue_timeout=LIMIT_QUEUE_TIMEOUT_MS / 1000
+                )
+                _limiters[name] = limiter
+    return limiter
+
+def limited(name, fn, *args, **kwargs):
+    """Calls `fn` through the limiter for `name`, or directly when adaptive limiting is off."""
+    if not ADAPTIVE_LIMIT_ENABLED:
+        return fn(*args, **kwargs)
+    return get_limiter(name).call(fn, *args, **kwargs)
@@ -1,14 +1,26 @@
 import os
 import json
-import boto3
 import base64
+import hashlib
 import logging
-import cgi
-import io
+from datetime import datetime
+from urllib.parse import unquote
 
-from sagemaker_infer import classify_with_sagemaker
-from rekognition_infer import classify_with_rekognition
-from utils.dynamodb_utils import save_classification_result
+from classifier import classify_image, is_settled
+from image_format import ImageFormatError, UnsupportedFormat, validate as validate_image
+from image_payload import ImagePayload
+from batch_consumer import s3_objects
+from multipart import extract_file, MultipartError, PartTooLarge
+from utils import idempotency, metrics, near_duplicate
+from utils.aws_clients import get_client
+from utils.dynamodb_utils import (
+    save_classification_result, flush_results, get_classification_result, get_classification_results,
+    query_by_agreement, query_by_label
+)
+from utils.jobs import QUEUED, RUNNING, job_image_key, create_job, get_job, is_enabled as jobs_enabled
+from presigned_uploads import (
+    CONTENT_TYPES, UploadRequestError, upload_key, create_upload, complete_upload, abort_upload
+)
 
 # Initialize logging
 logger = logging.getLogger()
@@ -17,15 +29,48 @@ logger.setLevel(logging.INFO)
 # Environment Variables
 TABLE_NAME = os.environ.get('TABLE_NAME')
 BUCKET_NAME = os.environ.get('BUCKET_NAME', '')
+MAX_IMAGE_BYTES = int(os.environ.get('MAX_IMAGE_BYTES', str(6 * 1024 * 1024)))
 
-# Initialize AWS Clients
-s3 = boto3.client('s3')
+# "sync" classifies within the request; "async" stores the image and answers 202 with a job ID.
+# Clients can override per request with ?mode=sync|async or "Prefer: respond-async".
+CLASSIFY_MODE = os.environ.get('CLASSIFY_MODE', 'sync')
+
+# Upper bound on image IDs per POST /results:batchGet request
+RESULTS_BATCH_MAX_IDS = int(os.environ.get('RESULTS_BATCH_MAX_IDS', '100'))
+
+# Upper bound on results per GET /results page
+RESULTS_PAGE_MAX = int(os.environ.get('RESULTS_PAGE_MAX', '100'))
+
+def _route(event):
+    return event.get('routeKey') or f"{event.get('httpMethod')} {event.get('resource')}"
+
+def _is_api_event(event):
+    return bool(event.get('httpMethod') or event.get('requestContext'))
 
 def lambda_handler(event, context):
     """Determine whether request is from API Gateway or S3 Event and process accordingly."""
+    operation = _route(event) if _is_api_event(event) else 'S3Event'
+    with metrics.request(operation, RequestId=getattr(context, 'aws_request_id', None)):
+        return _handle_event(event, context)
+
+def _handle_event(event, context):
     try:
         # API Gateway Event
-        if event.get('httpMethod') or event.get('requestContext'):
+        if _is_api_event(event):
+            route = _route(event)
+            path_parameters = event.get('pathParameters') or {}
+            if route == 'GET /jobs/{job_id}':
+                return handle_job_status(path_parameters['job_id'])
+            if route == 'GET /results/{image_id+}':
+                return handle_get_result(event, unquote(path_parameters['image_id']))
+            if route == 'POST /results:batchGet':
+                return handle_batch_get_results(event)
+            if route == 'GET /results':
+                return handle_list_results(event)
+            if route == 'POST /uploads':
+                return handle_create_upload(event, context)
+            if route in ('POST /uploads/complete', 'POST /uploads/abort'):
+                return handle_finish_upload(event, route.endswith('/abort'))
             return handle_api_request(event, context)
         
         # S3 Event
@@ -41,6 +86,14 @@ def lambda_handler(event, context):
         logger.error(f"Unhandled error in Lambda: {str(e)}")
         return format_response({'error': 'Internal server error'}, 500)
 
+    finally:
+        # Buffered results and index entries must be written before the container is frozen
+        with metrics.span("Flush"):
+            failed = flush_results()
+            near_duplicate.flush()
+        if failed:
+            logger.error(f"Failed to save results for: {', '.join(failed)}")
+
 # --------------------------------------
 # ✅ API Gateway Handler (Direct Upload)
 # --------------------------------------
@@ -51,57 +104,321 @@ def handle_api_request(event, context):
 
     try:
         # Extract request body
-        body = event.get('body', '')
-        if event.get('isBase64Encoded', False):
-            body = base64.b64decode(body)
+        with metrics.span("Parse"):
+            body = event.get('body', '')
+            if event.get('isBase64Encoded', False):
+                body = base64.b64decode(body)
+            elif isinstance(body, str):
+                body = body.encode('utf-8')
+            metrics.add_value("RequestBytes", len(body), "Bytes")
 
-        # Parse multipart/form-data request
-        headers = event.get('headers', {})
-        environ = {'REQUEST_METHOD': 'POST'}
-        if headers and 'content-type' in headers:
-            environ['CONTENT_TYPE'] = headers['content-type']
+            # Parse multipart/form-data (or raw image) request without copying the image
+            headers = {k.lower(): v for k, v in (event.get('headers') or {}).items()}
+            try:
+                image_view = extract_file(body, headers.get('content-type', ''), 'image', MAX_IMAGE_BYTES)
+            except PartTooLarge:
+                return format_response({'error': f'Image exceeds {MAX_IMAGE_BYTES} bytes'}, 413)
+            except MultipartError as e:
+                return format_response({'error': str(e)}, 400)
 
-        # Read image from request
-        fp = io.BytesIO(body.encode('utf-8') if isinstance(body, str) else body)
-        form = cgi.FieldStorage(fp=fp, environ=environ)
-
-        if 'image' not in form:
+        if image_view is None:
             return format_response({'error': 'No image file provided'}, 400)
+        metrics.add_value("ImageBytes", len(image_view), "Bytes")
+
+        # Checked from the header alone, before anything is stored or sent for inference
+        try:
+            info = validate_image(image_view)
+        except ImageFormatError as e:
+            return reject_image(e)
 
-        fileitem = form['image']
-        image_bytes = fileitem.file.read()
+        if _query_mode(event) == 'async' and not jobs_enabled():
+            return format_response({'error': 'Asynchronous classification is not enabled'}, 400)
+        if _wants_async(event, headers):
+            return submit_job(context.aws_request_id, image_view, info)
 
         # Generate unique S3 Key
-        image_key = f"uploads/{context.aws_request_id}.jpg"
+        image_key = f"uploads/{context.aws_request_id}{info.extension}"
+
+        # Claimed before the upload, so the processor run its S3 notification triggers skips it
+        conflict = claim_conflict(image_key, claim_upload(image_key, context.aws_request_id))
+        if conflict is not None:
+            return conflict
+
+        # The payload materializes the part once; upload and inference share that buffer
+        payload = ImagePayload.from_bytes(BUCKET_NAME, image_key, image_view)
 
         # Upload to S3
-        s3.put_object(
-            Bucket=BUCKET_NAME,
-            Key=image_key,
-            Body=image_bytes,
-            ContentType='image/jpeg'
-        )
+        with metrics.span("S3Put"):
+            get_client('s3').put_object(
+                Bucket=BUCKET_NAME,
+                Key=image_key,
+                Body=payload.get_bytes(),
+                ContentType=info.content_type
+            )
         logger.info(f"Uploaded image to S3: s3://{BUCKET_NAME}/{image_key}")
 
-        # Process Image
-        return classify_and_store_result(image_key)
+        # Process Image from the bytes already in memory
+        return classify_and_store_result(payload, claim_owner=context.aws_request_id)
 
     except Exception as e:
         logger.error(f"Error in API request processing: {str(e)}")
         return format_response({'error': 'Image processing failed'}, 500)
 
+def reject_image(error):
+    """Responds to an upload that can never be classified: 415 for the format, 422 for its size."""
+    metrics.set_property("Rejected", str(error))
+    status = 415 if isinstance(error, UnsupportedFormat) else 422
+    return format_response({'error': str(error)}, status)
+
+def _query_mode(event):
+    return (event.get('queryStringParameters') or {}).get('mode')
+
+def _wants_async(event, headers):
+    # Without a jobs table, a preference for async (header or default) is served synchronously
+    if not jobs_enabled():
+        return False
+    mode = _query_mode(event)
+    if mode in ('sync', 'async'):
+        return mode == 'async'
+    if 'respond-async' in headers.get('prefer', ''):
+        return True
+    return CLASSIFY_MODE == 'async'
+
+# --------------------------------------
+# ✅ Async Jobs
+# --------------------------------------
+def submit_job(job_id, image_view, info):
+    """Stores the image for out-of-band classification and returns 202 with the job ID."""
+    image_key = job_image_key(job_id, info.extension)
+
+    # The job record must exist before the upload notification can reach the processor
+    create_job(job_id, image_key)
+    with metrics.span("S3Put"):
+        get_client('s3').put_object(
+            Bucket=BUCKET_NAME,
+            Key=image_key,
+            Body=bytes(image_view),
+            ContentType=info.content_type
+        )
+    logger.info(f"Queued job {job_id} for s3://{BUCKET_NAME}/{image_key}")
+
+    status_url = f"/jobs/{job_id}"
+    return format_response(
+        {"job_id": job_id, "status": QUEUED, "status_url": status_url},
+        202,
+        headers={'Location': status_url, 'Retry-After': '1'}
+    )
+
+def handle_job_status(job_id):
+    """Returns the status of an async job, with the verdict once it is done."""
+    try:
+        job = get_job(job_id)
+    except Exception as e:
+        logger.error(f"Error reading job {job_id}: {str(e)}")
+        return format_response({'error': 'Failed to read job'}, 500)
+
+    if job is None:
+        return format_response({'error': 'Job not found'}, 404)
+
+    if job["result"] is not None:
+        job["result"] = result_body(job["result"])
+
+    # Tell pollers when to come back while the job is still in progress
+    headers = {'Retry-After': '1'} if job["status"] in (QUEUED, RUNNING) else None
+    return format_response(job, 200, headers=headers)
+
+# --------------------------------------
+# ✅ Presigned Direct-to-S3 Uploads
+# --------------------------------------
+def handle_create_upload(event, context):
+    """Issues presigned URLs so the image goes straight to S3 instead of through this Lambda.
+
+    Body: {"content_type": "image/jpeg", "size": 123456, "method": "post" | "put"}.
+    The object lands under uploads/, where the S3 notification classifies it.
+    When job tracking is configured the upload is also a job that can be polled.
+    """
+    try:
+        request = _json_body(event)
+        content_type = request.get('content_type', 'image/jpeg')
+        size = request.get('size')
+        if size is not None and not isinstance(size, int):
+            raise ValueError("size must be an integer")
+    except (ValueError, TypeError) as e:
+        return format_response({'error': f'Invalid request: {str(e)}'}, 400)
+    if content_type not in CONTENT_TYPES:
+        return format_response({'error': f'Unsupported content type: {content_type}'}, 400)
+
+    upload_id = context.aws_request_id
+    if jobs_enabled():
+        image_key = job_image_key(upload_id, CONTENT_TYPES[content_type])
+    else:
+        image_key = upload_key(upload_id, content_type)
+
+    try:
+        upload = create_upload(BUCKET_NAME, image_key, content_type, size, request.get('method', 'post'))
+    except UploadRequestError as e:
+        return format_response({'error': str(e)}, 400)
+
+    upload["image_id"] = image_key
+    if jobs_enabled():
+        create_job(upload_id, image_key)
+        upload.update({"job_id": upload_id, "status_url": f"/jobs/{upload_id}"})
+    if upload["upload_type"] == "multipart":
+        upload.update({"complete_url": "/uploads/complete", "abort_url": "/uploads/abort"})
+    return format_response(upload, 201)
+
+def handle_finish_upload(event, abort=False):
+    """Completes or aborts a multipart upload. Body: {"key", "upload_id", "parts": [{"part_number", "etag"}]}."""
+    try:
+        request = _json_body(event)
+        key, upload_id = request['key'], request['upload_id']
+        if abort:
+            abort_upload(BUCKET_NAME, key, upload_id)
+        else:
+            complete_upload(BUCKET_NAME, key, upload_id, request.get('parts') or [])
+    except (KeyError, TypeError, ValueError) as e:
+        return format_response({'error': f'Invalid request: {str(e)}'}, 400)
+    except Exception as e:
+        logger.error(f"Error finishing upload: {str(e)}")
+        return format_response({'error': 'Failed to finish upload'}, 502)
+
+    return format_response({"key": key, "status": "aborted" if abort else "completed"})
+
+def _json_body(event):
+    body = event.get('body') or '{}'
+    if event.get('isBase64Encoded', False):
+        body = base64.b64decode(body)
+    request = json.loads(body)
+    if not isinstance(request, dict):
+        raise ValueError("Body must be a JSON object")
+    return request
+
+# --------------------------------------
+# ✅ Result Lookup
+# --------------------------------------
+def _etag(body):
+    return '"' + hashlib.sha256(json.dumps(body, sort_keys=True).encode('utf-8')).hexdigest()[:32] + '"'
+
+def _etag_matches(etag, if_none_match):
+    candidates = [tag.strip() for tag in if_none_match.split(',')]
+    return '*' in candidates or etag in (tag[2:] if tag.startswith('W/') else tag for tag in candidates)
+
+def _is_true(value):
+    return str(value).lower() in ('1', 'true', 'yes')
+
+def handle_get_result(event, image_id):
+    """Returns the stored result for one image, honouring If-None-Match."""
+    headers = {k.lower(): v for k, v in (event.get('headers') or {}).items()}
+    consistent = _is_true((event.get('queryStringParameters') or {}).get('consistent'))
+    try:
+        result = get_classification_result(image_id, consistent=consistent)
+    except Exception as e:
+        logger.error(f"Error reading result for {image_id}: {str(e)}")
+        return format_response({'error': 'Failed to read result'}, 500)
+
+    if result is None:
+        return format_response({'error': 'Result not found'}, 404)
+
+    body = stored_result_body(result)
+    etag = _etag(body)
+    if _etag_matches(etag, headers.get('if-none-match', '')):
+        response = format_response('', 304, headers={'ETag': etag})
+        response['body'] = ''
+        return response
+    return format_response(body, 200, headers={'ETag': etag})
+
+def handle_batch_get_results(event):
+    """Looks up many results at once. Body: {"image_ids": [...], "consistent": false}."""
+    try:
+        request = _json_body(event)
+        image_ids = request['image_ids']
+        if not isinstance(image_ids, list) or not all(isinstance(i, str) for i in image_ids):
+            raise ValueError("image_ids must be a list of strings")
+    except (ValueError, KeyError, TypeError) as e:
+        return format_response({'error': f'Invalid request: {str(e)}'}, 400)
+
+    if len(image_ids) > RESULTS_BATCH_MAX_IDS:
+        return format_response({'error': f'At most {RESULTS_BATCH_MAX_IDS} image_ids per request'}, 400)
+
+    try:
+        results, unprocessed = get_classification_results(image_ids, consistent=_is_true(request.get('consistent')))
+    except Exception as e:
+        logger.error(f"Error reading result batch: {str(e)}")
+        return format_response({'error': 'Failed to read results'}, 500)
+
+    return format_response({
+        "results": {image_id: stored_result_body(result) for image_id, result in results.items()},
+        "missing": [i for i in dict.fromkeys(image_ids) if i not in results and i not in unprocessed],
+        # Still throttled after retries; the client may ask again for these
+        "unprocessed": unprocessed
+    })
+
+def _parse_time(value):
+    if not value:
+        return None
+    # fromisoformat doesn't accept a "Z" suffix before Python 3.11
+    return datetime.fromisoformat(value[:-1] + '+00:00' if value.endswith('Z') else value)
+
+def _parse_flag(value, name):
+    if value is None:
+        return None
+    if value.lower() not in ('true', 'false'):
+        raise ValueError(f"{name} must be true or false")
+    return value.lower() == 'true'
+
+def handle_list_results(event):
+    """Pages through results by agreement or by verdict, newest first.
+
+    Query: agreement=true|false or is_human=true|false, optional since/until
+    (ISO 8601, UTC when no offset is given), limit and cursor.
+    """
+    params = event.get('queryStringParameters') or {}
+    try:
+        agreement = _parse_flag(params.get('agreement'), 'agreement')
+        is_human = _parse_flag(params.get('is_human'), 'is_human')
+        if (agreement is None) == (is_human is None):
+            raise ValueError("Give exactly one of agreement or is_human")
+        since, until = _parse_time(params.get('since')), _parse_time(params.get('until'))
+        limit = int(params.get('limit', RESULTS_PAGE_MAX))
+        if not 1 <= limit <= RESULTS_PAGE_MAX:
+            raise ValueError(f"limit must be between 1 and {RESULTS_PAGE_MAX}")
+
+        if agreement is not None:
+            results, cursor = query_by_agreement(agreement, since, until, limit, params.get('cursor'))
+        else:
+            results, cursor = query_by_label(is_human, since, until, limit, params.get('cursor'))
+    except ValueError as e:
+        return format_response({'error': f'Invalid request: {str(e)}'}, 400)
+    except Exception as e:
+        logger.error(f"Error querying results: {str(e)}")
+        return format_response({'error': 'Failed to query results'}, 500)
+
+    return format_response({
+        "results": [stored_result_body(result) for result in results],
+        "cursor": cursor
+    })
+
 # --------------------------------------
 # ✅ S3 Event Handler (Uploaded Image)
 # --------------------------------------
 def handle_s3_event(event, context):
     """Handles image classification when a new image is uploaded to S3."""
     try:
-        # Extract S3 event data
-        s3_event = event['Records'][0]['s3']
-        image_key = s3_event['object']['key']
+        # Process every record in the event, not just the first
+        responses = []
+        for _, image_key in s3_objects(event):
+            conflict = claim_conflict(image_key, claim_upload(image_key, context.aws_request_id))
+            if conflict is not None:
+                responses.append(conflict)
+            else:
+                responses.append(classify_and_store_result(
+                    ImagePayload.from_s3(BUCKET_NAME, image_key), claim_owner=context.aws_request_id
+                ))
+        if len(responses) == 1:
+            return responses[0]
 
-        # Process Image
-        return classify_and_store_result(image_key)
+        failed = sum(1 for response in responses if response['statusCode'] != 200)
+        return format_response({"processed": len(responses), "failed": failed}, 500 if failed else 200)
 
     except Exception as e:
         logger.error(f"Error processing S3 event: {str(e)}")
@@ -110,60 +427,96 @@ def handle_s3_event(event, context):
 # --------------------------------------
 # ✅ Image Classification & Result Storage
 # --------------------------------------
-def classify_and_store_result(image_key):
-    """Runs SageMaker & Rekognition, compares results, and stores in DynamoDB."""
+def claim_upload(image_key, owner):
+    """Claims an uploaded object for classification. Returns the idempotency outcome."""
+    if not idempotency.is_enabled():
+        return idempotency.CLAIMED
+    outcome = idempotency.claim(idempotency.object_key(BUCKET_NAME, image_key), owner)
+    metrics.set_property("Idempotency", outcome)
+    return outcome
+
+def claim_conflict(image_key, outcome):
+    """The response for an object another run has classified or is classifying, or None to go ahead."""
+    if outcome == idempotency.DUPLICATE:
+        return format_response({"image_id": image_key, "status": "duplicate"})
+    if outcome == idempotency.BUSY:
+        # A failure, so a retried invocation comes back after the other run's lease
+        return format_response({"image_id": image_key, "status": "busy"}, 409)
+    return None
+
+def classify_and_store_result(payload, claim_owner=None):
+    """Runs SageMaker & Rekognition concurrently, compares results, and stores in DynamoDB.
+
+    With `claim_owner`, the object's claim is completed when the verdict is
+    settled and released otherwise, so another run can still classify it.
+    """
+    succeeded = False
     try:
         # Run classifications
-        sagemaker_result = classify_with_sagemaker(BUCKET_NAME, image_key)
-        rekognition_result = classify_with_rekognition(BUCKET_NAME, image_key)
-
-        # Determine agreement & confidence
-        agreement = (sagemaker_result == rekognition_result)
-        confidence = 0.85 if agreement else 0.5  # Example confidence metric
-        is_human = (sagemaker_result == "human" or rekognition_result == "human")
-
-        # Create result object
-        result = {
-            "image_id": image_key,
-            "sagemaker_result": sagemaker_result,
-            "rekognition_result": rekognition_result,
-            "agreement": agreement,
-            "confidence": confidence,
-            "is_human": is_human
-        }
+        with metrics.span("Classify"):
+            result = classify_image(payload)
 
-        # Save to DynamoDB
-        save_classification_result(result)
+        # Save to DynamoDB; a claimed object's result is written before the claim is completed,
+        # since a buffered write that later failed would leave it marked done with no result
+        claimed = bool(claim_owner) and idempotency.is_enabled()
+        succeeded = save_classification_result(result, sync=True if claimed else None) and is_settled(result)
 
         # Return API Response
-        return format_response({
-            "is_human": is_human,
-            "confidence": confidence,
-            "details": {
-                "sagemaker_result": sagemaker_result,
-                "rekognition_result": rekognition_result,
-                "agreement": agreement
-            }
-        })
+        return format_response(result_body(result))
 
     except Exception as e:
         logger.error(f"Classification process failed: {str(e)}")
         return format_response({'error': 'Classification failed'}, 500)
 
+    finally:
+        if claim_owner and idempotency.is_enabled():
+            try:
+                idempotency.settle(idempotency.object_key(BUCKET_NAME, payload.image_key), claim_owner, succeeded)
+            except Exception as e:
+                # The lease still expires on its own
+                logger.error(f"Could not settle claim on {payload.image_key}: {str(e)}")
+
+def result_body(result):
+    """Shapes a verdict into the API response body."""
+    return {
+        "image_id": result["image_id"],
+        "is_human": result["is_human"],
+        "confidence": result["confidence"],
+        "details": {
+            # Stored results only carry the backends that ran
+            "sagemaker_result": result.get("sagemaker_result"),
+            "rekognition_result": result.get("rekognition_result"),
+            "sagemaker_score": result.get("sagemaker_score"),
+            "rekognition_score": result.get("rekognition_score"),
+            "onnx_result": result.get("onnx_result"),
+            "onnx_score": result.get("onnx_score"),
+            "agreement": result["agreement"],
+            "timed_out": result["timed_out"],
+            "unavailable": result.get("unavailable", []),
+            "fallback": result.get("fallback")
+        }
+    }
+
+def stored_result_body(result):
+    """Like `result_body`, plus the time the result was stored."""
+    return {**result_body(result), "timestamp": result.get("timestamp")}
+
 # --------------------------------------
 # ✅ Response Formatter
 # --------------------------------------
-def format_response(body, status_code=200, cors=True):
+def format_response(body, status_code=200, cors=True, headers=None):
     """Formats API response with optional CORS headers."""
-    headers = {'Content-Type': 'application/json'}
+    response_headers = {'Content-Type': 'application/json'}
     if cors:
-        headers.update({
+        response_headers.update({
             'Access-Control-Allow-Origin': '*',
             'Access-Control-Allow-Credentials': True
         })
+    if headers:
+        response_headers.update(headers)
     
     return {
         'statusCode': status_code,
-        'headers': headers,
+        'headers': response_headers,
         'body': json.dumps(body)
     }
@@ -0,0 +1,101 @@
+import os
+import json
+import logging
+from urllib.parse import unquote_plus
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# Separate from the fan-out pool so batch workers never wait on their own backend calls
+BATCH_MAX_WORKERS = int(os.environ.get('BATCH_MAX_WORKERS', '10'))
+
+_executor = ThreadPoolExecutor(max_workers=BATCH_MAX_WORKERS, thread_name_prefix='batch')
+
+def s3_objects(s3_notification):
+    """Returns `(bucket_name, image_key)` for every record of an S3 event notification."""
+    objects = []
+    for record in s3_notification.get('Records', []):
+        if 's3' not in record:
+            continue
+        s3_event = record['s3']
+        # Keys arrive URL-encoded, with spaces as '+'
+        objects.append((s3_event['bucket']['name'], unquote_plus(s3_event['object']['key'])))
+    return objects
+
+def is_sqs_event(event):
+    records = event.get('Records') or []
+    return bool(records) and records[0].get('eventSource') == 'aws:sqs'
+
+def _process_message(message, process_object):
+    """Processes every S3 object in one SQS message; raises if any of them failed."""
+    body = json.loads(message['body'])
+    if body.get('Event') == 's3:TestEvent':
+        return
+
+    failed = []
+    for bucket_name, image_key in s3_objects(body):
+        try:
+            if not process_object(bucket_name, image_key):
+                failed.append(image_key)
+        except Exception as e:
+            logger.error(f"Error processing s3://{bucket_name}/{image_key}: {str(e)}")
+            failed.append(image_key)
+    if failed:
+        raise RuntimeError(f"Failed to process {', '.join(failed)}")
+
+def process_sqs_batch(event, process_object, finalize=None):
+    """Processes all messages of an SQS batch concurrently.
+
+    `process_object(bucket_name, image_key)` returns a truthy value on
+    success. `finalize()`, if given, runs once after every message and
+    returns image keys whose deferred work (e.g. buffered writes) failed.
+    Returns the partial-batch response, listing the message IDs that
+    failed so only those are redelivered.
+    """
+    records = event['Records']
+    futures = {
+        record['messageId']: _executor.submit(_process_message, record, process_object)
+        for record in records
+    }
+
+    failures = []
+    for message_id, future in futures.items():
+        try:
+            future.result()
+        except Exception as e:
+            logger.error(f"Message {message_id} failed: {str(e)}")
+            failures.append({"itemIdentifier": message_id})
+
+    if finalize is not None:
+        failed_keys = set(finalize())
+        failed_ids = {failure["itemIdentifier"] for failure in failures}
+        for record in records:
+            if record['messageId'] in failed_ids:
+                continue
+            keys = {key for _, key in s3_objects(json.loads(record['body']))}
+            if keys & failed_keys:
+                failures.append({"itemIdentifier": record['messageId']})
+
+    logger.info(f"Processed {len(records) - len(failures)}/{len(records)} messages")
+    return {"batchItemFailures": failures}
+
+def process_s3_event(event, process_object, finalize=None):
+    """Processes every record of a direct S3 event concurrently. Returns `(succeeded, failed)` keys."""
+    objects = s3_objects(event)
+    futures = [(key, _executor.submit(process_object, bucket, key)) for bucket, key in objects]
+
+    succeeded, failed = [], []
+    for image_key, future in futures:
+        try:
+            ok = future.result()
+        except Exception as e:
+            logger.error(f"Error processing {image_key}: {str(e)}")
+            ok = False
+        (succeeded if ok else failed).append(image_key)
+
+    if finalize is not None:
+        failed_keys = set(finalize())
+        failed.extend(key for key in succeeded if key in failed_keys)
+        succeeded = [key for key in succeeded if key not in failed_keys]
+    return succeeded, failed
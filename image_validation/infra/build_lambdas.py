@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+"""
+Builds each Lambda function's deployment zip from the modules in this directory.
+
+The files in a zip are found by following the handler's imports, so a new
+module is picked up without editing a list. Zips are reproducible: entries
+are sorted and carry a fixed timestamp and permissions, so an unchanged
+tree rebuilds byte for byte. Each function's third-party dependencies are
+pip-installed for the Lambda platform at pinned versions, with tests,
+caches and sources stripped; boto3 and botocore are never bundled, the
+Lambda runtime provides them.
+
+Options:
+  --no-deps      leave the dependencies out, for a quick code-only build;
+                 stack.py refuses to deploy such a zip
+  --extras       also bundle optional dependency groups, e.g. "onnx" for
+                 the in-process ONNX backend
+  --precompile   ship unchecked-hash .pyc files, skipping compilation at
+                 cold start (only when this interpreter matches the runtime)
+  --check        rebuild into a temporary directory and fail if any
+                 committed zip differs
+
+Each build reports artifact size and the handler's measured import time.
+
+Usage: python build_lambdas.py [--functions api_handler ...] [--no-deps] [--extras onnx] [--precompile]
+"""
+import os
+import sys
+import ast
+import json
+import shutil
+import zipfile
+import argparse
+import tempfile
+import subprocess
+import py_compile
+import importlib.util
+
+import import_budget
+
+INFRA = os.path.dirname(os.path.abspath(__file__))
+
+# Must match the functions' runtime in stack.py
+RUNTIME_VERSION = (3, 9)
+PLATFORM = 'manylinux2014_x86_64'
+
+# Third-party packages each function bundles. Pillow backs normalization and the
+# near-duplicate stage, both on by default. Extras are only bundled on request,
+# since they are much larger than the code. Pinned so rebuilds are reproducible.
+PILLOW = 'Pillow==11.3.0'
+ONNX = ['onnxruntime==1.19.2', 'numpy==2.0.2']
+FUNCTIONS = {
+    'api_handler': {'dependencies': [PILLOW], 'extras': {'onnx': ONNX}},
+    'image_processor': {'dependencies': [PILLOW], 'extras': {'onnx': ONNX}},
+    'training_handler': {'dependencies': [], 'extras': {}}
+}
+
+# Provided by the Lambda Python runtime
+RUNTIME_PROVIDED = {'boto3', 'botocore', 's3transfer', 'jmespath', 'dateutil', 'urllib3', 'six'}
+
+# Never useful inside a deployment package
+STRIP_DIRS = {'__pycache__', 'tests', 'test'}
+STRIP_SUFFIXES = ('.pyc', '.pyi', '.pyx', '.pxd', '.c', '.h', '.cpp')
+
+# Earliest timestamp a zip entry can carry; used for every entry so builds don't depend on mtimes
+ZIP_EPOCH = (1980, 1, 1, 0, 0, 0)
+
+def _imported_names(path):
+    """Top-level and dotted names imported anywhere in the file, including inside try/except."""
+    with open(path, 'rb') as f:
+        tree = ast.parse(f.read(), filename=path)
+    names = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            names.update(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.module and node.level == 0:
+            names.add(node.module)
+            # `from utils import metrics` imports the submodule utils.metrics
+            names.update(f"{node.module}.{alias.name}" for alias in node.names)
+    return names
+
+def _local_path(name):
+    """Path of the module `name` in this directory, or None if it isn't one of ours."""
+    parts = name.split('.')
+    module = os.path.join(INFRA, *parts) + '.py'
+    package = os.path.join(INFRA, *parts, '__init__.py')
+    if os.path.isfile(module):
+        return module
+    if os.path.isfile(package):
+        return package
+    return None
+
+def local_modules(handler):
+    """Relative paths of every local module reachable from `handler` by imports."""
+    found = set()
+    pending = [handler]
+    while pending:
+        name = pending.pop()
+        path = _local_path(name)
+        if path is None:
+            continue
+        relative = os.path.relpath(path, INFRA)
+        if relative in found:
+            continue
+        found.add(relative)
+        # Importing a submodule runs its parent packages' __init__ first
+        parts = name.split('.')
+        pending.extend('.'.join(parts[:i]) for i in range(1, len(parts)))
+        pending.extend(_imported_names(path))
+    return sorted(found)
+
+def install_dependencies(packages, target):
+    """pip-installs Lambda-platform wheels of `packages` into `target`."""
+    if not packages:
+        return
+    subprocess.run(
+        [sys.executable, '-m', 'pip', 'install', '--quiet', '--no-compile', '--target', target,
+         '--platform', PLATFORM, '--implementation', 'cp', '--only-binary=:all:',
+         '--python-version', '.'.join(str(v) for v in RUNTIME_VERSION), *packages],
+        check=True
+    )
+    for name in os.listdir(target):
+        if name.split('-')[0].split('.')[0].lower() in RUNTIME_PROVIDED:
+            shutil.rmtree(os.path.join(target, name), ignore_errors=True)
+
+def _staged_files(root):
+    """Relative paths under `root` worth shipping, with caches, tests and sources stripped."""
+    files = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = [d for d in dirnames if d not in STRIP_DIRS]
+        for name in filenames:
+            if not name.endswith(STRIP_SUFFIXES):
+                files.append(os.path.relpath(os.path.join(dirpath, name), root))
+    return files
+
+def _precompiled(root, relative):
+    """Compiles `relative` into its __pycache__ entry and returns that entry's relative path."""
+    source = os.path.join(root, relative)
+    cached = importlib.util.cache_from_source(source)
+    # Unchecked hash pycs don't embed the source mtime, so they are reproducible and never revalidated
+    py_compile.compile(source, cfile=cached, doraise=True,
+                       invalidation_mode=py_compile.PycInvalidationMode.UNCHECKED_HASH)
+    return os.path.relpath(cached, root)
+
+def write_zip(root, files, output):
+    """Writes `files` (relative to `root`) to `output` in sorted order with fixed metadata."""
+    with zipfile.ZipFile(output, 'w', zipfile.ZIP_DEFLATED, compresslevel=9) as archive:
+        for relative in sorted(files):
+            info = zipfile.ZipInfo(relative.replace(os.sep, '/'), date_time=ZIP_EPOCH)
+            info.external_attr = 0o100644 << 16
+            info.compress_type = zipfile.ZIP_DEFLATED
+            with open(os.path.join(root, relative), 'rb') as f:
+                archive.writestr(info, f.read(), compresslevel=9)
+
+def build(function, output_dir, with_deps=True, precompile=False, extras=()):
+    """Builds `<function>.zip` in `output_dir` and returns its report entry."""
+    spec = FUNCTIONS[function]
+    dependencies = list(spec['dependencies'])
+    for extra in extras:
+        dependencies += spec['extras'].get(extra, [])
+    with tempfile.TemporaryDirectory(prefix=f'build-{function}-') as stage:
+        for relative in local_modules(function):
+            os.makedirs(os.path.dirname(os.path.join(stage, relative)), exist_ok=True)
+            shutil.copyfile(os.path.join(INFRA, relative), os.path.join(stage, relative))
+        if with_deps:
+            install_dependencies(dependencies, stage)
+
+        files = _staged_files(stage)
+        if precompile:
+            files += [_precompiled(stage, f) for f in files if f.endswith('.py')]
+
+        output = os.path.join(output_dir, f'{function}.zip')
+        write_zip(stage, files, output)
+        uncompressed = sum(os.path.getsize(os.path.join(stage, f)) for f in files)
+
+    # Imported from the unpacked zip, so a module missing from it fails here rather than in Lambda
+    with tempfile.TemporaryDirectory(prefix=f'import-{function}-') as unpacked:
+        with zipfile.ZipFile(output) as archive:
+            archive.extractall(unpacked)
+        import_ms, heaviest = import_budget.measure(function, unpacked)
+
+    return {
+        'zip': os.path.relpath(output, INFRA),
+        'files': len(files),
+        'zip_bytes': os.path.getsize(output),
+        'unpacked_bytes': uncompressed,
+        'import_ms': round(import_ms, 1),
+        'heaviest_imports': [[name, round(ms, 1)] for name, ms in
+                             sorted(heaviest.items(), key=lambda item: item[1], reverse=True)[:5]]
+    }
+
+def _same_zip(a, b):
+    with open(a, 'rb') as f, open(b, 'rb') as g:
+        return f.read() == g.read()
+
+def main():
+    parser = argparse.ArgumentParser(description="Build reproducible Lambda deployment zips")
+    parser.add_argument('--functions', nargs='+', default=list(FUNCTIONS), choices=list(FUNCTIONS))
+    parser.add_argument('--output-dir', default=INFRA, help="Where to write the zips (stack.py reads them from here)")
+    parser.add_argument('--no-deps', dest='with_deps', action='store_false', help="Leave out third-party dependencies")
+    parser.add_argument('--extras', nargs='+', default=[], choices=['onnx'], help="Optional dependency groups to bundle")
+    parser.add_argument('--precompile', action='store_true', help="Ship .pyc files for the Lambda runtime")
+    parser.add_argument('--check', action='store_true', help="Fail if the committed zips are out of date")
+    parser.add_argument('--json', action='store_true', help="Print the report as JSON")
+    args = parser.parse_args()
+
+    if args.precompile and sys.version_info[:2] != RUNTIME_VERSION:
+        # Bytecode is version-specific; pycs for the wrong interpreter would just be ignored at runtime
+        print(f"Skipping --precompile: building with Python {sys.version_info[0]}.{sys.version_info[1]}, "
+              f"the runtime is {RUNTIME_VERSION[0]}.{RUNTIME_VERSION[1]}", file=sys.stderr)
+        args.precompile = False
+
+    output_dir = tempfile.mkdtemp(prefix='lambda-check-') if args.check else args.output_dir
+    os.makedirs(output_dir, exist_ok=True)
+    report, stale = {}, []
+    try:
+        for function in args.functions:
+            report[function] = build(function, output_dir, args.with_deps, args.precompile, args.extras)
+            committed = os.path.join(args.output_dir, f'{function}.zip')
+            if args.check and not (os.path.exists(committed) and
+                                   _same_zip(committed, os.path.join(output_dir, f'{function}.zip'))):
+                stale.append(function)
+    finally:
+        if args.check:
+            shutil.rmtree(output_dir, ignore_errors=True)
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        for function, entry in report.items():
+            print(f"{function}: {entry['files']} files, {entry['zip_bytes'] / 1024:.1f} KiB zipped "
+                  f"({entry['unpacked_bytes'] / 1024:.1f} KiB unpacked), import {entry['import_ms']} ms")
+
+    if stale:
+        print(f"Out of date, rebuild with build_lambdas.py: {', '.join(stale)}", file=sys.stderr)
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
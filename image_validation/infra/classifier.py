@@ -0,0 +1,189 @@
+import os
+import json
+import time
+import logging
+
+from fanout import run_backends, REQUEST_BUDGET_SECONDS, TIMEOUT, ERROR
+from resilience import UNAVAILABLE, resilient
+from onnx_infer import classify_with_onnx, is_configured as onnx_is_configured
+from sagemaker_infer import classify_with_sagemaker
+from rekognition_infer import classify_with_rekognition
+from utils import metrics, near_duplicate
+from utils.classification_cache import content_hash, get_or_classify, get_stats, lookup
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# All known inference backends, keyed by the name used in stored results (result_schema.BACKEND_NAMES)
+BACKENDS = {
+    "sagemaker": classify_with_sagemaker,
+    "rekognition": classify_with_rekognition,
+    # In-process CPU model: a fast first pass for the cascade, and a fallback when the endpoints are down
+    "onnx": classify_with_onnx
+}
+
+# Backend results that are not a classification
+FAILURES = (ERROR, TIMEOUT, UNAVAILABLE)
+
+# Hedging and circuit breaking per backend, shared by every request in the container
+_resilient_backends = {name: resilient(name, backend) for name, backend in BACKENDS.items()}
+
+# Comma-separated subset of BACKENDS to run for every image
+ENABLED_BACKENDS = [
+    name.strip() for name in os.environ.get('INFERENCE_BACKENDS', 'sagemaker,rekognition').split(',')
+    if name.strip()
+]
+
+# Score at or above which a backend's verdict is "human"
+HUMAN_THRESHOLD = float(os.environ.get('HUMAN_THRESHOLD', '0.7'))
+
+# "fanout" runs every enabled backend; "cascade" runs the primary first and
+# only escalates when its score falls inside the ambiguity band
+INFERENCE_POLICY = os.environ.get('INFERENCE_POLICY', 'fanout')
+CASCADE_PRIMARY = os.environ.get('CASCADE_PRIMARY', 'sagemaker')
+CASCADE_BAND_LOW = float(os.environ.get('CASCADE_BAND_LOW', '0.3'))
+CASCADE_BAND_HIGH = float(os.environ.get('CASCADE_BAND_HIGH', '0.9'))
+
+# Run when an enabled backend fails and this one didn't run, so an outage of the remote
+# endpoints still yields a verdict instead of a redelivery; empty disables
+FALLBACK_BACKEND = os.environ.get('FALLBACK_BACKEND', 'onnx' if onnx_is_configured() else '')
+
+def to_label(score):
+    """Collapses a raw backend score into "human"/"not_human", passing failures through."""
+    if not isinstance(score, (int, float)):
+        return score
+    return "human" if score >= HUMAN_THRESHOLD else "not_human"
+
+def is_ambiguous(score, low=None, high=None):
+    """True when a primary score should be escalated to the remaining backends."""
+    low = CASCADE_BAND_LOW if low is None else low
+    high = CASCADE_BAND_HIGH if high is None else high
+    return not isinstance(score, (int, float)) or low <= score <= high
+
+def _combine(scores, timed_out):
+    labels = {name: to_label(score) for name, score in scores.items()}
+    answered = [label for label in labels.values() if label not in FAILURES]
+    failed = len(answered) < len(labels)
+
+    # Agreement only means something when more than one backend answered;
+    # failed backends are never compared as if they were labels
+    agreement = None
+    if len(answered) > 1:
+        agreement = len(set(answered)) == 1
+    confidence = 0.85 if agreement and not failed else 0.5  # Example confidence metric
+    is_human = "human" in answered
+
+    verdict = {}
+    for name in BACKENDS:
+        verdict[f"{name}_result"] = labels.get(name)
+        score = scores.get(name)
+        verdict[f"{name}_score"] = score if isinstance(score, (int, float)) else None
+    verdict.update({
+        "agreement": agreement,
+        "confidence": confidence,
+        "is_human": is_human,
+        "timed_out": timed_out,
+        "unavailable": sorted(name for name, label in labels.items() if label == UNAVAILABLE),
+        "backends_run": sorted(scores)
+    })
+    return verdict
+
+def _run_policy(backends, payload, start):
+    if INFERENCE_POLICY == 'cascade' and CASCADE_PRIMARY in backends and len(backends) > 1:
+        primary = {CASCADE_PRIMARY: backends.pop(CASCADE_PRIMARY)}
+        scores, timed_out = run_backends(primary, payload)
+        if not is_ambiguous(scores[CASCADE_PRIMARY]):
+            logger.info(f"Cascade exit on {CASCADE_PRIMARY} score {scores[CASCADE_PRIMARY]:.3f}")
+            return scores, timed_out
+
+        logger.info(f"Cascade escalating past {CASCADE_PRIMARY} result {scores[CASCADE_PRIMARY]}")
+        # Both stages share one request budget
+        remaining = max(0.0, REQUEST_BUDGET_SECONDS - (time.monotonic() - start))
+        escalated, escalated_timed_out = run_backends(backends, payload, budget=remaining)
+        scores.update(escalated)
+        return scores, timed_out + escalated_timed_out
+
+    return run_backends(backends, payload)
+
+def run_inference(payload):
+    """Runs the enabled backends according to INFERENCE_POLICY and combines their verdicts."""
+    start = time.monotonic()
+    scores, timed_out = _run_policy({name: _resilient_backends[name] for name in ENABLED_BACKENDS}, payload, start)
+
+    fallback = None
+    if (FALLBACK_BACKEND in BACKENDS and FALLBACK_BACKEND not in scores
+            and any(to_label(score) in FAILURES for score in scores.values())):
+        logger.warning(f"Falling back to {FALLBACK_BACKEND} after {json.dumps({n: str(s) for n, s in scores.items()})}")
+        remaining = max(0.0, REQUEST_BUDGET_SECONDS - (time.monotonic() - start))
+        fallback_scores, fallback_timed_out = run_backends(
+            {FALLBACK_BACKEND: _resilient_backends[FALLBACK_BACKEND]}, payload, budget=remaining
+        )
+        scores.update(fallback_scores)
+        timed_out = timed_out + fallback_timed_out
+        if to_label(fallback_scores[FALLBACK_BACKEND]) not in FAILURES:
+            fallback = FALLBACK_BACKEND
+            metrics.add_value("FallbackVerdicts", 1)
+
+    verdict = _combine(scores, timed_out)
+    if fallback is not None:
+        # Only present on fallback verdicts, so other results carry no extra attribute
+        verdict["fallback"] = fallback
+    return verdict
+
+def is_complete(verdict):
+    """True when every backend that ran gave a classification; only complete verdicts are cached."""
+    return not verdict["timed_out"] and not any(
+        verdict.get(f"{name}_result") in FAILURES for name in BACKENDS
+    )
+
+def is_settled(verdict):
+    """True when the verdict is final: complete, or answered by the fallback backend.
+
+    Fallback verdicts are stored and acknowledged rather than redelivered,
+    but not cached, so the same image is classified in full once the
+    endpoints recover.
+    """
+    return is_complete(verdict) or verdict.get("fallback") is not None
+
+def _classify_uncached(payload, image_hash):
+    """Reuses the verdict of a near-identical frame when one is indexed, otherwise runs inference."""
+    if not near_duplicate.is_enabled():
+        return run_inference(payload)
+
+    try:
+        phash = near_duplicate.dhash(payload.get_bytes())
+    except Exception as e:
+        logger.warning(f"Could not compute perceptual hash: {str(e)}")
+        return run_inference(payload)
+
+    match = near_duplicate.find_near_duplicate(phash)
+    if match is not None:
+        reference, distance = match
+        # The index holds the matching image's content hash; its verdict may have expired from the cache
+        verdict = lookup(reference)
+        if verdict is not None:
+            logger.info(f"Reusing verdict of near-duplicate frame at distance {distance}")
+            return verdict
+
+    verdict = run_inference(payload)
+    if is_complete(verdict):
+        near_duplicate.remember(phash, image_hash)
+    return verdict
+
+def _outcome(label):
+    if label is None:
+        return "skipped"
+    return label if label in FAILURES else "ok"
+
+def classify_image(payload):
+    """Classifies an image, reusing any earlier verdict for identical or near-identical bytes."""
+    image_hash = content_hash(payload.get_bytes())
+    verdict = get_or_classify(image_hash, lambda: _classify_uncached(payload, image_hash), cacheable=is_complete)
+    logger.info(f"Classification cache stats: {json.dumps(get_stats())}")
+
+    result = {"image_id": payload.image_key, "content_hash": image_hash}
+    result.update(verdict)
+
+    for name in BACKENDS:
+        metrics.set_property(f"{name.capitalize()}Outcome", _outcome(verdict.get(f"{name}_result")))
+    return result
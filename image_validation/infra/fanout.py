@@ -0,0 +1,97 @@
+import os
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from utils import metrics
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# Deadlines (seconds) for a single backend call and for the whole fan-out
+BACKEND_TIMEOUT_SECONDS = float(os.environ.get('BACKEND_TIMEOUT_SECONDS', '10'))
+REQUEST_BUDGET_SECONDS = float(os.environ.get('REQUEST_BUDGET_SECONDS', '12'))
+# Every batch worker can have a call to each enabled backend in flight, so the pool
+# defaults to their product; a smaller pool queues calls behind each other
+_ENABLED_BACKEND_COUNT = len([n for n in os.environ.get('INFERENCE_BACKENDS', 'sagemaker,rekognition').split(',') if n.strip()])
+FANOUT_MAX_WORKERS = int(os.environ.get(
+    'FANOUT_MAX_WORKERS',
+    str(int(os.environ.get('BATCH_MAX_WORKERS', '10')) * max(1, _ENABLED_BACKEND_COUNT))
+))
+
+TIMEOUT = "timeout"
+ERROR = "error"
+
+QUEUED_POLL_SECONDS = 0.05
+
+# Created once per container so warm invocations reuse the worker threads
+_executor = ThreadPoolExecutor(max_workers=FANOUT_MAX_WORKERS, thread_name_prefix='fanout')
+
+def _timed(name, fn, started):
+    """Wraps `fn` to record in `started` when it begins running."""
+    def call(*args):
+        started[name] = time.monotonic()
+        return fn(*args)
+    return call
+
+def run_backends(backends, *args, timeouts=None, budget=None):
+    """Runs every backend concurrently and collects what finishes in time.
+
+    `backends` maps a backend name to a callable invoked with `*args`.
+    `timeouts` optionally overrides the per-backend deadline by name and
+    `budget` caps the whole call. Returns `(results, timed_out)` where
+    backends that missed their deadline are reported as "timeout" and
+    listed in `timed_out`. A backend's deadline runs from when its call
+    starts on a pool thread, so time spent queued for a thread only counts
+    against the overall budget.
+    """
+    timeouts = timeouts or {}
+    budget = REQUEST_BUDGET_SECONDS if budget is None else budget
+
+    start = time.monotonic()
+    request_deadline = start + budget
+
+    pending = {}
+    started = {}
+    for name, backend in backends.items():
+        # Backends run on pool threads but report their spans to the caller's request
+        pending[name] = _executor.submit(_timed(name, metrics.propagate(backend), started), *args)
+
+    def deadline(name):
+        if name not in started:
+            return request_deadline
+        return min(started[name] + timeouts.get(name, BACKEND_TIMEOUT_SECONDS), request_deadline)
+
+    results = {}
+    timed_out = []
+    while pending:
+        now = time.monotonic()
+        deadlines = {name: deadline(name) for name in pending}
+
+        # Give up on anything past its deadline; the thread finishes in the background
+        for name in [n for n in pending if deadlines[n] <= now]:
+            pending.pop(name).cancel()
+            results[name] = TIMEOUT
+            timed_out.append(name)
+            logger.warning(f"Backend {name} timed out after {now - start:.3f}s")
+
+        if not pending:
+            break
+
+        next_deadline = min(deadlines[n] for n in pending)
+        if any(n not in started for n in pending):
+            # A queued call's deadline is only known once it starts, so check back shortly
+            next_deadline = min(next_deadline, now + QUEUED_POLL_SECONDS)
+        done, _ = wait(list(pending.values()), timeout=max(0.0, next_deadline - now), return_when=FIRST_COMPLETED)
+
+        for name, future in list(pending.items()):
+            if future not in done:
+                continue
+            del pending[name]
+            try:
+                results[name] = future.result()
+            except Exception as e:
+                logger.error(f"Backend {name} failed: {str(e)}")
+                results[name] = ERROR
+
+    return results, timed_out
@@ -0,0 +1,173 @@
+import os
+import struct
+from collections import namedtuple
+
+# Format name -> (content type, stored object extension)
+FORMATS = {
+    'jpeg': ('image/jpeg', '.jpg'),
+    'png': ('image/png', '.png'),
+    'webp': ('image/webp', '.webp'),
+    'heic': ('image/heic', '.heic')
+}
+
+# WebP and HEIC are recognized but not accepted by default: Rekognition only takes
+# JPEG and PNG, and nothing converts them before inference
+ALLOWED_IMAGE_FORMATS = [
+    name.strip() for name in os.environ.get('ALLOWED_IMAGE_FORMATS', 'jpeg,png').split(',')
+    if name.strip()
+]
+# Limits on decoded size: tiny images can't show a person, huge ones are decompression bombs
+MIN_IMAGE_SIDE = int(os.environ.get('MIN_IMAGE_SIDE', '32'))
+MAX_IMAGE_PIXELS = int(os.environ.get('MAX_IMAGE_PIXELS', str(50 * 1000 * 1000)))
+# Uploaded objects above this size are never downloaded for classification
+MAX_OBJECT_BYTES = int(os.environ.get('MAX_OBJECT_BYTES', str(50 * 1024 * 1024)))
+
+# Enough to reach the dimensions of nearly every image, past EXIF blocks and embedded thumbnails
+SNIFF_BYTES = 64 * 1024
+
+ImageInfo = namedtuple('ImageInfo', ['format', 'content_type', 'extension', 'width', 'height'])
+
+class ImageFormatError(ValueError):
+    """Raised for uploads that can never be classified."""
+
+class UnsupportedFormat(ImageFormatError):
+    """The bytes are not an image in an allowed format."""
+
+# HEIF brands of still HEVC images; AVIF ("avif", and "mif1" without an HEVC brand) is not accepted
+HEIC_BRANDS = {b'heic', b'heix', b'heim', b'heis', b'hevc', b'hevx'}
+
+def _jpeg_size(data):
+    # Walk the marker segments up to the first start-of-frame, which holds the dimensions
+    offset = 2
+    while offset + 4 <= len(data):
+        if data[offset] != 0xFF:
+            return None
+        marker = data[offset + 1]
+        if marker == 0xFF:  # Fill byte
+            offset += 1
+            continue
+        if marker in (0x01, 0xD8) or 0xD0 <= marker <= 0xD7:  # Standalone markers carry no length
+            offset += 2
+            continue
+        length = struct.unpack_from('>H', data, offset + 2)[0]
+        # SOF0-SOF15, except DHT (C4), JPG (C8) and DAC (CC)
+        if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+            if offset + 9 > len(data):
+                return None
+            height, width = struct.unpack_from('>HH', data, offset + 5)
+            return width, height
+        offset += 2 + length
+    return None
+
+def _png_size(data):
+    if len(data) < 24 or bytes(data[12:16]) != b'IHDR':
+        return None
+    return struct.unpack_from('>II', data, 16)
+
+def _webp_size(data):
+    chunk = bytes(data[12:16])
+    if chunk == b'VP8 ' and len(data) >= 30:
+        # Lossy: 14-bit dimensions after the keyframe start code
+        width, height = struct.unpack_from('<HH', data, 26)
+        return width & 0x3FFF, height & 0x3FFF
+    if chunk == b'VP8L' and len(data) >= 25:
+        # Lossless: 14-bit width-1 and height-1 packed after the 0x2f signature
+        bits = struct.unpack_from('<I', data, 21)[0]
+        return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+    if chunk == b'VP8X' and len(data) >= 30:
+        # Extended: 24-bit canvas width-1 and height-1
+        width = int.from_bytes(bytes(data[24:27]), 'little') + 1
+        height = int.from_bytes(bytes(data[27:30]), 'little') + 1
+        return width, height
+    return None
+
+def _boxes(data, start, end):
+    """Yields (type, payload start, box end) for the ISO-BMFF boxes in data[start:end]."""
+    offset = start
+    while offset + 8 <= end:
+        size, kind = struct.unpack_from('>I4s', data, offset)
+        header = 8
+        if size == 1 and offset + 16 <= end:
+            size = struct.unpack_from('>Q', data, offset + 8)[0]
+            header = 16
+        elif size == 0:
+            size = end - offset
+        if size < header:
+            return
+        yield kind, offset + header, min(end, offset + size)
+        offset += size
+
+def _heic_size(data):
+    # Image spatial extents ("ispe") live in meta/iprp/ipco; the largest is the primary image,
+    # the others being thumbnails and grid tiles
+    largest = None
+    for kind, start, end in _boxes(data, 0, len(data)):
+        if kind != b'meta':
+            continue
+        for kind, start, end in _boxes(data, start + 4, end):  # meta is a full box: skip version/flags
+            if kind != b'iprp':
+                continue
+            for kind, start, end in _boxes(data, start, end):
+                if kind != b'ipco':
+                    continue
+                for kind, start, end in _boxes(data, start, end):
+                    if kind == b'ispe' and start + 12 <= end:
+                        width, height = struct.unpack_from('>II', data, start + 4)
+                        if largest is None or width * height > largest[0] * largest[1]:
+                            largest = (width, height)
+    return largest
+
+def _heic_brands(data):
+    if len(data) < 16 or bytes(data[4:8]) != b'ftyp':
+        return set()
+    size = min(len(data), struct.unpack_from('>I', data, 0)[0])
+    brands = {bytes(data[8:12])}
+    brands.update(bytes(data[i:i + 4]) for i in range(16, size - 3, 4))
+    return brands
+
+def sniff(data):
+    """Identifies the image format from its magic bytes and reads the dimensions from its header.
+
+    Only the first bytes are needed (SNIFF_BYTES is plenty); nothing is
+    decoded. Width and height are None when the header extends past the
+    bytes given. Raises UnsupportedFormat for anything unrecognized.
+    """
+    if len(data) >= 3 and bytes(data[:3]) == b'\xff\xd8\xff':
+        name, size = 'jpeg', _jpeg_size(data)
+    elif bytes(data[:8]) == b'\x89PNG\r\n\x1a\n':
+        name, size = 'png', _png_size(data)
+    elif len(data) >= 12 and bytes(data[:4]) == b'RIFF' and bytes(data[8:12]) == b'WEBP':
+        name, size = 'webp', _webp_size(data)
+    elif _heic_brands(data) & HEIC_BRANDS:
+        name, size = 'heic', _heic_size(data)
+    else:
+        raise UnsupportedFormat("Not a JPEG, PNG, WebP or HEIC image")
+
+    content_type, extension = FORMATS[name]
+    width, height = size or (None, None)
+    return ImageInfo(name, content_type, extension, width, height)
+
+def check(info, allowed=None, min_side=None, max_pixels=None):
+    """Raises ImageFormatError when a sniffed image is outside the allowed formats or sizes."""
+    allowed = ALLOWED_IMAGE_FORMATS if allowed is None else allowed
+    min_side = MIN_IMAGE_SIDE if min_side is None else min_side
+    max_pixels = MAX_IMAGE_PIXELS if max_pixels is None else max_pixels
+
+    if info.format not in allowed:
+        raise UnsupportedFormat(f"{info.format.upper()} images are not accepted")
+    if info.width is None:
+        return info
+    if min(info.width, info.height) < min_side:
+        raise ImageFormatError(f"Image is {info.width}x{info.height}; both sides must be at least {min_side} pixels")
+    if info.width * info.height > max_pixels:
+        raise ImageFormatError(f"Image is {info.width}x{info.height}; at most {max_pixels} pixels are accepted")
+    return info
+
+def validate(data, size=None):
+    """Sniffs and checks image bytes, or the first SNIFF_BYTES of an object of `size` bytes. Returns the ImageInfo."""
+    size = len(data) if size is None else size
+    if size == 0:
+        raise UnsupportedFormat("Image is empty")
+    if size > MAX_OBJECT_BYTES:
+        raise ImageFormatError(f"Image is {size} bytes; at most {MAX_OBJECT_BYTES} are accepted")
+    return check(sniff(data))
@@ -0,0 +1,109 @@
+import logging
+import threading
+
+import image_format
+import preprocess
+from utils import metrics
+from utils.aws_clients import get_client
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# Rekognition rejects inline image bytes above 5 MB; larger images must go by S3 reference
+REKOGNITION_MAX_BYTES = 5 * 1024 * 1024
+
+class ImagePayload:
+    """The bytes of one image, shared by upload and every inference backend.
+
+    API uploads are built with the bytes already in memory, so nothing is
+    re-read from S3. S3-event payloads start empty and download the object
+    at most once, the first time a backend actually needs the bytes. The
+    downsized copy sent to the backends is likewise produced once and
+    shared; the original bytes are what gets stored in S3.
+    """
+
+    def __init__(self, bucket_name, image_key, data=None):
+        self.bucket_name = bucket_name
+        self.image_key = image_key
+        # botocore only accepts bytes/bytearray for blob parameters, so views are materialized once here
+        self._data = bytes(data) if isinstance(data, memoryview) else data
+        self._inference = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_bytes(cls, bucket_name, image_key, data):
+        return cls(bucket_name, image_key, data)
+
+    @classmethod
+    def from_s3(cls, bucket_name, image_key):
+        return cls(bucket_name, image_key)
+
+    @property
+    def has_bytes(self):
+        return self._data is not None
+
+    def get_bytes(self):
+        """Returns the image bytes, downloading them from S3 on first use only."""
+        if self._data is None:
+            with self._lock:
+                if self._data is None:
+                    self._download()
+        return self._data
+
+    def _download(self, validate=False):
+        """Downloads the object in one GET; with `validate`, checks its first bytes before reading the rest."""
+        info = None
+        with metrics.span("S3Get"):
+            response = get_client('s3').get_object(Bucket=self.bucket_name, Key=self.image_key)
+            body = response['Body']
+            head = body.read(image_format.SNIFF_BYTES) if validate else b''
+            if validate:
+                try:
+                    info = image_format.validate(head, response['ContentLength'])
+                except image_format.ImageFormatError:
+                    # Closing the stream abandons the transfer, so a rejected upload is never read in full
+                    body.close()
+                    raise
+            self._data = head + body.read()
+        metrics.add_value("ImageBytes", len(self._data), "Bytes")
+        logger.info(f"Fetched s3://{self.bucket_name}/{self.image_key} ({len(self._data)} bytes)")
+        return info
+
+    def image_info(self):
+        """Validates format, size and dimensions from the header, raising image_format.ImageFormatError.
+
+        An S3 object that isn't loaded yet is checked from the first chunk of
+        the same GET that downloads it, and the transfer is abandoned when
+        the check fails, so oversized or non-image uploads are never read in full.
+        """
+        if self._data is None:
+            with self._lock:
+                if self._data is None:
+                    return self._download(validate=True)
+        return image_format.validate(self._data)
+
+    def inference_bytes(self):
+        """Returns the normalized image for the backends, or the original if normalization is unavailable."""
+        if self._inference is None:
+            data = self.get_bytes()
+            with self._lock:
+                if self._inference is None:
+                    normalized = data
+                    if preprocess.is_enabled():
+                        try:
+                            with metrics.span("Normalize"):
+                                normalized = preprocess.normalize(data)
+                            logger.info(f"Normalized {self.image_key}: {len(data)} -> {len(normalized)} bytes")
+                        except Exception as e:
+                            logger.warning(f"Could not normalize {self.image_key}, sending original: {str(e)}")
+                    metrics.add_value("InferenceBytes", len(normalized), "Bytes")
+                    self._inference = normalized
+        return self._inference
+
+    def rekognition_image(self):
+        """Returns the Rekognition `Image` parameter, inlining bytes when they are already loaded."""
+        if self._data is not None:
+            data = self.inference_bytes()
+            if len(data) <= REKOGNITION_MAX_BYTES:
+                return {"Bytes": data}
+        return {"S3Object": {"Bucket": self.bucket_name, "Name": self.image_key}}
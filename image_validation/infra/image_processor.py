@@ -1,30 +1,160 @@
 import os
 import json
-import boto3
-from sagemaker_infer import classify_with_sagemaker
-from rekognition_infer import classify_with_rekognition
-from utils.dynamodb_utils import save_classification_result
+import uuid
+import logging
+import threading
+from classifier import classify_image, is_settled
+from fanout import REQUEST_BUDGET_SECONDS
+from image_format import ImageFormatError
+from image_payload import ImagePayload
+from batch_consumer import is_sqs_event, process_sqs_batch, process_s3_event
+from utils import idempotency, metrics, near_duplicate
+from utils.dynamodb_utils import save_classification_result, flush_results
+from utils.jobs import JOB_MAX_ATTEMPTS, job_id_for_key, start_job, finish_job, fail_job
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
 
 TABLE_NAME = os.environ['TABLE_NAME']
 
+# A busy claim is usually the API classifying its own upload inline, fallback included, within
+# the request budget; giving up sooner would send the message round the visibility timeout
+BUSY_WAIT_SECONDS = REQUEST_BUDGET_SECONDS + idempotency.IDEMPOTENCY_WAIT_MARGIN_SECONDS
+
+# Claims of objects whose results are still buffered, as (image_key, claim key, owner).
+# They are settled by flush_and_measure once the flush reports which writes failed.
+_unsettled = []
+_unsettled_lock = threading.Lock()
+
+def classify_object(bucket_name, image_key):
+    """Classifies one uploaded object and stores the result. Returns `(result, settled)`.
+
+    Raises ImageFormatError, before downloading the whole object, for uploads that can never be classified.
+    """
+    payload = ImagePayload.from_s3(bucket_name, image_key)
+    payload.image_info()
+    with metrics.span("Classify"):
+        result = classify_image(payload)
+    saved = save_classification_result(result)
+
+    # Timeouts, errors and unavailable backends count as failures so the message is redelivered,
+    # unless the fallback backend answered for them
+    return result, saved and is_settled(result)
+
+def process_object(bucket_name, image_key):
+    """Processes one upload, tracking job status for async API uploads. Returns True on success."""
+    with metrics.request("ProcessObject", ImageKey=image_key):
+        if not idempotency.is_enabled():
+            return _process_object(bucket_name, image_key)
+        return _process_claimed(bucket_name, image_key)
+
+def _process_claimed(bucket_name, image_key):
+    # Each run is its own owner, so a redelivery after a crash can take the lease over
+    owner = uuid.uuid4().hex
+    key = idempotency.object_key(bucket_name, image_key)
+    outcome = idempotency.claim(key, owner)
+    metrics.set_property("Idempotency", outcome)
+
+    if outcome == idempotency.DUPLICATE:
+        logger.info(f"Skipping s3://{bucket_name}/{image_key}: already classified")
+        return True
+    if outcome == idempotency.BUSY:
+        status = idempotency.wait(key, BUSY_WAIT_SECONDS)
+        if status == idempotency.DONE:
+            logger.info(f"Skipping s3://{bucket_name}/{image_key}: classified by another run")
+            return True
+        if status == idempotency.IN_PROGRESS:
+            # Redelivered after the visibility timeout, by when a crashed run's lease has expired
+            return False
+        # Released without a complete verdict; classify it here instead
+        outcome = idempotency.claim(key, owner)
+        if outcome != idempotency.CLAIMED:
+            return outcome == idempotency.DUPLICATE
+
+    succeeded = False
+    try:
+        succeeded = _process_object(bucket_name, image_key)
+        return succeeded
+    finally:
+        if succeeded:
+            # The result may only be queued in the writer; completing the claim now would make
+            # a redelivery after a failed flush skip the object with no result stored
+            with _unsettled_lock:
+                _unsettled.append((image_key, key, owner))
+        else:
+            idempotency.settle(key, owner, False)
+
+def _process_object(bucket_name, image_key):
+    job_id = job_id_for_key(image_key)
+    if job_id is None:
+        try:
+            return classify_object(bucket_name, image_key)[1]
+        except ImageFormatError as e:
+            _log_rejection(bucket_name, image_key, e)
+            # Redelivery can't fix the upload, so the message is acknowledged
+            return True
+
+    attempt = start_job(job_id)
+    if attempt is None:
+        # Redelivery of a job that already finished
+        return True
+
+    try:
+        result, complete = classify_object(bucket_name, image_key)
+    except ImageFormatError as e:
+        _log_rejection(bucket_name, image_key, e)
+        fail_job(job_id, str(e), JOB_MAX_ATTEMPTS)
+        return True
+    except Exception as e:
+        fail_job(job_id, str(e), attempt)
+        raise
+
+    if complete:
+        finish_job(job_id, result)
+    else:
+        fail_job(job_id, "Classification incomplete", attempt)
+    return complete
+
+def _log_rejection(bucket_name, image_key, error):
+    logger.warning(f"Rejected s3://{bucket_name}/{image_key}: {str(error)}")
+    metrics.set_property("Rejected", str(error))
+
+def flush_and_measure():
+    """Flushes buffered results, then settles the claims waiting on them. Returns the image keys that failed."""
+    with metrics.span("Flush"):
+        failed = flush_results()
+        # Nothing is waiting on this response, so a cold-start index load is allowed to finish here
+        near_duplicate.flush(wait_for_load=True)
+    _settle_claims(failed)
+    return failed
+
+def _settle_claims(failed):
+    # Claims on failed writes are released so the redelivered message classifies the object again
+    with _unsettled_lock:
+        claims = list(_unsettled)
+        _unsettled.clear()
+    failed = set(failed)
+    for image_key, key, owner in claims:
+        try:
+            idempotency.settle(key, owner, image_key not in failed)
+        except Exception as e:
+            # The lease still expires on its own
+            logger.error(f"Could not settle claim on {image_key}: {str(e)}")
+
 def lambda_handler(event, context):
-    s3_event = event['Records'][0]['s3']
-    bucket_name = s3_event['bucket']['name']
-    image_key = s3_event['object']['key']
-
-    sagemaker_result = classify_with_sagemaker(bucket_name, image_key)
-    rekognition_result = classify_with_rekognition(bucket_name, image_key)
-
-    agreement = (sagemaker_result == rekognition_result)
-    confidence = 0.5
-
-    result = {
-        "image_id": image_key,
-        "sagemaker_result": sagemaker_result,
-        "rekognition_result": rekognition_result,
-        "agreement": agreement,
-        "confidence": confidence
-    }
+    records = len(event.get('Records') or [])
+    with metrics.request("ProcessBatch", RequestId=getattr(context, 'aws_request_id', None), Records=records):
+        return _handle_event(event)
 
-    save_classification_result(result)
-    return {"statusCode": 200, "body": json.dumps(result)}
+def _handle_event(event):
+    # SQS-buffered S3 notifications, with per-message failure reporting.
+    # Results are written in batches and flushed once every record is classified.
+    if is_sqs_event(event):
+        return process_sqs_batch(event, process_object, finalize=flush_and_measure)
+
+    # Direct S3 notifications
+    succeeded, failed = process_s3_event(event, process_object, finalize=flush_and_measure)
+    return {
+        "statusCode": 500 if failed else 200,
+        "body": json.dumps({"processed": succeeded, "failed": failed})
+    }
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Import-time budget report for each Lambda entry module.
+
+Imports every handler in a fresh interpreter with `-X importtime`, the way
+a cold start does, and reports the total import time and the heaviest
+top-level packages. Exits non-zero when a handler exceeds --budget-ms.
+
+Usage: python import_budget.py --budget-ms 300
+"""
+import os
+import sys
+import json
+import argparse
+import subprocess
+
+HANDLERS = ["api_handler", "image_processor", "training_handler"]
+
+# Handlers read these at import time; dummy values keep the measurement hermetic
+IMPORT_ENV = {"TABLE_NAME": "import-budget", "BUCKET_NAME": "import-budget", "AWS_DEFAULT_REGION": "us-east-1"}
+
+def measure(module, cwd):
+    """Returns (total_ms, {top-level package: cumulative ms}) for importing `module`."""
+    env = dict(os.environ, **IMPORT_ENV)
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=cwd, env=env, capture_output=True, text=True
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{proc.stderr.strip().splitlines()[-1]}")
+
+    packages = {}
+    total_us = 0
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        name = name.strip()
+        if name == module:
+            total_us = int(cumulative)
+            continue
+        # The outermost import of a package carries its largest cumulative time
+        root = name.split(".")[0]
+        packages[root] = max(packages.get(root, 0), int(cumulative) / 1000)
+    return total_us / 1000, packages
+
+def main():
+    parser = argparse.ArgumentParser(description="Report import-time budget per Lambda handler")
+    parser.add_argument("--handlers", nargs="+", default=HANDLERS)
+    parser.add_argument("--budget-ms", type=float, default=None, help="Fail if any handler exceeds this")
+    parser.add_argument("--top", type=int, default=8, help="Heaviest packages to list per handler")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    args = parser.parse_args()
+
+    cwd = os.path.dirname(os.path.abspath(__file__))
+    report = {}
+    over_budget = []
+    for module in args.handlers:
+        total_ms, packages = measure(module, cwd)
+        heaviest = sorted(packages.items(), key=lambda item: item[1], reverse=True)[:args.top]
+        report[module] = {"total_ms": round(total_ms, 1), "heaviest": [[n, round(ms, 1)] for n, ms in heaviest]}
+        if args.budget_ms is not None and total_ms > args.budget_ms:
+            over_budget.append(module)
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        for module, entry in report.items():
+            print(f"{module}: {entry['total_ms']} ms")
+            for name, ms in entry["heaviest"]:
+                print(f"    {ms:>8.1f} ms  {name}")
+
+    if over_budget:
+        print(f"Over the {args.budget_ms} ms budget: {', '.join(over_budget)}", file=sys.stderr)
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
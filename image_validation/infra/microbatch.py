@@ -0,0 +1,76 @@
+import time
+import queue
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+class MicroBatcher:
+    """Groups items submitted from many threads into batched calls.
+
+    A dispatcher thread waits for the first item, then keeps collecting
+    until `max_batch_size` items are queued or `max_wait` seconds have
+    passed. It hands the batch to `send_batch(items)`, which must return
+    one result per item in order. Each caller's future then receives its
+    own result, or the batch's exception. Up to `max_in_flight` batches
+    are sent concurrently while the next one is collected.
+    """
+
+    def __init__(self, send_batch, max_batch_size=8, max_wait=0.02, max_in_flight=4, name='microbatch'):
+        self.send_batch = send_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.name = name
+        self._queue = queue.Queue()
+        self._senders = ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix=f'{name}-send')
+        self._dispatcher = None
+        self._lock = threading.Lock()
+        self.batches_sent = 0
+        self.items_sent = 0
+
+    def submit(self, item):
+        """Queues `item` for the next batch and returns a Future for its result."""
+        future = Future()
+        self._queue.put((item, future))
+        self._ensure_dispatcher()
+        return future
+
+    def _ensure_dispatcher(self):
+        if self._dispatcher is None or not self._dispatcher.is_alive():
+            with self._lock:
+                if self._dispatcher is None or not self._dispatcher.is_alive():
+                    self._dispatcher = threading.Thread(target=self._dispatch, name=self.name, daemon=True)
+                    self._dispatcher.start()
+
+    def _dispatch(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._senders.submit(self._send, batch)
+
+    def _send(self, batch):
+        items = [item for item, _ in batch]
+        try:
+            results = self.send_batch(items)
+            if len(results) != len(items):
+                raise ValueError(f"Batch returned {len(results)} results for {len(items)} items")
+        except Exception as e:
+            logger.error(f"{self.name} batch of {len(items)} failed: {str(e)}")
+            for _, future in batch:
+                future.set_exception(e)
+            return
+
+        self.batches_sent += 1
+        self.items_sent += len(items)
+        for (_, future), result in zip(batch, results):
+            future.set_result(result)
@@ -0,0 +1,85 @@
+import re
+
+# Header blocks larger than this are treated as malformed rather than searched to the end
+MAX_HEADER_BYTES = 16 * 1024
+
+_PARAM_RE = re.compile(r';\s*([\w-]+)\s*=\s*(?:"([^"]*)"|([^;\s]+))')
+
+RAW_CONTENT_TYPES = ('application/octet-stream', 'image/')
+
+class MultipartError(ValueError):
+    """Raised when a request body is not valid multipart/form-data."""
+
+class PartTooLarge(MultipartError):
+    """Raised as soon as a part is known to exceed the size limit."""
+
+def _params(header_value):
+    return {m.group(1).lower(): m.group(2) if m.group(2) is not None else m.group(3)
+            for m in _PARAM_RE.finditer(header_value)}
+
+def parse_boundary(content_type):
+    if not content_type.lower().startswith('multipart/form-data'):
+        raise MultipartError(f"Unsupported content type: {content_type}")
+    boundary = _params(content_type).get('boundary')
+    if not boundary:
+        raise MultipartError("Missing multipart boundary")
+    return boundary.encode('latin-1')
+
+def iter_parts(body, boundary, max_part_size):
+    """Yields `(name, filename, headers, data)` for each part without copying part data.
+
+    `data` is a memoryview slice of `body`. The closing delimiter of each
+    part is only searched for within `max_part_size` bytes, so an oversized
+    part is rejected without scanning the rest of the body.
+    """
+    view = memoryview(body)
+    delimiter = b'--' + boundary
+    part_end = b'\r\n' + delimiter
+
+    position = body.find(delimiter)
+    if position < 0:
+        raise MultipartError("Multipart boundary not found in body")
+    position += len(delimiter)
+
+    while True:
+        if body[position:position + 2] == b'--':
+            return
+        if body[position:position + 2] != b'\r\n':
+            raise MultipartError("Malformed multipart delimiter")
+        position += 2
+
+        headers_end = body.find(b'\r\n\r\n', position, position + MAX_HEADER_BYTES)
+        if headers_end < 0:
+            raise MultipartError("Multipart headers not terminated")
+        headers = {}
+        for line in bytes(view[position:headers_end]).decode('latin-1').split('\r\n'):
+            name, _, value = line.partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        data_start = headers_end + 4
+        search_limit = data_start + max_part_size + len(part_end)
+        data_end = body.find(part_end, data_start, search_limit)
+        if data_end < 0:
+            if len(body) > search_limit:
+                raise PartTooLarge(f"Part exceeds {max_part_size} bytes")
+            raise MultipartError("Multipart body not terminated")
+
+        disposition = _params(headers.get('content-disposition', ''))
+        yield disposition.get('name'), disposition.get('filename'), headers, view[data_start:data_end]
+        position = data_end + len(part_end)
+
+def extract_file(body, content_type, field, max_part_size):
+    """Returns the bytes of form field `field` as a memoryview, or None if the field is absent.
+
+    Bodies sent as application/octet-stream or image/* are the file
+    themselves and are returned whole.
+    """
+    if content_type.lower().startswith(RAW_CONTENT_TYPES):
+        if len(body) > max_part_size:
+            raise PartTooLarge(f"Body exceeds {max_part_size} bytes")
+        return memoryview(body)
+
+    for name, _, _, data in iter_parts(body, parse_boundary(content_type), max_part_size):
+        if name == field:
+            return data
+    return None
@@ -0,0 +1,144 @@
+import io
+import os
+import hashlib
+import logging
+import threading
+import importlib.util
+
+from microbatch import MicroBatcher
+from utils import metrics
+from utils.aws_clients import get_client
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow is optional; without it the ONNX backend reports errors
+    Image = None
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# A quantized person classifier run on CPU inside the function. The model takes
+# float32 NCHW RGB input of ONNX_INPUT_SIZE x ONNX_INPUT_SIZE, scaled to [0, 1]
+# and normalized with ONNX_MEAN/ONNX_STD, with a dynamic batch dimension. Its
+# first output is the person probability per image, shaped [N] or [N, 1], or
+# class probabilities [N, C] with the person class at ONNX_PERSON_INDEX.
+ONNX_MODEL_URI = os.environ.get('ONNX_MODEL_URI', '')  # s3://bucket/key or a local path (e.g. in a layer)
+ONNX_MODEL_CACHE_DIR = os.environ.get('ONNX_MODEL_CACHE_DIR', '/tmp/models')
+ONNX_INPUT_SIZE = int(os.environ.get('ONNX_INPUT_SIZE', '224'))
+ONNX_MEAN = [float(v) for v in os.environ.get('ONNX_MEAN', '0.485,0.456,0.406').split(',')]
+ONNX_STD = [float(v) for v in os.environ.get('ONNX_STD', '0.229,0.224,0.225').split(',')]
+ONNX_PERSON_INDEX = int(os.environ.get('ONNX_PERSON_INDEX', '0'))
+
+# Threads per inference run; 0 lets ONNX Runtime use every vCPU the function has
+ONNX_THREADS = int(os.environ.get('ONNX_THREADS', '0'))
+
+# Concurrent images are run as one batch, which amortizes per-run overhead
+ONNX_BATCH_SIZE = int(os.environ.get('ONNX_BATCH_SIZE', '8'))
+ONNX_BATCH_WAIT_MS = float(os.environ.get('ONNX_BATCH_WAIT_MS', '5'))
+
+# Checked without importing it, which is deferred to first use
+HAS_ONNXRUNTIME = importlib.util.find_spec('onnxruntime') is not None
+
+if ONNX_MODEL_URI and (Image is None or not HAS_ONNXRUNTIME):
+    logger.error(f"ONNX_MODEL_URI is set but {'Pillow' if Image is None else 'onnxruntime'} is not installed; "
+                 f"the ONNX fallback is disabled")
+
+_session = None
+_batcher = None
+_lock = threading.Lock()
+
+def is_configured():
+    return bool(ONNX_MODEL_URI) and Image is not None and HAS_ONNXRUNTIME
+
+def model_path(uri=None):
+    """Local path of the model, downloading it from S3 into the cache directory on first use."""
+    uri = uri or ONNX_MODEL_URI
+    if not uri.startswith('s3://'):
+        return uri
+
+    bucket, _, key = uri[len('s3://'):].partition('/')
+    # Keyed by URI so a new model version under a new key is never served from a stale cache
+    name = hashlib.sha256(uri.encode()).hexdigest()[:16] + '-' + os.path.basename(key)
+    path = os.path.join(ONNX_MODEL_CACHE_DIR, name)
+    if not os.path.exists(path):
+        os.makedirs(ONNX_MODEL_CACHE_DIR, exist_ok=True)
+        partial = f"{path}.{os.getpid()}.part"
+        with metrics.span("OnnxModelDownload"):
+            get_client('s3').download_file(bucket, key, partial)
+        # Atomic, so a concurrent or interrupted download never leaves a truncated model behind
+        os.replace(partial, path)
+        logger.info(f"Cached ONNX model {uri} at {path} ({os.path.getsize(path)} bytes)")
+    return path
+
+def _get_session():
+    global _session
+    if _session is None:
+        with _lock:
+            if _session is None:
+                # Imported on first use so containers that never run this backend don't pay for it
+                import onnxruntime as ort
+
+                options = ort.SessionOptions()
+                options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+                options.intra_op_num_threads = ONNX_THREADS
+                with metrics.span("OnnxModelLoad"):
+                    _session = ort.InferenceSession(
+                        model_path(), sess_options=options, providers=['CPUExecutionProvider']
+                    )
+                logger.info(f"Loaded ONNX model {ONNX_MODEL_URI}")
+    return _session
+
+def to_tensor(data, size=None):
+    """Decodes image bytes into a normalized CHW float32 array of `size` x `size`."""
+    import numpy as np
+
+    size = size or ONNX_INPUT_SIZE
+    with Image.open(io.BytesIO(data)) as img:
+        # Let libjpeg decode straight to roughly the input size
+        img.draft('RGB', (size, size))
+        img = ImageOps.exif_transpose(img).convert('RGB').resize((size, size), Image.BILINEAR)
+        pixels = np.asarray(img, dtype=np.float32) / 255.0
+
+    mean = np.asarray(ONNX_MEAN, dtype=np.float32)
+    std = np.asarray(ONNX_STD, dtype=np.float32)
+    return ((pixels - mean) / std).transpose(2, 0, 1)
+
+def run_batch(tensors):
+    """Runs the model once over several CHW tensors. Returns one person score per tensor."""
+    import numpy as np
+
+    session = _get_session()
+    batch = np.stack(tensors)
+    output = session.run(None, {session.get_inputs()[0].name: batch})[0]
+    output = output.reshape(len(tensors), -1)
+    column = ONNX_PERSON_INDEX if output.shape[1] > 1 else 0
+    return [float(score) for score in output[:, column]]
+
+def _get_batcher():
+    global _batcher
+    if _batcher is None:
+        with _lock:
+            if _batcher is None:
+                # One batch in flight: the model already uses every core, so parallel runs only contend
+                _batcher = MicroBatcher(
+                    run_batch,
+                    max_batch_size=ONNX_BATCH_SIZE,
+                    max_wait=ONNX_BATCH_WAIT_MS / 1000,
+                    max_in_flight=1,
+                    name='onnx-batch'
+                )
+    return _batcher
+
+def classify_with_onnx(payload):
+    """Returns the local model's person score in [0, 1], or "error"."""
+    try:
+        if not is_configured():
+            raise RuntimeError("ONNX backend needs ONNX_MODEL_URI and Pillow")
+        with metrics.span("OnnxPreprocess"):
+            tensor = to_tensor(payload.inference_bytes())
+        with metrics.span("OnnxInfer"):
+            return _get_batcher().submit(tensor).result()
+
+    except Exception as e:
+        logger.error(f"Error in ONNX classification: {str(e)}")
+        return "error"
@@ -0,0 +1,49 @@
+import io
+import os
+import logging
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow is optional; without it images are sent to the backends unchanged
+    Image = None
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# Longest side, in pixels, of the image sent to the inference backends (0 disables)
+NORMALIZE_MAX_SIDE = int(os.environ.get('NORMALIZE_MAX_SIDE', '640'))
+NORMALIZE_JPEG_QUALITY = int(os.environ.get('NORMALIZE_JPEG_QUALITY', '85'))
+
+if Image is None and NORMALIZE_MAX_SIDE > 0:
+    logger.error("Normalization is enabled but Pillow is not installed; images are sent to the backends unchanged")
+
+def is_enabled():
+    return Image is not None and NORMALIZE_MAX_SIDE > 0
+
+def normalize(data, max_side=None, quality=None):
+    """Downsizes encoded image bytes for inference and re-encodes them as JPEG.
+
+    JPEGs are decoded in draft mode, so libjpeg scales by 1/2, 1/4 or 1/8
+    during decoding instead of producing the full-resolution frame first.
+    EXIF orientation is applied so detectors see the upright image. The
+    original bytes are returned when they are already small enough or the
+    re-encoded image would not be smaller.
+    """
+    max_side = max_side or NORMALIZE_MAX_SIDE
+    quality = quality or NORMALIZE_JPEG_QUALITY
+
+    with Image.open(io.BytesIO(data)) as img:
+        if img.format == 'JPEG' and max(img.size) <= max_side:
+            return data
+
+        img.draft('RGB', (max_side, max_side))
+        img = ImageOps.exif_transpose(img).convert('RGB')
+        img.thumbnail((max_side, max_side), Image.BILINEAR, reducing_gap=2.0)
+
+        out = io.BytesIO()
+        img.save(out, 'JPEG', quality=quality)
+
+    normalized = out.getvalue()
+    if len(normalized) >= len(data):
+        return data
+    return normalized
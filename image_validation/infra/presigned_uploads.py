@@ -0,0 +1,120 @@
+import os
+import math
+import logging
+
+from image_format import FORMATS, ALLOWED_IMAGE_FORMATS, MAX_OBJECT_BYTES
+from utils.aws_clients import get_client
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+UPLOAD_URL_EXPIRES_SECONDS = int(os.environ.get('UPLOAD_URL_EXPIRES_SECONDS', '900'))
+# Larger objects would be stored but never classified, so the processor's limit caps uploads
+UPLOAD_MAX_BYTES = min(MAX_OBJECT_BYTES, int(os.environ.get('UPLOAD_MAX_BYTES', str(MAX_OBJECT_BYTES))))
+
+# Objects above the threshold are uploaded in parts; S3 requires parts of at least 5 MiB
+MULTIPART_THRESHOLD_BYTES = int(os.environ.get('MULTIPART_THRESHOLD_BYTES', str(16 * 1024 ** 2)))
+MULTIPART_PART_BYTES = max(5 * 1024 ** 2, int(os.environ.get('MULTIPART_PART_BYTES', str(8 * 1024 ** 2))))
+MULTIPART_MAX_PARTS = 10000
+
+# Every presigned key lives under this prefix, which is what triggers classification
+UPLOAD_PREFIX = 'uploads/'
+
+CONTENT_TYPES = {FORMATS[name][0]: FORMATS[name][1] for name in ALLOWED_IMAGE_FORMATS if name in FORMATS}
+
+class UploadRequestError(ValueError):
+    """Raised for upload requests that cannot be granted."""
+
+def upload_key(upload_id, content_type, prefix=UPLOAD_PREFIX):
+    return f"{prefix}{upload_id}{CONTENT_TYPES[content_type]}"
+
+def _check_key(key):
+    # Clients echo keys back to complete or abort; never act outside the upload prefix
+    if not isinstance(key, str) or not key.startswith(UPLOAD_PREFIX) or '..' in key:
+        raise UploadRequestError(f"Key must be under {UPLOAD_PREFIX}")
+
+def create_upload(bucket_name, key, content_type, size=None, method='post'):
+    """Returns presigned instructions for uploading one object straight to S3.
+
+    Objects larger than `MULTIPART_THRESHOLD_BYTES` get a multipart upload
+    with one presigned URL per part. Smaller ones get a presigned POST
+    (size-limited by policy) or, with `method='put'`, a presigned PUT.
+    """
+    if content_type not in CONTENT_TYPES:
+        raise UploadRequestError(f"Unsupported content type: {content_type}")
+    if size is not None and not 0 < size <= UPLOAD_MAX_BYTES:
+        raise UploadRequestError(f"Size must be between 1 and {UPLOAD_MAX_BYTES} bytes")
+
+    s3 = get_client('s3')
+    if size is not None and size > MULTIPART_THRESHOLD_BYTES:
+        return _create_multipart_upload(s3, bucket_name, key, content_type, size)
+
+    if method == 'put':
+        url = s3.generate_presigned_url(
+            'put_object',
+            Params={'Bucket': bucket_name, 'Key': key, 'ContentType': content_type},
+            ExpiresIn=UPLOAD_URL_EXPIRES_SECONDS
+        )
+        return {"upload_type": "put", "key": key, "url": url, "headers": {"Content-Type": content_type}}
+
+    if method != 'post':
+        raise UploadRequestError(f"Unsupported upload method: {method}")
+
+    post = s3.generate_presigned_post(
+        bucket_name,
+        key,
+        Fields={'Content-Type': content_type},
+        Conditions=[
+            {'Content-Type': content_type},
+            ['content-length-range', 1, min(size or UPLOAD_MAX_BYTES, MULTIPART_THRESHOLD_BYTES)]
+        ],
+        ExpiresIn=UPLOAD_URL_EXPIRES_SECONDS
+    )
+    return {"upload_type": "post", "key": key, "url": post['url'], "fields": post['fields']}
+
+def _create_multipart_upload(s3, bucket_name, key, content_type, size):
+    part_size = max(MULTIPART_PART_BYTES, math.ceil(size / MULTIPART_MAX_PARTS))
+    part_count = math.ceil(size / part_size)
+
+    upload_id = s3.create_multipart_upload(Bucket=bucket_name, Key=key, ContentType=content_type)['UploadId']
+    parts = [
+        {
+            "part_number": number,
+            "url": s3.generate_presigned_url(
+                'upload_part',
+                Params={'Bucket': bucket_name, 'Key': key, 'UploadId': upload_id, 'PartNumber': number},
+                ExpiresIn=UPLOAD_URL_EXPIRES_SECONDS
+            )
+        }
+        for number in range(1, part_count + 1)
+    ]
+    logger.info(f"Started multipart upload of {size} bytes in {part_count} parts to {key}")
+    return {
+        "upload_type": "multipart",
+        "key": key,
+        "upload_id": upload_id,
+        "part_size": part_size,
+        "parts": parts
+    }
+
+def complete_upload(bucket_name, key, upload_id, parts):
+    """Completes a multipart upload from the client's `[{"part_number", "etag"}]` list."""
+    _check_key(key)
+    try:
+        multipart = {"Parts": sorted(
+            ({"PartNumber": int(part["part_number"]), "ETag": part["etag"]} for part in parts),
+            key=lambda part: part["PartNumber"]
+        )}
+    except (KeyError, TypeError, ValueError):
+        raise UploadRequestError("Each part needs a part_number and an etag")
+    if not multipart["Parts"]:
+        raise UploadRequestError("No parts to complete")
+
+    get_client('s3').complete_multipart_upload(
+        Bucket=bucket_name, Key=key, UploadId=upload_id, MultipartUpload=multipart
+    )
+    logger.info(f"Completed multipart upload of {key} ({len(multipart['Parts'])} parts)")
+
+def abort_upload(bucket_name, key, upload_id):
+    _check_key(key)
+    get_client('s3').abort_multipart_upload(Bucket=bucket_name, Key=key, UploadId=upload_id)
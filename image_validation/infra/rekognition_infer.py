@@ -1,27 +1,40 @@
 import os
 import json
-import boto3
 import logging
 
+from adaptive_limit import limited, Overloaded
+from resilience import UNAVAILABLE
+from utils import metrics
+from utils.aws_clients import get_client
+
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
-rekognition = boto3.client('rekognition')
+# Labels below this confidence are not returned, so scores under it read as 0.0
+REKOGNITION_MIN_CONFIDENCE = float(os.environ.get('REKOGNITION_MIN_CONFIDENCE', '50'))
 
-def classify_with_rekognition(bucket_name, image_key):
+def classify_with_rekognition(payload):
+    """Returns Rekognition's Person confidence scaled to [0, 1], "error", or "unavailable" when shed."""
     try:
-        response = rekognition.detect_labels(
-            Image={"S3Object": {"Bucket": bucket_name, "Name": image_key}},
-            MaxLabels=10,
-            MinConfidence=70
-        )
+        image = payload.rekognition_image()
+        with metrics.span("RekognitionDetectLabels"):
+            response = limited(
+                'Rekognition',
+                get_client('rekognition').detect_labels,
+                Image=image,
+                MaxLabels=10,
+                MinConfidence=REKOGNITION_MIN_CONFIDENCE
+            )
 
         for label in response['Labels']:
             if label['Name'] == "Person":
-                return "human"
-        
-        return "not_human"
+                return label['Confidence'] / 100.0
+
+        return 0.0
 
+    except Overloaded as e:
+        logger.warning(f"Rekognition call shed: {str(e)}")
+        return UNAVAILABLE
     except Exception as e:
         logger.error(f"Error in Rekognition classification: {str(e)}")
         return "error"
@@ -0,0 +1,232 @@
+import os
+import time
+import logging
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from fanout import BACKEND_TIMEOUT_SECONDS, TIMEOUT, ERROR
+from utils import metrics
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# Reported instead of a label when a backend was not called at all: its circuit is open,
+# or its adaptive concurrency limit shed the call
+UNAVAILABLE = "unavailable"
+
+# A hedge (second attempt) is sent once the first has run longer than this percentile of
+# recent successful attempts, but never sooner than the minimum delay
+HEDGE_BACKENDS = [name.strip() for name in os.environ.get('HEDGE_BACKENDS', 'sagemaker,rekognition').split(',') if name.strip()]
+HEDGE_PERCENTILE = float(os.environ.get('HEDGE_PERCENTILE', '95'))
+HEDGE_MIN_DELAY_MS = float(os.environ.get('HEDGE_MIN_DELAY_MS', '50'))
+HEDGE_MIN_SAMPLES = int(os.environ.get('HEDGE_MIN_SAMPLES', '20'))
+# Hedges are capped at this fraction of calls, so a backend that is slow across the
+# board doesn't get twice the traffic exactly when it can least take it
+HEDGE_BUDGET_RATIO = float(os.environ.get('HEDGE_BUDGET_RATIO', '0.1'))
+
+# Consecutive failures that open a circuit, and how long it stays open before a probe
+BREAKER_FAILURE_THRESHOLD = int(os.environ.get('BREAKER_FAILURE_THRESHOLD', '5'))
+BREAKER_RESET_SECONDS = float(os.environ.get('BREAKER_RESET_SECONDS', '30'))
+
+RESILIENCE_MAX_WORKERS = int(os.environ.get('RESILIENCE_MAX_WORKERS', '64'))
+
+# Attempts run here rather than on the fan-out pool, which is busy waiting for them
+_executor = ThreadPoolExecutor(max_workers=RESILIENCE_MAX_WORKERS, thread_name_prefix='attempt')
+
+class LatencyTracker:
+    """Sliding window of recent latencies with percentile lookup."""
+
+    def __init__(self, window=200):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, p, min_samples=1):
+        """Returns the p-th percentile in seconds, or None with fewer than `min_samples` samples."""
+        with self._lock:
+            if len(self._samples) < min_samples:
+                return None
+            ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))]
+
+class HedgeBudget:
+    """Token bucket that earns `ratio` of a token per call; each hedge spends a whole one."""
+
+    def __init__(self, ratio, burst=10.0):
+        self.ratio = ratio
+        self.burst = burst
+        self._tokens = burst
+        self._lock = threading.Lock()
+
+    def on_call(self):
+        with self._lock:
+            self._tokens = min(self.burst, self._tokens + self.ratio)
+
+    def try_spend(self):
+        with self._lock:
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+class CircuitBreaker:
+    """Opens after `failure_threshold` consecutive failures.
+
+    While open, calls are refused without touching the backend. After
+    `reset_timeout` seconds one probe call is let through: success closes
+    the circuit, failure opens it for another `reset_timeout`, and a probe
+    that never reached the backend (shed) lets the next call probe instead.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name, failure_threshold=5, reset_timeout=30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                # Let exactly one probe through; others keep being refused until it reports
+                self.state = self.HALF_OPEN
+                logger.info(f"Circuit for {self.name} half-open, probing")
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            if self.state != self.CLOSED:
+                logger.info(f"Circuit for {self.name} closed")
+            self.state = self.CLOSED
+            self._failures = 0
+
+    def record_shed(self):
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                # _opened_at is kept, so the reset timeout has already passed and the next call probes
+                self.state = self.OPEN
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self.state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    logger.warning(f"Circuit for {self.name} opened after {self._failures} failures")
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+
+class ResilientBackend:
+    """Wraps a backend callable with hedging and a circuit breaker.
+
+    The backend returns a score, ERROR on failure, or UNAVAILABLE when it
+    shed the call itself. The wrapper returns the first successful attempt,
+    ERROR when every attempt failed, TIMEOUT when nothing answered within
+    `timeout`, and UNAVAILABLE without calling the backend while its
+    circuit is open.
+    """
+
+    def __init__(self, name, backend, hedge=True, hedge_percentile=95.0, hedge_min_delay=0.05,
+                 hedge_min_samples=20, hedge_budget=0.1, breaker=None, timeout=None, executor=None):
+        self.name = name
+        self.backend = backend
+        self.hedge = hedge
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_delay = hedge_min_delay
+        self.hedge_min_samples = hedge_min_samples
+        self.budget = HedgeBudget(hedge_budget)
+        self.breaker = breaker or CircuitBreaker(name)
+        self.timeout = BACKEND_TIMEOUT_SECONDS if timeout is None else timeout
+        self.latencies = LatencyTracker()
+        self.executor = executor or _executor
+
+    def hedge_delay(self):
+        """Seconds to wait before hedging, or None while hedging is off or there is too little history."""
+        if not self.hedge:
+            return None
+        threshold = self.latencies.percentile(self.hedge_percentile, self.hedge_min_samples)
+        if threshold is None:
+            return None
+        return max(self.hedge_min_delay, threshold)
+
+    def _attempt(self, *args):
+        start = time.monotonic()
+        try:
+            result = self.backend(*args)
+        except Exception as e:
+            logger.error(f"Backend {self.name} raised: {str(e)}")
+            result = ERROR
+        return result, time.monotonic() - start
+
+    def __call__(self, *args):
+        if not self.breaker.allow():
+            metrics.add_value(f"{self.name.capitalize()}Unavailable", 1)
+            return UNAVAILABLE
+
+        self.budget.on_call()
+        start = time.monotonic()
+        deadline = start + self.timeout
+        delay = self.hedge_delay()
+        hedge_at = start + delay if delay is not None else None
+
+        in_flight = {self.executor.submit(metrics.propagate(self._attempt), *args)}
+        while in_flight:
+            now = time.monotonic()
+            wake = deadline if hedge_at is None else min(hedge_at, deadline)
+            done, in_flight = wait(in_flight, timeout=max(0.0, wake - now), return_when=FIRST_COMPLETED)
+
+            shed = False
+            for future in done:
+                result, elapsed = future.result()
+                if result == UNAVAILABLE:
+                    # Shed before reaching the backend; says nothing about its health or latency
+                    shed = True
+                    continue
+                if result != ERROR:
+                    self.latencies.record(elapsed)
+                    self.breaker.record_success()
+                    return result
+            if shed and not in_flight:
+                self.breaker.record_shed()
+                return UNAVAILABLE
+
+            now = time.monotonic()
+            if now >= deadline and in_flight:
+                # Attempts keep running in the background; their outcome no longer matters here
+                logger.warning(f"Backend {self.name} gave no answer within {self.timeout}s")
+                self.breaker.record_failure()
+                return TIMEOUT
+
+            if hedge_at is not None and now >= hedge_at and in_flight:
+                hedge_at = None
+                if self.budget.try_spend():
+                    metrics.add_value(f"{self.name.capitalize()}Hedged", 1)
+                    in_flight.add(self.executor.submit(metrics.propagate(self._attempt), *args))
+
+        self.breaker.record_failure()
+        return ERROR
+
+def resilient(name, backend):
+    """Wraps `backend` with the container-wide hedging and circuit-breaker settings."""
+    return ResilientBackend(
+        name,
+        backend,
+        hedge=name in HEDGE_BACKENDS,
+        hedge_percentile=HEDGE_PERCENTILE,
+        hedge_min_delay=HEDGE_MIN_DELAY_MS / 1000,
+        hedge_min_samples=HEDGE_MIN_SAMPLES,
+        hedge_budget=HEDGE_BUDGET_RATIO,
+        breaker=CircuitBreaker(name, BREAKER_FAILURE_THRESHOLD, BREAKER_RESET_SECONDS)
+    )
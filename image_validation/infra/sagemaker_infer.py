@@ -1,35 +1,86 @@
 import os
 import json
-import boto3
+import base64
 import logging
+import threading
+
+from adaptive_limit import limited, Overloaded
+from microbatch import MicroBatcher
+from resilience import UNAVAILABLE
+from utils import metrics
+from utils.aws_clients import get_client
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
-sagemaker_runtime = boto3.client('sagemaker-runtime')
 SAGEMAKER_ENDPOINT = os.environ.get('SAGEMAKER_ENDPOINT')
 
-def classify_with_sagemaker(bucket_name, image_key):
+# Micro-batching sends concurrent requests as one multi-image invocation. The
+# endpoint must accept {"instances": [{"b64": ...}, ...]} as application/json
+# and answer {"predictions": [[...], ...]} with one prediction list per instance.
+SAGEMAKER_MICROBATCH = os.environ.get('SAGEMAKER_MICROBATCH', '0') == '1'
+SAGEMAKER_BATCH_SIZE = int(os.environ.get('SAGEMAKER_BATCH_SIZE', '8'))
+SAGEMAKER_BATCH_WAIT_MS = float(os.environ.get('SAGEMAKER_BATCH_WAIT_MS', '20'))
+
+_batcher = None
+_batcher_lock = threading.Lock()
+
+def _person_score(predictions):
+    # Raw score: the most confident person detection, 0.0 when there is none
+    return max(
+        (float(p.get("confidence", 0)) for p in predictions if p.get("class") == "person"),
+        default=0.0
+    )
+
+def invoke_batch(images):
+    """Scores several images in one endpoint invocation. Returns one score per image."""
+    body = json.dumps({"instances": [{"b64": base64.b64encode(image).decode('ascii')} for image in images]})
+    response = limited(
+        'SageMaker',
+        get_client('sagemaker-runtime').invoke_endpoint,
+        EndpointName=SAGEMAKER_ENDPOINT,
+        ContentType='application/json',
+        Accept='application/json',
+        Body=body
+    )
+    predictions = json.loads(response['Body'].read().decode())["predictions"]
+    return [_person_score(instance_predictions) for instance_predictions in predictions]
+
+def _get_batcher():
+    global _batcher
+    if _batcher is None:
+        with _batcher_lock:
+            if _batcher is None:
+                _batcher = MicroBatcher(
+                    invoke_batch,
+                    max_batch_size=SAGEMAKER_BATCH_SIZE,
+                    max_wait=SAGEMAKER_BATCH_WAIT_MS / 1000,
+                    name='sagemaker-batch'
+                )
+    return _batcher
+
+def classify_with_sagemaker(payload):
+    """Returns the endpoint's person score in [0, 1], "error", or "unavailable" when shed."""
     try:
-        s3 = boto3.client('s3')
-        image_obj = s3.get_object(Bucket=bucket_name, Key=image_key)
-        image_bytes = image_obj['Body'].read()
+        data = payload.inference_bytes()
+        with metrics.span("SageMakerInvoke"):
+            if SAGEMAKER_MICROBATCH:
+                return _get_batcher().submit(data).result()
 
-        response = sagemaker_runtime.invoke_endpoint(
-            EndpointName=SAGEMAKER_ENDPOINT,
-            ContentType='application/x-image',
-            Body=image_bytes
-        )
+            response = limited(
+                'SageMaker',
+                get_client('sagemaker-runtime').invoke_endpoint,
+                EndpointName=SAGEMAKER_ENDPOINT,
+                ContentType='application/x-image',
+                Body=data
+            )
 
         result = json.loads(response['Body'].read().decode())
-        predictions = result.get("predictions", [])
-
-        for prediction in predictions:
-            if prediction.get("class") == "person" and prediction.get("confidence", 0) >= 0.7:
-                return "human"
-        
-        return "not_human"
+        return _person_score(result.get("predictions", []))
 
+    except Overloaded as e:
+        logger.warning(f"SageMaker call shed: {str(e)}")
+        return UNAVAILABLE
     except Exception as e:
         logger.error(f"Error in SageMaker classification: {str(e)}")
         return "error"
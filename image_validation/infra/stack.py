@@ -1,9 +1,21 @@
 import pulumi
 import pulumi_aws as aws
 import json
+import zipfile
+
+def require_bundled(archive, packages):
+    """Fails the deployment when a Lambda zip was built without packages its enabled features need."""
+    with zipfile.ZipFile(archive) as zf:
+        bundled = {name.split("/")[0] for name in zf.namelist()}
+    missing = [package for package in packages if package not in bundled]
+    if missing:
+        raise RuntimeError(f"{archive} does not bundle {', '.join(missing)}; rebuild it with build_lambdas.py "
+                           f"(without --no-deps)")
 
 class HumanImageValidationStack:
-    def __init__(self, provider=None, resource_prefix="human-image-validation"):
+    def __init__(self, provider=None, resource_prefix="human-image-validation",
+                 upload_batch_size=10, upload_batching_window=5, upload_max_concurrency=5,
+                 upload_max_receive_count=5):
         # Common resource options to pass the provider to all resources
         self.resource_options = None
         if provider:
@@ -34,6 +46,37 @@ class HumanImageValidationStack:
             opts=self.resource_options
         )
 
+        # Browsers upload straight to the bucket with presigned URLs; multipart clients need the ETag
+        aws.s3.BucketCorsConfigurationV2(f"{self.prefix}-image-bucket-cors",
+            bucket=self.image_bucket.id,
+            cors_rules=[{
+                "allowed_methods": ["PUT", "POST"],
+                "allowed_origins": ["*"],
+                "allowed_headers": ["*"],
+                "expose_headers": ["ETag"],
+                "max_age_seconds": 3000
+            }],
+            opts=self.resource_options
+        )
+
+        # Multipart uploads that are never completed would otherwise be billed indefinitely
+        aws.s3.BucketLifecycleConfigurationV2(f"{self.prefix}-image-bucket-lifecycle",
+            bucket=self.image_bucket.id,
+            rules=[{
+                "id": "abort-incomplete-uploads",
+                "status": "Enabled",
+                "filter": {"prefix": "uploads/"},
+                "abort_incomplete_multipart_upload": {"days_after_initiation": 1}
+            }],
+            opts=self.resource_options
+        )
+
+        # Perceptual-hash index snapshot and deltas, kept apart from the uploads bucket's notifications and lifecycle
+        self.index_bucket = aws.s3.Bucket(f"{self.prefix}-phash-index-bucket",
+            tags=self.tags,
+            opts=self.resource_options
+        )
+
         # ✅ 2. IAM Role for Lambda
         self.lambda_role = aws.iam.Role(f"{self.prefix}-lambda-role",
             assume_role_policy=json.dumps({
@@ -64,8 +107,20 @@ class HumanImageValidationStack:
                     "Action": [
                         "s3:GetObject",
                         "s3:PutObject",
+                        "s3:AbortMultipartUpload",
+                        # Perceptual-hash index deltas are listed on load and removed once compacted
+                        "s3:ListBucket",
+                        "s3:DeleteObject",
+                        "sqs:ReceiveMessage",
+                        "sqs:DeleteMessage",
+                        "sqs:GetQueueAttributes",
                         "dynamodb:PutItem",
+                        "dynamodb:BatchWriteItem",
+                        "dynamodb:BatchGetItem",
                         "dynamodb:GetItem",
+                        "dynamodb:Query",
+                        "dynamodb:UpdateItem",
+                        "dynamodb:DeleteItem",
                         "rekognition:DetectLabels",
                         "sns:Publish",
                         "sagemaker:CreateTrainingJob",
@@ -89,13 +144,87 @@ class HumanImageValidationStack:
         )
 
         # ✅ 4. DynamoDB Table for Storing Classification Results
+        # Items use the compact layout in utils/result_schema.py. The indexes serve review
+        # (agreement over time) and reports (verdicts per day) without scanning the table;
+        # items are small, so projecting them whole keeps queries to a single read. Both
+        # index hash keys carry the UTC day ("<flag>#<YYYY-MM-DD>"), so writes spread over
+        # a partition per day instead of piling onto two values.
         self.dynamodb_table = aws.dynamodb.Table(
             f"{self.prefix}-classification-results",
             attributes=[
-                {"name": "ImageKey", "type": "S"}
+                {"name": "ImageKey", "type": "S"},
+                {"name": "ag", "type": "S"},
+                {"name": "hd", "type": "S"},
+                {"name": "ts", "type": "N"}
             ],
             billing_mode="PAY_PER_REQUEST",
             hash_key="ImageKey",
+            global_secondary_indexes=[
+                {
+                    "name": "AgreementTime",
+                    "hash_key": "ag",
+                    "range_key": "ts",
+                    "projection_type": "ALL"
+                },
+                {
+                    "name": "HumanDay",
+                    "hash_key": "hd",
+                    "range_key": "ts",
+                    "projection_type": "ALL"
+                }
+            ],
+            ttl={
+                "attribute_name": "exp",
+                "enabled": True
+            },
+            tags=self.tags,
+            opts=self.resource_options
+        )
+
+        # Shared tier of the content-addressed classification cache
+        self.cache_table = aws.dynamodb.Table(
+            f"{self.prefix}-classification-cache",
+            attributes=[
+                {"name": "ContentHash", "type": "S"}
+            ],
+            billing_mode="PAY_PER_REQUEST",
+            hash_key="ContentHash",
+            ttl={
+                "attribute_name": "ExpiresAt",
+                "enabled": True
+            },
+            tags=self.tags,
+            opts=self.resource_options
+        )
+
+        # Status records for asynchronous classification jobs
+        self.jobs_table = aws.dynamodb.Table(
+            f"{self.prefix}-classification-jobs",
+            attributes=[
+                {"name": "JobId", "type": "S"}
+            ],
+            billing_mode="PAY_PER_REQUEST",
+            hash_key="JobId",
+            ttl={
+                "attribute_name": "ExpiresAt",
+                "enabled": True
+            },
+            tags=self.tags,
+            opts=self.resource_options
+        )
+
+        # One claim per uploaded object, so it is classified once across the API and S3 event paths
+        self.idempotency_table = aws.dynamodb.Table(
+            f"{self.prefix}-classification-claims",
+            attributes=[
+                {"name": "ClaimKey", "type": "S"}
+            ],
+            billing_mode="PAY_PER_REQUEST",
+            hash_key="ClaimKey",
+            ttl={
+                "attribute_name": "ExpiresAt",
+                "enabled": True
+            },
             tags=self.tags,
             opts=self.resource_options
         )
@@ -106,6 +235,10 @@ class HumanImageValidationStack:
             opts=self.resource_options
         )
 
+        # Normalization and near-duplicate reuse are on by default and need Pillow; without it they silently do nothing
+        for archive in ("api_handler.zip", "image_processor.zip"):
+            require_bundled(archive, ["PIL"])
+
         # ✅ 6. API Handler Lambda
         self.api_lambda = aws.lambda_.Function(f"{self.prefix}-api-handler",
             runtime="python3.9",
@@ -119,7 +252,13 @@ class HumanImageValidationStack:
                     "BUCKET_NAME": self.image_bucket.id,
                     "DYNAMODB_TABLE": self.dynamodb_table.name,
                     "SNS_TOPIC_ARN": self.sns_topic.arn,
-                    "TABLE_NAME": self.dynamodb_table.name
+                    "TABLE_NAME": self.dynamodb_table.name,
+                    "CACHE_TABLE_NAME": self.cache_table.name,
+                    "JOBS_TABLE_NAME": self.jobs_table.name,
+                    "IDEMPOTENCY_TABLE_NAME": self.idempotency_table.name,
+                    "PHASH_INDEX_BUCKET": self.index_bucket.id,
+                    "CLASSIFY_MODE": "sync",
+                    "METRICS_ENABLED": "1"
                 }
             },
             tags=self.tags,
@@ -132,42 +271,88 @@ class HumanImageValidationStack:
             handler="image_processor.lambda_handler",
             role=self.lambda_role.arn,
             memory_size=1024,
-            timeout=15,
+            timeout=60, # Room for a full batch of uploads
             code=pulumi.FileArchive("image_processor.zip"),
             environment={
                 "variables": {
                     "BUCKET_NAME": self.image_bucket.id,
                     "DYNAMODB_TABLE": self.dynamodb_table.name,
-                    "TABLE_NAME": self.dynamodb_table.name
+                    "TABLE_NAME": self.dynamodb_table.name,
+                    "CACHE_TABLE_NAME": self.cache_table.name,
+                    "JOBS_TABLE_NAME": self.jobs_table.name,
+                    "IDEMPOTENCY_TABLE_NAME": self.idempotency_table.name,
+                    "PHASH_INDEX_BUCKET": self.index_bucket.id,
+                    "JOB_MAX_ATTEMPTS": str(upload_max_receive_count),
+                    "METRICS_ENABLED": "1"
                 }
             },
             tags=self.tags,
             opts=self.resource_options
         )
 
-        # Lambda permission for S3 invocation - moved up before S3 notification
-        self.lambda_permission = aws.lambda_.Permission(f"{self.prefix}-s3-permission",
-            action="lambda:InvokeFunction",
-            function=self.image_lambda.name,
-            principal="s3.amazonaws.com",
-            source_arn=self.image_bucket.arn,
+        # Upload notifications are buffered in SQS so bursts don't become bursts of invocations
+        self.upload_dlq = aws.sqs.Queue(f"{self.prefix}-upload-dlq",
+            message_retention_seconds=1209600,
+            tags=self.tags,
+            opts=self.resource_options
+        )
+
+        self.upload_queue = aws.sqs.Queue(f"{self.prefix}-upload-queue",
+            visibility_timeout_seconds=360, # 6x the image processor timeout
+            redrive_policy=self.upload_dlq.arn.apply(lambda arn: json.dumps({
+                "deadLetterTargetArn": arn,
+                "maxReceiveCount": upload_max_receive_count
+            })),
+            tags=self.tags,
             opts=self.resource_options
         )
 
-        # S3 Event Trigger for Image Processor Lambda - now after lambda_permission
+        # Allow the image bucket to publish notifications to the queue
+        self.upload_queue_policy = aws.sqs.QueuePolicy(f"{self.prefix}-upload-queue-policy",
+            queue_url=self.upload_queue.id,
+            policy=pulumi.Output.all(
+                queue_arn=self.upload_queue.arn,
+                bucket_arn=self.image_bucket.arn
+            ).apply(lambda args: json.dumps({
+                "Version": "2012-10-17",
+                "Statement": [{
+                    "Effect": "Allow",
+                    "Principal": { "Service": "s3.amazonaws.com" },
+                    "Action": "sqs:SendMessage",
+                    "Resource": args["queue_arn"],
+                    "Condition": { "ArnEquals": { "aws:SourceArn": args["bucket_arn"] } }
+                }]
+            })),
+            opts=self.resource_options
+        )
+
+        # S3 Event Trigger for uploads, delivered through the queue
         self.s3_notification = aws.s3.BucketNotification(f"{self.prefix}-upload-notification",
             bucket=self.image_bucket.id,
-            lambda_functions=[{
-                "lambda_function_arn": self.image_lambda.arn,
+            queues=[{
+                "queue_arn": self.upload_queue.arn,
                 "events": ["s3:ObjectCreated:*"],
                 "filter_prefix": "uploads/"
             }],
             opts=pulumi.ResourceOptions.merge(
                 self.resource_options,
-                pulumi.ResourceOptions(depends_on=[self.lambda_permission])
+                pulumi.ResourceOptions(depends_on=[self.upload_queue_policy])
             )
         )
 
+        # Image processor consumes the queue in batches and reports per-message failures
+        self.upload_event_source = aws.lambda_.EventSourceMapping(f"{self.prefix}-upload-event-source",
+            event_source_arn=self.upload_queue.arn,
+            function_name=self.image_lambda.arn,
+            batch_size=upload_batch_size,
+            maximum_batching_window_in_seconds=upload_batching_window,
+            function_response_types=["ReportBatchItemFailures"],
+            scaling_config={
+                "maximum_concurrency": upload_max_concurrency
+            },
+            opts=self.resource_options
+        )
+
         # ✅ 8. Training Handler Lambda
         self.training_lambda = aws.lambda_.Function(f"{self.prefix}-training-handler",
             runtime="python3.9",
@@ -195,8 +380,10 @@ class HumanImageValidationStack:
             protocol_type="HTTP",
             cors_configuration={
                 "allow_origins": ["*"],
-                "allow_methods": ["POST", "OPTIONS"],
-                "allow_headers": ["Content-Type", "Authorization", "X-Amz-Date", "X-Api-Key", "X-Amz-Security-Token"]
+                "allow_methods": ["GET", "POST", "OPTIONS"],
+                "allow_headers": ["Content-Type", "Authorization", "X-Amz-Date", "X-Api-Key", "X-Amz-Security-Token",
+                                  "If-None-Match", "Prefer"],
+                "expose_headers": ["ETag", "Location", "Retry-After"]
             },
             tags=self.tags,
             opts=self.resource_options
@@ -220,6 +407,52 @@ class HumanImageValidationStack:
             opts=self.resource_options
         )
 
+        # Polling route for asynchronous jobs
+        self.jobs_route = aws.apigatewayv2.Route(f"{self.prefix}-jobs-route",
+            api_id=self.api_gateway.id,
+            route_key="GET /jobs/{job_id}",
+            target=pulumi.Output.concat("integrations/", self.lambda_integration.id),
+            opts=self.resource_options
+        )
+
+        # Result lookups; image IDs are S3 keys, so the greedy parameter accepts slashes
+        self.results_route = aws.apigatewayv2.Route(f"{self.prefix}-results-route",
+            api_id=self.api_gateway.id,
+            route_key="GET /results/{image_id+}",
+            target=pulumi.Output.concat("integrations/", self.lambda_integration.id),
+            opts=self.resource_options
+        )
+
+        self.results_batch_route = aws.apigatewayv2.Route(f"{self.prefix}-results-batch-route",
+            api_id=self.api_gateway.id,
+            route_key="POST /results:batchGet",
+            target=pulumi.Output.concat("integrations/", self.lambda_integration.id),
+            opts=self.resource_options
+        )
+
+        # Paged listing by agreement or verdict, for review
+        self.results_list_route = aws.apigatewayv2.Route(f"{self.prefix}-results-list-route",
+            api_id=self.api_gateway.id,
+            route_key="GET /results",
+            target=pulumi.Output.concat("integrations/", self.lambda_integration.id),
+            opts=self.resource_options
+        )
+
+        # Presigned direct-to-S3 uploads
+        self.upload_routes = [
+            aws.apigatewayv2.Route(f"{self.prefix}-{name}-route",
+                api_id=self.api_gateway.id,
+                route_key=route_key,
+                target=pulumi.Output.concat("integrations/", self.lambda_integration.id),
+                opts=self.resource_options
+            )
+            for name, route_key in [
+                ("uploads", "POST /uploads"),
+                ("uploads-complete", "POST /uploads/complete"),
+                ("uploads-abort", "POST /uploads/abort")
+            ]
+        ]
+
         # Lambda permission for API Gateway invocation
         self.api_permission = aws.lambda_.Permission(f"{self.prefix}-api-gateway-permission",
             action="lambda:InvokeFunction",
@@ -235,7 +468,10 @@ class HumanImageValidationStack:
             # Explicitly depend on the route
             opts=pulumi.ResourceOptions.merge(
                 self.resource_options,
-                pulumi.ResourceOptions(depends_on=[self.route, self.api_permission])
+                pulumi.ResourceOptions(depends_on=[self.route, self.jobs_route, self.results_route,
+                                                self.results_batch_route, self.results_list_route,
+                                                *self.upload_routes,
+                                                self.api_permission])
             )   
         )
 
@@ -366,5 +602,8 @@ class HumanImageValidationStack:
         pulumi.export("api_endpoint", pulumi.Output.concat(self.stage.invoke_url, "/classify"))
         pulumi.export("frontend_url", pulumi.Output.concat("https://", self.cloudfront_distribution.domain_name))
         pulumi.export("image_bucket_name", self.image_bucket.id)
+        pulumi.export("phash_index_bucket_name", self.index_bucket.id)
         pulumi.export("frontend_bucket_name", self.frontend_bucket.id)
-        pulumi.export("dynamodb_table_name", self.dynamodb_table.name)
\ No newline at end of file
+        pulumi.export("dynamodb_table_name", self.dynamodb_table.name)
+        pulumi.export("jobs_table_name", self.jobs_table.name)
+        pulumi.export("idempotency_table_name", self.idempotency_table.name)
\ No newline at end of file
@@ -1,15 +1,13 @@
 import os
 import json
-import boto3
 import logging
 
+from utils.aws_clients import get_client
+
 # Configure logging
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
-# Initialize AWS SageMaker client
-sagemaker = boto3.client('sagemaker')
-
 # Get environment variables
 TRAINING_JOB_NAME = os.environ.get('TRAINING_JOB_NAME', 'YOLOv5TrainingJob')
 SAGEMAKER_ROLE_ARN = os.environ.get('SAGEMAKER_ROLE_ARN')
@@ -50,7 +48,7 @@ def lambda_handler(event, context):
             }
         }
 
-        response = sagemaker.create_training_job(**training_params)
+        response = get_client('sagemaker').create_training_job(**training_params)
         logger.info(f"Training job {TRAINING_JOB_NAME} started successfully.")
 
         return {
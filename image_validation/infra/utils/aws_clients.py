@@ -0,0 +1,85 @@
+import os
+import threading
+
+# Connection tuning shared by every client in the container
+AWS_MAX_POOL_CONNECTIONS = int(os.environ.get('AWS_MAX_POOL_CONNECTIONS', '50'))
+AWS_CONNECT_TIMEOUT = float(os.environ.get('AWS_CONNECT_TIMEOUT', '2'))
+AWS_READ_TIMEOUT = float(os.environ.get('AWS_READ_TIMEOUT', '10'))
+AWS_MAX_ATTEMPTS = int(os.environ.get('AWS_MAX_ATTEMPTS', '3'))
+
+# Per-service overrides on top of the shared config
+SERVICE_CONFIG = {
+    # Endpoint invocations may legitimately run for up to 60 seconds
+    'sagemaker-runtime': {'read_timeout': 60},
+    # Presigned upload URLs must be SigV4 to work in every region and with SSE-KMS
+    's3': {'signature_version': 's3v4'}
+}
+
+_session = None
+_clients = {}
+_resources = {}
+_tables = {}
+_lock = threading.Lock()
+
+def _config(service_name):
+    from botocore.config import Config
+    options = {
+        'max_pool_connections': AWS_MAX_POOL_CONNECTIONS,
+        'connect_timeout': AWS_CONNECT_TIMEOUT,
+        'read_timeout': AWS_READ_TIMEOUT,
+        'tcp_keepalive': True,
+        'retries': {'mode': 'adaptive', 'max_attempts': AWS_MAX_ATTEMPTS}
+    }
+    options.update(SERVICE_CONFIG.get(service_name, {}))
+    return Config(**options)
+
+def _get_session():
+    # boto3 is imported on first use so code paths that never call AWS don't pay for it
+    global _session
+    if _session is None:
+        import boto3
+        _session = boto3.session.Session()
+    return _session
+
+def get_client(service_name):
+    """Returns the container-wide client for `service_name`, creating it on first use."""
+    client = _clients.get(service_name)
+    if client is None:
+        # Session and client creation are not thread-safe; clients themselves are
+        with _lock:
+            client = _clients.get(service_name)
+            if client is None:
+                client = _get_session().client(service_name, config=_config(service_name))
+                _clients[service_name] = client
+    return client
+
+def get_resource(service_name):
+    """Returns the container-wide resource for `service_name`, creating it on first use."""
+    resource = _resources.get(service_name)
+    if resource is None:
+        with _lock:
+            resource = _resources.get(service_name)
+            if resource is None:
+                resource = _get_session().resource(service_name, config=_config(service_name))
+                _resources[service_name] = resource
+    return resource
+
+def get_table(table_name):
+    """Returns a cached DynamoDB Table object for `table_name`."""
+    table = _tables.get(table_name)
+    if table is None:
+        table = get_resource('dynamodb').Table(table_name)
+        _tables[table_name] = table
+    return table
+
+def register_client(service_name, client):
+    """Replaces the client for `service_name`, e.g. with a local fake."""
+    with _lock:
+        _clients[service_name] = client
+
+def register_resource(service_name, resource):
+    """Replaces the resource for `service_name`, e.g. with a local fake."""
+    with _lock:
+        _resources[service_name] = resource
+        if service_name == 'dynamodb':
+            _tables.clear()
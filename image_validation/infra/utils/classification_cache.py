@@ -0,0 +1,168 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+
+from utils.aws_clients import get_table
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# In-process tier: survives across warm invocations of the same container
+CACHE_MAX_ENTRIES = int(os.environ.get('CACHE_MAX_ENTRIES', '1024'))
+CACHE_TTL_SECONDS = int(os.environ.get('CACHE_TTL_SECONDS', '3600'))
+
+# Shared tier: DynamoDB table keyed by ContentHash with ExpiresAt as its TTL attribute
+CACHE_TABLE_NAME = os.environ.get('CACHE_TABLE_NAME')
+CACHE_SHARED_TTL_SECONDS = int(os.environ.get('CACHE_SHARED_TTL_SECONDS', str(7 * 24 * 3600)))
+
+def content_hash(data):
+    """Returns the SHA-256 hex digest used as the cache key for image bytes."""
+    return hashlib.sha256(data).hexdigest()
+
+class LRUCache:
+    """Bounded, thread-safe LRU map whose entries expire after a TTL."""
+
+    def __init__(self, max_entries, ttl_seconds):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
+
+class SingleFlight:
+    """Coalesces concurrent calls for the same key into one execution."""
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn):
+        """Runs `fn` unless a call for `key` is already in flight. Returns `(value, shared)`."""
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._calls[key] = future
+
+        if not leader:
+            return future.result(), True
+
+        try:
+            value = fn()
+            future.set_result(value)
+            return value, False
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+
+_local = LRUCache(CACHE_MAX_ENTRIES, CACHE_TTL_SECONDS)
+_flight = SingleFlight()
+
+_stats = {"local_hits": 0, "shared_hits": 0, "misses": 0, "coalesced": 0}
+_stats_lock = threading.Lock()
+
+def _count(name):
+    with _stats_lock:
+        _stats[name] += 1
+
+def get_stats():
+    """Returns a snapshot of the hit/miss counters and the local tier size."""
+    with _stats_lock:
+        stats = dict(_stats)
+    stats["local_entries"] = len(_local)
+    return stats
+
+def _shared_get(key):
+    if not CACHE_TABLE_NAME:
+        return None
+    try:
+        item = get_table(CACHE_TABLE_NAME).get_item(Key={"ContentHash": key}).get("Item")
+        # DynamoDB TTL deletion is lazy, so expired items can still be returned
+        if item and int(item["ExpiresAt"]) > time.time():
+            return json.loads(item["Result"])
+    except Exception as e:
+        logger.error(f"Error reading classification cache: {str(e)}")
+    return None
+
+def _shared_put(key, value):
+    if not CACHE_TABLE_NAME:
+        return
+    try:
+        get_table(CACHE_TABLE_NAME).put_item(Item={
+            "ContentHash": key,
+            "Result": json.dumps(value),
+            "ExpiresAt": int(time.time()) + CACHE_SHARED_TTL_SECONDS
+        })
+    except Exception as e:
+        logger.error(f"Error writing classification cache: {str(e)}")
+
+def lookup(key):
+    """Returns the cached classification for `key` from either tier, or None, without computing it."""
+    value = _local.get(key)
+    if value is None:
+        value = _shared_get(key)
+        if value is not None:
+            _local.put(key, value)
+    return value
+
+def get_or_classify(key, classify, cacheable=lambda value: True):
+    """Returns the cached classification for `key`, computing it at most once per container.
+
+    Lookup order is the local LRU, then the shared DynamoDB tier, then
+    `classify()`. Concurrent callers with the same key wait for a single
+    in-flight computation. Values rejected by `cacheable` are returned but
+    not stored.
+    """
+    value = _local.get(key)
+    if value is not None:
+        _count("local_hits")
+        return value
+
+    def load():
+        shared = _shared_get(key)
+        if shared is not None:
+            _count("shared_hits")
+            _local.put(key, shared)
+            return shared
+
+        _count("misses")
+        computed = classify()
+        if cacheable(computed):
+            _local.put(key, computed)
+            _shared_put(key, computed)
+        return computed
+
+    value, shared = _flight.do(key, load)
+    if shared:
+        _count("coalesced")
+    return value
@@ -1,24 +1,383 @@
 import os
 import json
-import boto3
+import time
+import base64
+import random
 import logging
-from datetime import datetime
+import threading
+from datetime import datetime, timedelta, timezone
+
+from utils import metrics, result_schema
+from utils.aws_clients import get_resource, get_table
+from utils.classification_cache import LRUCache
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
-dynamodb = boto3.resource('dynamodb')
 TABLE_NAME = os.environ.get('TABLE_NAME')
-table = dynamodb.Table(TABLE_NAME)
 
-def save_classification_result(result):
+# "buffered" groups writes into batch_write_item calls; "sync" writes each result with put_item
+RESULT_WRITE_MODE = os.environ.get('RESULT_WRITE_MODE', 'buffered')
+RESULT_FLUSH_SIZE = int(os.environ.get('RESULT_FLUSH_SIZE', '25'))
+RESULT_FLUSH_AGE_SECONDS = float(os.environ.get('RESULT_FLUSH_AGE_SECONDS', '1.0'))
+RESULT_MAX_RETRIES = int(os.environ.get('RESULT_MAX_RETRIES', '8'))
+
+# Read-through cache for result lookups; results rarely change once written
+RESULT_CACHE_TTL_SECONDS = int(os.environ.get('RESULT_CACHE_TTL_SECONDS', '30'))
+RESULT_CACHE_MAX_ENTRIES = int(os.environ.get('RESULT_CACHE_MAX_ENTRIES', '4096'))
+
+# Attribute holding the result's primary key
+RESULT_KEY_ATTRIBUTE = result_schema.KEY_ATTRIBUTE
+
+# Secondary indexes of the results table (see result_schema for the attributes)
+AGREEMENT_INDEX = 'AgreementTime'
+HUMAN_DAY_INDEX = 'HumanDay'
+# Longest window an index query walks, one day partition at a time
+RESULT_QUERY_MAX_DAYS = int(os.environ.get('RESULT_QUERY_MAX_DAYS', '92'))
+RESULT_QUERY_DEFAULT_DAYS = 7
+
+# batch_write_item accepts at most 25 requests per call, batch_get_item 100 keys
+BATCH_WRITE_LIMIT = 25
+BATCH_GET_LIMIT = 100
+
+def _backoff(attempt):
+    # Full jitter, capped at 2 seconds
+    time.sleep(random.uniform(0, min(2.0, 0.05 * (2 ** attempt))))
+
+class ResultWriter:
+    """Write-behind sink that groups result items into batch_write_item calls.
+
+    Items are flushed when the buffer reaches `flush_size`, when the oldest
+    buffered item is older than `flush_age` seconds, and whenever `flush()`
+    is called, which handlers do at the end of every invocation.
+    Unprocessed items are retried with full-jitter exponential backoff.
+    Items that fail in a size- or age-triggered flush are reported by the
+    next `flush()`, so the caller settling the invocation still sees them.
+    """
+
+    def __init__(self, table_name, key_attribute, flush_size=BATCH_WRITE_LIMIT,
+                 flush_age=1.0, max_retries=8):
+        self.table_name = table_name
+        self.key_attribute = key_attribute
+        self.flush_size = min(flush_size, BATCH_WRITE_LIMIT)
+        self.flush_age = flush_age
+        self.max_retries = max_retries
+        self._buffer = []
+        self._failed = []
+        self._oldest = None
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._timer = None
+
+    def add(self, item):
+        with self._lock:
+            if not self._buffer:
+                self._oldest = time.monotonic()
+            self._buffer.append(item)
+            full = len(self._buffer) >= self.flush_size
+            self._ensure_timer()
+        if full:
+            self._write_buffer(keep_failures=True)
+
+    def _ensure_timer(self):
+        # Age-based flushing for long-running processes; Lambda also flushes at the end of each invocation
+        if self._timer is None or not self._timer.is_alive():
+            self._timer = threading.Thread(target=self._flush_when_old, name='result-writer', daemon=True)
+            self._timer.start()
+
+    def _flush_when_old(self):
+        while True:
+            time.sleep(self.flush_age)
+            with self._lock:
+                if not self._buffer:
+                    return
+                due = time.monotonic() - self._oldest >= self.flush_age
+            if due:
+                self._write_buffer(keep_failures=True)
+
+    def flush(self):
+        """Writes every buffered item. Returns the keys of items that could not be written since the last flush."""
+        failed = self._write_buffer()
+        with self._lock:
+            failed, self._failed = self._failed + failed, []
+        return failed
+
+    def _write_buffer(self, keep_failures=False):
+        with self._flush_lock:
+            with self._lock:
+                items, self._buffer = self._buffer, []
+                self._oldest = None
+
+            failed = []
+            for start in range(0, len(items), BATCH_WRITE_LIMIT):
+                failed.extend(self._write_batch(items[start:start + BATCH_WRITE_LIMIT]))
+            if keep_failures and failed:
+                # Kept under the flush lock, so a flush() waiting on this one sees them
+                with self._lock:
+                    self._failed.extend(failed)
+            return failed
+
+    def _write_batch(self, items):
+        # A batch may not contain the same key twice; the latest result wins
+        unique = {item[self.key_attribute]: item for item in items}
+        requests = [{"PutRequest": {"Item": item}} for item in unique.values()]
+
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = get_resource('dynamodb').batch_write_item(RequestItems={self.table_name: requests})
+                requests = response.get("UnprocessedItems", {}).get(self.table_name, [])
+            except Exception as e:
+                logger.error(f"Error writing result batch to DynamoDB: {str(e)}")
+            if not requests:
+                logger.info(f"Saved {len(unique)} results in a batch")
+                return []
+            _backoff(attempt)
+
+        failed = [request["PutRequest"]["Item"][self.key_attribute] for request in requests]
+        logger.error(f"Gave up writing {len(failed)} results after {self.max_retries} retries")
+        return failed
+
+_writer = ResultWriter(
+    TABLE_NAME,
+    key_attribute=RESULT_KEY_ATTRIBUTE,
+    flush_size=RESULT_FLUSH_SIZE,
+    flush_age=RESULT_FLUSH_AGE_SECONDS,
+    max_retries=RESULT_MAX_RETRIES
+)
+
+# Results saved by this container are cached too, so a poll right after classification is a hit
+_result_cache = LRUCache(RESULT_CACHE_MAX_ENTRIES, RESULT_CACHE_TTL_SECONDS)
+
+def save_classification_result(result, sync=None):
+    """Stores a result. Buffered by default; pass `sync=True` when the caller needs read-after-write."""
     try:
-        result['timestamp'] = datetime.utcnow().isoformat()
+        item = result_schema.encode(result)
+        result['timestamp'] = result_schema.isoformat(item["ts"])
 
-        table.put_item(Item=result)
-        logger.info(f"Successfully saved result for image: {result['image_id']}")
+        with metrics.span("Save"):
+            if sync or (sync is None and RESULT_WRITE_MODE == 'sync'):
+                get_table(TABLE_NAME).put_item(Item=item)
+                logger.info(f"Successfully saved result for image: {result['image_id']}")
+            else:
+                _writer.add(item)
+        # Cached as it will read back, e.g. with scores rounded
+        _result_cache.put(result['image_id'], result_schema.decode(item))
         return True
 
     except Exception as e:
         logger.error(f"Error saving result to DynamoDB: {str(e)}")
         return False
+
+def flush_results():
+    """Flushes buffered results; call at the end of every invocation. Returns image IDs that failed."""
+    return _writer.flush()
+
+def get_classification_result(image_id, consistent=False):
+    """Returns the stored result for `image_id`, or None.
+
+    Served from the in-process cache unless `consistent` is set, which
+    reads straight from DynamoDB with a strongly consistent read.
+    """
+    if not consistent:
+        cached = _result_cache.get(image_id)
+        if cached is not None:
+            return cached
+
+    item = get_table(TABLE_NAME).get_item(
+        Key={RESULT_KEY_ATTRIBUTE: image_id},
+        ConsistentRead=consistent
+    ).get("Item")
+    if item is None:
+        return None
+
+    result = result_schema.decode(item)
+    _result_cache.put(image_id, result)
+    return result
+
+def get_classification_results(image_ids, consistent=False):
+    """Looks up many results with batch_get_item. Returns `(results, unprocessed)`.
+
+    `results` maps each found image ID to its result; IDs without a
+    stored result are absent. `unprocessed` lists IDs DynamoDB still had
+    not returned after `RESULT_MAX_RETRIES` retries.
+    """
+    results = {}
+    pending = []
+    for image_id in dict.fromkeys(image_ids):
+        cached = None if consistent else _result_cache.get(image_id)
+        if cached is not None:
+            results[image_id] = cached
+        else:
+            pending.append(image_id)
+
+    unprocessed = []
+    for start in range(0, len(pending), BATCH_GET_LIMIT):
+        found, missed = _batch_get(pending[start:start + BATCH_GET_LIMIT], consistent)
+        results.update(found)
+        unprocessed.extend(missed)
+    return results, unprocessed
+
+def _batch_get(image_ids, consistent):
+    keys = [{RESULT_KEY_ATTRIBUTE: image_id} for image_id in image_ids]
+    found = {}
+
+    for attempt in range(RESULT_MAX_RETRIES + 1):
+        request = {TABLE_NAME: {"Keys": keys, "ConsistentRead": consistent}}
+        try:
+            response = get_resource('dynamodb').batch_get_item(RequestItems=request)
+            for item in response.get("Responses", {}).get(TABLE_NAME, []):
+                result = result_schema.decode(item)
+                found[result['image_id']] = result
+                _result_cache.put(result['image_id'], result)
+            keys = response.get("UnprocessedKeys", {}).get(TABLE_NAME, {}).get("Keys", [])
+        except Exception as e:
+            logger.error(f"Error reading result batch from DynamoDB: {str(e)}")
+        if not keys:
+            return found, []
+        _backoff(attempt)
+
+    missed = [key[RESULT_KEY_ATTRIBUTE] for key in keys]
+    logger.error(f"Gave up reading {len(missed)} results after {RESULT_MAX_RETRIES} retries")
+    return found, missed
+
+# --------------------------------------
+# Index queries for review and reports
+# --------------------------------------
+def _epoch_ms(moment):
+    # Naive datetimes are UTC, like stored timestamps
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return int(moment.timestamp() * 1000)
+
+def _encode_cursor(state):
+    return base64.urlsafe_b64encode(json.dumps(result_schema.from_dynamodb(state)).encode()).decode()
+
+def _decode_cursor(cursor):
+    if not cursor:
+        return {}
+    try:
+        state = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if not isinstance(state, dict):
+            raise ValueError(state)
+        return state
+    except (ValueError, TypeError) as e:
+        raise ValueError("Invalid cursor") from e
+
+def _query_page(index, hash_attribute, hash_value, since_ms, until_ms, limit, start_key, newest_first):
+    # Imported here, like boto3 itself, so cold starts that never query don't pay for it
+    from boto3.dynamodb.conditions import Key
+
+    condition = Key(hash_attribute).eq(hash_value)
+    if since_ms is not None and until_ms is not None:
+        condition &= Key('ts').between(since_ms, until_ms)
+    elif since_ms is not None:
+        condition &= Key('ts').gte(since_ms)
+    elif until_ms is not None:
+        condition &= Key('ts').lte(until_ms)
+
+    # Key conditions only: a filter expression would still pay for every item it drops
+    kwargs = {"IndexName": index, "KeyConditionExpression": condition, "Limit": limit,
+              "ScanIndexForward": not newest_first}
+    if start_key:
+        kwargs["ExclusiveStartKey"] = start_key
+    with metrics.span("Query"):
+        response = get_table(TABLE_NAME).query(**kwargs)
+    return [result_schema.decode(item) for item in response.get("Items", [])], response.get("LastEvaluatedKey")
+
+def query_by_agreement(agreement, since=None, until=None, limit=100, cursor=None, newest_first=True):
+    """One page of results whose backends agreed (or, with `agreement=False`, disagreed).
+
+    `since` and `until` are datetimes (naive ones are UTC) bounding when
+    the results were stored. The window defaults to the last
+    RESULT_QUERY_DEFAULT_DAYS days and may span at most RESULT_QUERY_MAX_DAYS;
+    it is read one UTC day partition at a time, in order. Results with fewer
+    than two answering backends have no agreement and are never returned.
+    Returns `(results, cursor)`; pass the cursor back with the same
+    arguments for the next page. It is None after the last page.
+    """
+    return _query_days(AGREEMENT_INDEX, 'ag', lambda day: result_schema.agreement_day(agreement, day),
+                       since, until, limit, cursor, newest_first)
+
+def query_by_label(is_human, since=None, until=None, limit=100, cursor=None, newest_first=True):
+    """One page of results with the given verdict stored between `since` and `until`.
+
+    The window and paging work as in `query_by_agreement`.
+    """
+    return _query_days(HUMAN_DAY_INDEX, 'hd', lambda day: result_schema.human_day(is_human, day),
+                       since, until, limit, cursor, newest_first)
+
+def _query_days(index, hash_attribute, partition, since, until, limit, cursor, newest_first):
+    # Both indexes are sharded by UTC day, so a window is read one day partition at a time
+    state = _decode_cursor(cursor)
+    if "w" in state:
+        # The window is pinned by the first page, so a default "until" doesn't move between pages
+        since_ms, until_ms = state["w"]
+    else:
+        until = until or datetime.utcnow()
+        since = since or until - timedelta(days=RESULT_QUERY_DEFAULT_DAYS)
+        since_ms, until_ms = _epoch_ms(since), _epoch_ms(until)
+    if since_ms > until_ms:
+        raise ValueError("since must not be after until")
+
+    first, last = result_schema.day(since_ms), result_schema.day(until_ms)
+    days = []
+    moment = datetime.strptime(first, '%Y-%m-%d')
+    while moment.strftime('%Y-%m-%d') <= last:
+        days.append(moment.strftime('%Y-%m-%d'))
+        moment += timedelta(days=1)
+    if len(days) > RESULT_QUERY_MAX_DAYS:
+        raise ValueError(f"At most {RESULT_QUERY_MAX_DAYS} days can be queried at once")
+    if newest_first:
+        days.reverse()
+
+    if state.get("d"):
+        if state["d"] not in days:
+            raise ValueError("Invalid cursor")
+        days = days[days.index(state["d"]):]
+    start_key = state.get("k")
+
+    results = []
+    for position, day in enumerate(days):
+        while True:
+            page, start_key = _query_page(
+                index, hash_attribute, partition(day),
+                since_ms, until_ms, limit - len(results), start_key, newest_first
+            )
+            results.extend(page)
+            if start_key is None or len(results) >= limit:
+                break
+        if len(results) >= limit:
+            if start_key is not None:
+                return results, _encode_cursor({"w": [since_ms, until_ms], "d": day, "k": start_key})
+            if position + 1 < len(days):
+                return results, _encode_cursor({"w": [since_ms, until_ms], "d": days[position + 1]})
+            return results, None
+    return results, None
+
+def iter_results(since=None, until=None, agreement=None, is_human=None, page_size=500):
+    """Yields every result stored in the window, page by page, for reports and review tools.
+
+    Filters by `agreement` or by `is_human`, not both; with neither, both
+    verdicts are read from the HumanDay index. The window limits of the
+    queries apply either way.
+    """
+    if agreement is not None and is_human is not None:
+        raise ValueError("Filter by agreement or by is_human, not both")
+
+    until = until or datetime.utcnow()
+    if agreement is not None:
+        queries = [lambda cursor: query_by_agreement(agreement, since, until, page_size, cursor)]
+    else:
+        labels = [is_human] if is_human is not None else [True, False]
+        queries = [
+            lambda cursor, label=label: query_by_label(label, since, until, page_size, cursor)
+            for label in labels
+        ]
+
+    for query in queries:
+        cursor = None
+        while True:
+            results, cursor = query(cursor)
+            yield from results
+            if cursor is None:
+                break
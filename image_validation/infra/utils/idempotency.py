@@ -0,0 +1,132 @@
+import os
+import time
+import logging
+
+from utils.aws_clients import get_table
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# One claim per uploaded object, so it is classified once however many paths or
+# deliveries reach it. Records expire through the ExpiresAt TTL attribute.
+IDEMPOTENCY_TABLE_NAME = os.environ.get('IDEMPOTENCY_TABLE_NAME')
+
+# An unfinished claim older than this belongs to a run that crashed or timed out and
+# can be taken over. Must exceed the longest function timeout, and stay well under
+# the upload queue's visibility timeout so a redelivery finds the lease expired.
+IDEMPOTENCY_LEASE_SECONDS = int(os.environ.get('IDEMPOTENCY_LEASE_SECONDS', '90'))
+
+# A duplicate waits for a busy claim for the holder's request budget plus this much, for the
+# upload and result write around it, before leaving the object to a redelivery
+IDEMPOTENCY_WAIT_MARGIN_SECONDS = float(os.environ.get('IDEMPOTENCY_WAIT_MARGIN_SECONDS', '5'))
+
+# Completed claims only need to outlive duplicate deliveries
+IDEMPOTENCY_TTL_SECONDS = int(os.environ.get('IDEMPOTENCY_TTL_SECONDS', str(24 * 3600)))
+
+IN_PROGRESS = "in_progress"
+DONE = "done"
+
+# Outcomes of claim()
+CLAIMED = "claimed"
+DUPLICATE = "duplicate"
+BUSY = "busy"
+
+def _error_code(error):
+    # botocore ClientErrors carry the service error code in their response
+    return getattr(error, 'response', {}).get('Error', {}).get('Code')
+
+def is_enabled():
+    return bool(IDEMPOTENCY_TABLE_NAME)
+
+def object_key(bucket_name, image_key):
+    return f"s3://{bucket_name}/{image_key}"
+
+def claim(key, owner, lease_seconds=None):
+    """Claims `key` for `owner` before doing the work. Returns CLAIMED, DUPLICATE or BUSY.
+
+    DUPLICATE means the work is already done. BUSY means another owner
+    holds an unexpired lease; once that lease expires, the next claim
+    takes over.
+    """
+    lease_seconds = IDEMPOTENCY_LEASE_SECONDS if lease_seconds is None else lease_seconds
+    now = int(time.time())
+    try:
+        get_table(IDEMPOTENCY_TABLE_NAME).put_item(
+            Item={
+                "ClaimKey": key,
+                "Status": IN_PROGRESS,
+                "Owner": owner,
+                "LeaseExpiresAt": now + lease_seconds,
+                "ExpiresAt": now + IDEMPOTENCY_TTL_SECONDS
+            },
+            ConditionExpression=(
+                "attribute_not_exists(ClaimKey) OR "
+                "(#status = :in_progress AND (LeaseExpiresAt < :now OR #owner = :owner))"
+            ),
+            ExpressionAttributeNames={"#status": "Status", "#owner": "Owner"},
+            ExpressionAttributeValues={":in_progress": IN_PROGRESS, ":now": now, ":owner": owner},
+            ReturnValuesOnConditionCheckFailure="ALL_OLD"
+        )
+        return CLAIMED
+    except Exception as e:
+        if _error_code(e) != 'ConditionalCheckFailedException':
+            raise
+        # The failed condition returns the current record, saving a read
+        item = getattr(e, 'response', {}).get('Item') or {}
+        status = item.get("Status", {}).get("S") if item else None
+        if status is None:
+            status = get_status(key)
+        return DUPLICATE if status == DONE else BUSY
+
+def get_status(key):
+    """Returns IN_PROGRESS, DONE, or None when `key` was never claimed (or the claim expired)."""
+    item = get_table(IDEMPOTENCY_TABLE_NAME).get_item(Key={"ClaimKey": key}, ConsistentRead=True).get("Item")
+    if not item or int(item["ExpiresAt"]) <= time.time():
+        return None
+    return item["Status"]
+
+def wait(key, timeout, interval=0.25):
+    """Polls a BUSY key for up to `timeout` seconds until it is done or released. Returns its last status."""
+    deadline = time.monotonic() + timeout
+    while True:
+        status = get_status(key)
+        remaining = deadline - time.monotonic()
+        if status != IN_PROGRESS or remaining <= 0:
+            return status
+        time.sleep(min(interval, remaining))
+        interval = min(interval * 2, 2.0)
+
+def complete(key, owner):
+    """Marks the claim done. A stale owner whose lease was taken over leaves the record alone."""
+    try:
+        get_table(IDEMPOTENCY_TABLE_NAME).update_item(
+            Key={"ClaimKey": key},
+            UpdateExpression="SET #status = :done, CompletedAt = :now REMOVE LeaseExpiresAt",
+            ConditionExpression="#owner = :owner",
+            ExpressionAttributeNames={"#status": "Status", "#owner": "Owner"},
+            ExpressionAttributeValues={":done": DONE, ":owner": owner, ":now": int(time.time())}
+        )
+    except Exception as e:
+        if _error_code(e) != 'ConditionalCheckFailedException':
+            raise
+        logger.warning(f"Claim on {key} was taken over before {owner} completed it")
+
+def settle(key, owner, succeeded):
+    """Completes the claim after successful work, otherwise releases it for a retry."""
+    if succeeded:
+        complete(key, owner)
+    else:
+        release(key, owner)
+
+def release(key, owner):
+    """Gives up an unfinished claim so a retry doesn't have to wait out the lease."""
+    try:
+        get_table(IDEMPOTENCY_TABLE_NAME).delete_item(
+            Key={"ClaimKey": key},
+            ConditionExpression="#owner = :owner AND #status = :in_progress",
+            ExpressionAttributeNames={"#status": "Status", "#owner": "Owner"},
+            ExpressionAttributeValues={":owner": owner, ":in_progress": IN_PROGRESS}
+        )
+    except Exception as e:
+        if _error_code(e) != 'ConditionalCheckFailedException':
+            raise
@@ -0,0 +1,110 @@
+import os
+import json
+import time
+import logging
+
+from utils.aws_clients import get_table
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# Job records are keyed by JobId and expire through the ExpiresAt TTL attribute
+JOBS_TABLE_NAME = os.environ.get('JOBS_TABLE_NAME')
+JOB_TTL_SECONDS = int(os.environ.get('JOB_TTL_SECONDS', str(7 * 24 * 3600)))
+
+# Should match the upload queue's maxReceiveCount: the last attempt marks the job failed
+JOB_MAX_ATTEMPTS = int(os.environ.get('JOB_MAX_ATTEMPTS', '5'))
+
+# Async uploads live under their own prefix so the processor can tell them apart
+JOB_UPLOAD_PREFIX = 'uploads/jobs/'
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+def _error_code(error):
+    # botocore ClientErrors carry the service error code in their response
+    return getattr(error, 'response', {}).get('Error', {}).get('Code')
+
+def is_enabled():
+    return bool(JOBS_TABLE_NAME)
+
+def job_image_key(job_id, extension='.jpg'):
+    return f"{JOB_UPLOAD_PREFIX}{job_id}{extension}"
+
+def job_id_for_key(image_key):
+    """Returns the job ID encoded in an async upload key, or None for other uploads."""
+    if not image_key.startswith(JOB_UPLOAD_PREFIX):
+        return None
+    return image_key[len(JOB_UPLOAD_PREFIX):].rsplit('.', 1)[0] or None
+
+def create_job(job_id, image_key):
+    """Records a queued job. Must happen before the upload that triggers processing."""
+    now = int(time.time())
+    get_table(JOBS_TABLE_NAME).put_item(
+        Item={
+            "JobId": job_id,
+            "Status": QUEUED,
+            "ImageKey": image_key,
+            "Attempts": 0,
+            "CreatedAt": now,
+            "UpdatedAt": now,
+            "ExpiresAt": now + JOB_TTL_SECONDS
+        },
+        ConditionExpression="attribute_not_exists(JobId)"
+    )
+
+def start_job(job_id):
+    """Marks a job running. Returns the attempt number, or None if the job is already done."""
+    try:
+        response = get_table(JOBS_TABLE_NAME).update_item(
+            Key={"JobId": job_id},
+            UpdateExpression="SET #status = :running, UpdatedAt = :now ADD Attempts :one",
+            # Redelivered messages must not move a finished job backwards
+            ConditionExpression="attribute_exists(JobId) AND #status <> :done",
+            ExpressionAttributeNames={"#status": "Status"},
+            ExpressionAttributeValues={":running": RUNNING, ":done": DONE, ":now": int(time.time()), ":one": 1},
+            ReturnValues="UPDATED_NEW"
+        )
+        return int(response["Attributes"]["Attempts"])
+    except Exception as e:
+        if _error_code(e) == 'ConditionalCheckFailedException':
+            logger.info(f"Job {job_id} is already done or does not exist")
+            return None
+        raise
+
+def finish_job(job_id, result):
+    """Stores the verdict and marks the job done."""
+    get_table(JOBS_TABLE_NAME).update_item(
+        Key={"JobId": job_id},
+        UpdateExpression="SET #status = :done, #result = :result, UpdatedAt = :now REMOVE LastError",
+        ExpressionAttributeNames={"#status": "Status", "#result": "Result"},
+        ExpressionAttributeValues={":done": DONE, ":result": json.dumps(result), ":now": int(time.time())}
+    )
+
+def fail_job(job_id, error, attempt):
+    """Records a failed attempt. The job goes back to queued until its last attempt, then fails."""
+    status = FAILED if attempt is not None and attempt >= JOB_MAX_ATTEMPTS else QUEUED
+    get_table(JOBS_TABLE_NAME).update_item(
+        Key={"JobId": job_id},
+        UpdateExpression="SET #status = :status, LastError = :error, UpdatedAt = :now",
+        ExpressionAttributeNames={"#status": "Status"},
+        ExpressionAttributeValues={":status": status, ":error": error, ":now": int(time.time())}
+    )
+    return status
+
+def get_job(job_id):
+    """Returns the job as a plain dict, or None if it does not exist (or has expired)."""
+    item = get_table(JOBS_TABLE_NAME).get_item(Key={"JobId": job_id}, ConsistentRead=True).get("Item")
+    if not item or int(item["ExpiresAt"]) <= time.time():
+        return None
+    return {
+        "job_id": item["JobId"],
+        "status": item["Status"],
+        "attempts": int(item.get("Attempts", 0)),
+        "created_at": int(item["CreatedAt"]),
+        "updated_at": int(item["UpdatedAt"]),
+        "result": json.loads(item["Result"]) if "Result" in item else None,
+        "error": item.get("LastError")
+    }
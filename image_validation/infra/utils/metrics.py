@@ -0,0 +1,175 @@
+import os
+import sys
+import json
+import time
+import threading
+import contextvars
+
+# Per-request timings and sizes, emitted as one CloudWatch Embedded Metric Format line per request
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '0') == '1'
+METRICS_NAMESPACE = os.environ.get('METRICS_NAMESPACE', 'ImageValidation')
+
+_current = contextvars.ContextVar('metrics_recorder', default=None)
+
+_cold_start = True
+_cold_start_lock = threading.Lock()
+
+def _stdout_sink(line):
+    # Lambda forwards stdout to CloudWatch Logs, which extracts the metrics from EMF lines
+    sys.stdout.write(line + "\n")
+    sys.stdout.flush()
+
+_sink = _stdout_sink
+
+class MemorySink:
+    """Collects emitted records in memory instead of writing them out, for tests and benchmarks."""
+
+    def __init__(self):
+        self.records = []
+        self._lock = threading.Lock()
+
+    def __call__(self, line):
+        with self._lock:
+            self.records.append(json.loads(line))
+
+def set_sink(sink):
+    """Routes EMF lines to `sink(line)`; None restores stdout."""
+    global _sink
+    _sink = sink or _stdout_sink
+
+def is_enabled():
+    return METRICS_ENABLED
+
+class Recorder:
+    """Metrics and properties of one request, flushed as a single EMF record."""
+
+    def __init__(self, operation, properties):
+        self.operation = operation
+        self.values = {}
+        self.units = {}
+        self.properties = dict(properties)
+        self._lock = threading.Lock()
+
+    def add(self, name, value, unit):
+        # Repeated measurements of the same stage within a request are summed
+        with self._lock:
+            self.values[name] = self.values.get(name, 0) + value
+            self.units[name] = unit
+
+    def set_property(self, name, value):
+        with self._lock:
+            self.properties[name] = value
+
+    def to_emf(self):
+        with self._lock:
+            values = dict(self.values)
+            units = dict(self.units)
+            properties = dict(self.properties)
+        record = {
+            "_aws": {
+                "Timestamp": int(time.time() * 1000),
+                "CloudWatchMetrics": [{
+                    "Namespace": METRICS_NAMESPACE,
+                    "Dimensions": [["Operation"]],
+                    "Metrics": [{"Name": name, "Unit": units[name]} for name in values]
+                }]
+            },
+            "Operation": self.operation
+        }
+        record.update(properties)
+        record.update({name: round(value, 3) if isinstance(value, float) else value
+                       for name, value in values.items()})
+        return json.dumps(record, default=str)
+
+class _Span:
+    __slots__ = ('recorder', 'name', 'start')
+
+    def __init__(self, recorder, name):
+        self.recorder = recorder
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.recorder.add(f"{self.name}Ms", (time.perf_counter() - self.start) * 1000, "Milliseconds")
+        return False
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+_NOOP = _NoopSpan()
+
+class _Request:
+    __slots__ = ('recorder', 'token')
+
+    def __init__(self, recorder):
+        self.recorder = recorder
+
+    def __enter__(self):
+        self.token = _current.set(self.recorder)
+        return self.recorder
+
+    def __exit__(self, exc_type, exc, tb):
+        _current.reset(self.token)
+        if exc_type is not None:
+            self.recorder.set_property("Error", exc_type.__name__)
+        try:
+            _sink(self.recorder.to_emf())
+        except Exception:
+            pass  # Metrics must never fail a request
+        return False
+
+def request(operation, **properties):
+    """Scopes a request: spans inside it are emitted as one EMF record when it ends.
+
+        with metrics.request("POST /classify", RequestId=context.aws_request_id):
+            with metrics.span("S3Put"):
+                ...
+    """
+    if not METRICS_ENABLED:
+        return _NOOP
+
+    global _cold_start
+    with _cold_start_lock:
+        cold, _cold_start = _cold_start, False
+    recorder = Recorder(operation, properties)
+    recorder.add("ColdStart", 1 if cold else 0, "Count")
+    return _Request(recorder)
+
+def span(name):
+    """Times a stage of the current request as `<name>Ms`. A shared no-op when there is none."""
+    recorder = _current.get()
+    if recorder is None:
+        return _NOOP
+    return _Span(recorder, name)
+
+def add_value(name, value, unit="Count"):
+    """Adds a metric value (e.g. a payload size in "Bytes") to the current request."""
+    recorder = _current.get()
+    if recorder is not None:
+        recorder.add(name, value, unit)
+
+def set_property(name, value):
+    """Attaches a searchable, non-metric field (e.g. a backend outcome) to the current request."""
+    recorder = _current.get()
+    if recorder is not None:
+        recorder.set_property(name, value)
+
+def propagate(fn):
+    """Wraps `fn` to run in the caller's metrics context, for work handed to another thread."""
+    if _current.get() is None:
+        return fn
+    # A copied context can only be entered by one thread at a time, so each call gets its own
+    context = contextvars.copy_context()
+
+    def run(*args, **kwargs):
+        return context.run(fn, *args, **kwargs)
+    return run
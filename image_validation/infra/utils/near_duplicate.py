@@ -0,0 +1,347 @@
+import io
+import os
+import sys
+import gzip
+import time
+import uuid
+import struct
+import logging
+import threading
+from array import array
+from itertools import combinations
+
+from utils.aws_clients import get_client
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow is optional; without it the near-duplicate stage is skipped
+    Image = None
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# Frames whose dHash differs by at most this many bits reuse the stored verdict (negative disables)
+PHASH_MAX_DISTANCE = int(os.environ.get('PHASH_MAX_DISTANCE', '4'))
+# Dedicated bucket for the index; never the uploads bucket, whose notifications and lifecycle rules would apply
+PHASH_INDEX_BUCKET = os.environ.get('PHASH_INDEX_BUCKET', '')
+PHASH_INDEX_KEY = os.environ.get('PHASH_INDEX_KEY', 'index/phash-index.bin.gz')
+# Each container writes its new entries as a small delta object under this prefix
+PHASH_DELTA_PREFIX = os.environ.get('PHASH_DELTA_PREFIX', 'index/phash-deltas/')
+PHASH_PERSIST_EVERY = int(os.environ.get('PHASH_PERSIST_EVERY', '50'))
+# ...or once the oldest unpersisted entry is this old, so a quiet container doesn't sit on them
+PHASH_PERSIST_MAX_AGE_SECONDS = float(os.environ.get('PHASH_PERSIST_MAX_AGE_SECONDS', '300'))
+# A loading container folds the deltas into the snapshot once there are this many
+PHASH_COMPACT_DELTAS = int(os.environ.get('PHASH_COMPACT_DELTAS', '20'))
+# How long a request waits for a cold container's index before treating it as empty
+PHASH_LOAD_WAIT_SECONDS = float(os.environ.get('PHASH_LOAD_WAIT_SECONDS', '0.1'))
+# Longest a handler off the latency path waits at the end of an invocation for a load to finish
+PHASH_LOAD_TIMEOUT_SECONDS = float(os.environ.get('PHASH_LOAD_TIMEOUT_SECONDS', '10'))
+# A failed load is retried by a later request after this long
+PHASH_LOAD_RETRY_SECONDS = float(os.environ.get('PHASH_LOAD_RETRY_SECONDS', '60'))
+# Substrings per hash for a new index; ~64 / log2(expected entries), e.g. 3 for millions
+PHASH_INDEX_CHUNKS = int(os.environ.get('PHASH_INDEX_CHUNKS', '3'))
+
+if Image is None and PHASH_MAX_DISTANCE >= 0:
+    logger.error("Near-duplicate reuse is enabled but Pillow is not installed; every frame runs inference")
+
+_MAGIC = b'PHIX1'
+
+def _popcount(value):
+    return bin(value).count('1')
+
+def dhash(data, hash_size=8):
+    """Returns the 64-bit difference hash of encoded image bytes.
+
+    JPEGs are decoded with draft mode, which lets libjpeg scale down in the
+    DCT domain instead of decoding the full-resolution frame.
+    """
+    with Image.open(io.BytesIO(data)) as img:
+        img.draft('L', (hash_size * 8, hash_size * 8))
+        small = img.convert('L').resize((hash_size + 1, hash_size), Image.BILINEAR)
+    pixels = list(small.getdata())
+
+    value = 0
+    for row in range(hash_size):
+        offset = row * (hash_size + 1)
+        for col in range(hash_size):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return value
+
+class MultiIndexHash:
+    """Hamming-distance index over 64-bit hashes using multi-index hashing.
+
+    Each hash is split into `chunks` substrings and indexed in one table per
+    substring. By the pigeonhole principle, any hash within distance `d` of
+    the query matches it in at least one substring within `d // chunks`
+    bits, so only those buckets are probed and the candidates verified.
+    Substrings of roughly log2(entries) bits keep buckets near-empty, so
+    fewer, wider chunks suit larger indexes.
+    """
+
+    def __init__(self, chunks=3, bits=64):
+        self.chunks = chunks
+        self.bits = bits
+        # Spread the bits as evenly as possible; substrings need not be equal width
+        self._widths = [bits // chunks + (1 if i < bits % chunks else 0) for i in range(chunks)]
+        self._offsets = [sum(self._widths[:i]) for i in range(chunks)]
+        self.hashes = array('Q')
+        self.values = []
+        self._tables = [{} for _ in range(chunks)]
+
+    def __len__(self):
+        return len(self.hashes)
+
+    def _split(self, value):
+        return [(value >> offset) & ((1 << width) - 1) for offset, width in zip(self._offsets, self._widths)]
+
+    def _probes(self, chunk, width, radius):
+        yield chunk
+        for r in range(1, radius + 1):
+            for positions in combinations(range(width), r):
+                flipped = chunk
+                for position in positions:
+                    flipped ^= 1 << position
+                yield flipped
+
+    def insert(self, value, payload):
+        """Adds `value` with its payload; an exact duplicate replaces the stored payload."""
+        chunks = self._split(value)
+
+        # An exact duplicate must share every substring, so scanning one bucket is enough
+        for position in self._tables[0].get(chunks[0], ()):
+            if self.hashes[position] == value:
+                self.values[position] = payload
+                return
+
+        self._append(value, chunks, payload)
+
+    def _append(self, value, chunks, payload):
+        position = len(self.hashes)
+        self.hashes.append(value)
+        self.values.append(payload)
+        for table, chunk in zip(self._tables, chunks):
+            bucket = table.get(chunk)
+            if bucket is None:
+                bucket = table[chunk] = array('I')
+            bucket.append(position)
+
+    def search(self, value, max_distance):
+        """Returns `(payload, distance, position)` of the closest entry within `max_distance`, or None."""
+        radius = max_distance // self.chunks
+        best = None
+        seen = set()
+        for table, chunk, width in zip(self._tables, self._split(value), self._widths):
+            for probe in self._probes(chunk, width, radius):
+                for position in table.get(probe, ()):
+                    if position in seen:
+                        continue
+                    seen.add(position)
+                    distance = _popcount(self.hashes[position] ^ value)
+                    if distance <= max_distance and (best is None or distance < best[1]):
+                        best = (position, distance)
+                        if distance == 0:
+                            return self.values[position], 0, position
+        if best is None:
+            return None
+        return self.values[best[0]], best[1], best[0]
+
+    def save(self, fp):
+        """Writes the index as a compact binary snapshot; the substring tables are rebuilt on load."""
+        hashes = array('Q', self.hashes)
+        if sys.byteorder != 'little':
+            hashes.byteswap()
+        fp.write(_MAGIC)
+        fp.write(struct.pack('<HI', self.chunks, len(hashes)))
+        fp.write(hashes.tobytes())
+        fp.write('\n'.join(self.values).encode('utf-8'))
+
+    @classmethod
+    def load(cls, fp):
+        if fp.read(len(_MAGIC)) != _MAGIC:
+            raise ValueError("Not a perceptual-hash index snapshot")
+        chunks, count = struct.unpack('<HI', fp.read(6))
+        hashes = array('Q')
+        hashes.frombytes(fp.read(count * 8))
+        if sys.byteorder != 'little':
+            hashes.byteswap()
+        values = fp.read().decode('utf-8').split('\n') if count else []
+
+        # A saved index holds no exact duplicates, so the duplicate check is skipped
+        index = cls(chunks=chunks)
+        for value, payload in zip(hashes, values):
+            index._append(value, index._split(value), payload)
+        return index
+
+# --------------------------------------
+# Shared index backed by an S3 snapshot
+# --------------------------------------
+# Entries map a frame's dHash to the content hash of the image whose verdict
+# it reuses; the verdict itself stays in the classification cache.
+_index = None
+_pending = []
+_pending_since = None
+# Entries remembered while the snapshot is still loading, merged into it once loaded
+_early = []
+_lock = threading.Lock()
+_loaded = threading.Event()
+_load_started = False
+_load_failed_at = None
+
+def is_enabled():
+    if Image is None or PHASH_MAX_DISTANCE < 0:
+        return False
+    if not PHASH_INDEX_BUCKET:
+        raise RuntimeError("PHASH_INDEX_BUCKET is not set; set it or PHASH_MAX_DISTANCE=-1 to disable near-duplicate reuse")
+    return True
+
+def _read_index(s3, key):
+    obj = s3.get_object(Bucket=PHASH_INDEX_BUCKET, Key=key)
+    with gzip.GzipFile(fileobj=io.BytesIO(obj['Body'].read())) as fp:
+        return MultiIndexHash.load(fp)
+
+def _write_index(s3, key, index):
+    buffer = io.BytesIO()
+    with gzip.GzipFile(fileobj=buffer, mode='wb', mtime=0) as fp:
+        index.save(fp)
+    s3.put_object(Bucket=PHASH_INDEX_BUCKET, Key=key, Body=buffer.getvalue())
+
+def _list_deltas(s3):
+    keys = []
+    for page in s3.get_paginator('list_objects_v2').paginate(Bucket=PHASH_INDEX_BUCKET, Prefix=PHASH_DELTA_PREFIX):
+        keys.extend(obj['Key'] for obj in page.get('Contents', []))
+    return keys
+
+def _read_snapshot():
+    """Reads the snapshot plus every delta, compacting them into a new snapshot once there are enough.
+
+    Containers compact independently, so a concurrent compaction can drop
+    another container's newest delta. That only costs a later inference,
+    never a wrong verdict.
+    """
+    s3 = get_client('s3')
+    try:
+        index = _read_index(s3, PHASH_INDEX_KEY)
+    except s3.exceptions.NoSuchKey:
+        index = MultiIndexHash(chunks=PHASH_INDEX_CHUNKS)
+
+    deltas = _list_deltas(s3)
+    for key in deltas:
+        try:
+            delta = _read_index(s3, key)
+        except s3.exceptions.NoSuchKey:
+            continue  # Compacted by another container since the listing
+        for value, payload in zip(delta.hashes, delta.values):
+            index.insert(value, payload)
+
+    if len(deltas) >= PHASH_COMPACT_DELTAS:
+        _write_index(s3, PHASH_INDEX_KEY, index)
+        for start in range(0, len(deltas), 1000):
+            s3.delete_objects(Bucket=PHASH_INDEX_BUCKET, Delete={
+                'Objects': [{'Key': key} for key in deltas[start:start + 1000]], 'Quiet': True
+            })
+        logger.info(f"Compacted {len(deltas)} perceptual-hash index deltas")
+    return index
+
+def _load():
+    """Loads the index in the background.
+
+    Lambda freezes the container between invocations, so this thread may
+    stall mid-read and resume on a later request. A read that fails that way
+    (or any other) leaves the index unloaded and a later request retries it,
+    rather than installing an empty index for the container's lifetime.
+    """
+    global _index, _load_started, _load_failed_at
+    try:
+        index = _read_snapshot()
+        logger.info(f"Loaded perceptual-hash index with {len(index)} entries")
+    except Exception as e:
+        logger.error(f"Error loading perceptual-hash index: {str(e)}")
+        with _lock:
+            _load_started = False
+            _load_failed_at = time.monotonic()
+        return
+    with _lock:
+        for phash, payload in _early:
+            index.insert(phash, payload)
+        _early.clear()
+        _index = index
+    _loaded.set()
+
+def _get_index(wait=PHASH_LOAD_WAIT_SECONDS):
+    """Returns the index, or None while a cold container is still loading it in the background."""
+    global _load_started
+    if not _loaded.is_set():
+        with _lock:
+            start = not _load_started and (
+                _load_failed_at is None or time.monotonic() - _load_failed_at >= PHASH_LOAD_RETRY_SECONDS)
+            _load_started = _load_started or start
+        if start:
+            threading.Thread(target=_load, daemon=True).start()
+        _loaded.wait(wait)
+    return _index
+
+def find_near_duplicate(phash):
+    """Returns `(content_hash, distance)` of the closest stored frame within PHASH_MAX_DISTANCE, or None."""
+    index = _get_index()
+    if index is None:
+        return None
+    with _lock:
+        match = index.search(phash, PHASH_MAX_DISTANCE)
+    if match is None:
+        return None
+    return match[0], match[1]
+
+def remember(phash, image_hash):
+    """Indexes a frame by the content hash of its verdict; `flush()` persists the new entries."""
+    global _pending_since
+    index = _get_index(wait=0)
+    with _lock:
+        if index is not None:
+            index.insert(phash, image_hash)
+        else:
+            _early.append((phash, image_hash))
+        if not _pending:
+            _pending_since = time.monotonic()
+        _pending.append((phash, image_hash))
+
+def flush(wait_for_load=False):
+    """Persists new entries once enough have accumulated; call at the end of every invocation.
+
+    Nothing is written from a background thread, since Lambda freezes the
+    container as soon as the handler returns. With `wait_for_load`, a
+    handler off the latency path also lets a cold-start load finish within
+    the invocation instead of stalling until the next one.
+    """
+    if wait_for_load and _load_started:
+        _loaded.wait(PHASH_LOAD_TIMEOUT_SECONDS)
+    with _lock:
+        due = bool(_pending) and (len(_pending) >= PHASH_PERSIST_EVERY
+                                  or time.monotonic() - _pending_since >= PHASH_PERSIST_MAX_AGE_SECONDS)
+    if due:
+        persist()
+
+def persist():
+    """Writes the entries added since the last persist as a new delta object.
+
+    The write is proportional to the new entries, not the index, and never
+    races other containers; loading containers merge and compact the deltas.
+    """
+    global _pending_since
+    with _lock:
+        if not _pending:
+            return
+        pending = list(_pending)
+        since = _pending_since
+        _pending.clear()
+
+    try:
+        delta = MultiIndexHash(chunks=PHASH_INDEX_CHUNKS)
+        for phash, payload in pending:
+            delta.insert(phash, payload)
+        _write_index(get_client('s3'), f"{PHASH_DELTA_PREFIX}{uuid.uuid4().hex}.bin.gz", delta)
+        logger.info(f"Persisted {len(delta)} perceptual-hash index entries")
+    except Exception as e:
+        logger.error(f"Error persisting perceptual-hash index: {str(e)}")
+        with _lock:
+            _pending[:0] = pending
+            _pending_since = since
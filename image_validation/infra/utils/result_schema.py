@@ -0,0 +1,155 @@
+import os
+import time
+from decimal import Decimal
+from datetime import datetime, timezone
+
+# Stored layout of classification results. Attribute names are short because
+# DynamoDB bills every item by its names as well as its values, and each
+# result is written once and read by key and by two indexes:
+#
+#   ImageKey  S    image ID (the S3 key); the table's hash key
+#   v         N    schema version
+#   ts        N    time stored, epoch milliseconds; sort key of both indexes
+#   exp       N    expiry, epoch seconds; the table's TTL attribute
+#   hd        S    "<1|0>#<YYYY-MM-DD>": is_human and UTC day; HumanDay index hash key
+#   ag        S    "<1|0>#<YYYY-MM-DD>": whether the backends agreed and UTC day,
+#                  absent when fewer than two answered; AgreementTime index hash
+#                  key (sparse), sharded by day like hd so no partition is hot
+#   c         N    confidence
+#   ch        B    SHA-256 content hash
+#   b         M    backend name -> [label code] or [label code, score]
+#   to        L    backends that timed out, absent when none
+#   x         M    any other result fields, verbatim
+#
+# Items written before versioning have no "v" and use the full field names.
+# Version 2 items store ag as a bare "1"/"0", without the day, so the
+# AgreementTime index's day partitions never return them.
+SCHEMA_VERSION = 3
+KEY_ATTRIBUTE = 'ImageKey'
+
+# Raw results expire after this many days; 0 keeps them forever
+RESULT_TTL_DAYS = float(os.environ.get('RESULT_TTL_DAYS', '90'))
+
+# Scores are stored to 4 decimal places, well below any threshold's resolution
+SCORE_DIGITS = 4
+
+# Every inference backend a stored result can name; classifier.BACKENDS uses the same keys.
+# Kept here so readers of results, like the exporter, don't import the backends.
+BACKEND_NAMES = ("onnx", "rekognition", "sagemaker")
+
+LABEL_CODES = {"human": "h", "not_human": "n", "error": "e", "timeout": "t", "unavailable": "u"}
+LABELS = {code: label for label, code in LABEL_CODES.items()}
+
+# Fields the encoding accounts for; anything else is kept under "x"
+_ENCODED_FIELDS = {"image_id", "timestamp", "is_human", "agreement", "confidence", "content_hash",
+                   "timed_out", "unavailable", "backends_run"}
+
+def to_dynamodb(value):
+    """Converts floats (rejected by the DynamoDB resource API) to Decimal, recursively."""
+    if isinstance(value, float):
+        return Decimal(str(value))
+    if isinstance(value, dict):
+        return {k: to_dynamodb(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [to_dynamodb(v) for v in value]
+    return value
+
+def from_dynamodb(value):
+    """Converts the resource API's Decimals back to int/float, recursively."""
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    if isinstance(value, dict):
+        return {k: from_dynamodb(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [from_dynamodb(v) for v in value]
+    return value
+
+def day(stored_ms):
+    """UTC day ("YYYY-MM-DD") of an epoch-milliseconds timestamp, as used in the HumanDay index."""
+    return datetime.fromtimestamp(stored_ms / 1000, timezone.utc).strftime('%Y-%m-%d')
+
+def human_day(is_human, day_string):
+    return f"{int(bool(is_human))}#{day_string}"
+
+def agreement_day(agreement, day_string):
+    return f"{int(bool(agreement))}#{day_string}"
+
+def isoformat(stored_ms):
+    """The result's "timestamp" field: naive UTC ISO 8601 with milliseconds."""
+    return datetime.fromtimestamp(stored_ms / 1000, timezone.utc).replace(tzinfo=None).isoformat(timespec='milliseconds')
+
+def _backend_names(result):
+    return sorted(field[:-len("_result")] for field in result if field.endswith("_result"))
+
+def encode(result, stored_at=None):
+    """Converts a result dict into a DynamoDB item of the current schema version."""
+    stored_ms = int(round((time.time() if stored_at is None else stored_at) * 1000))
+    item = {
+        KEY_ATTRIBUTE: result["image_id"],
+        "v": SCHEMA_VERSION,
+        "ts": stored_ms,
+        "hd": human_day(result["is_human"], day(stored_ms)),
+        "c": to_dynamodb(result["confidence"])
+    }
+    if RESULT_TTL_DAYS > 0:
+        item["exp"] = int(stored_ms / 1000 + RESULT_TTL_DAYS * 86400)
+    if result.get("agreement") is not None:
+        item["ag"] = agreement_day(result["agreement"], day(stored_ms))
+    if result.get("content_hash"):
+        item["ch"] = bytes.fromhex(result["content_hash"])
+
+    backends = {}
+    for name in _backend_names(result):
+        label = result[f"{name}_result"]
+        if label is None:  # Skipped, e.g. by the cascade
+            continue
+        entry = [LABEL_CODES.get(label, label)]
+        score = result.get(f"{name}_score")
+        if isinstance(score, (int, float)):
+            entry.append(to_dynamodb(round(score, SCORE_DIGITS)))
+        backends[name] = entry
+    item["b"] = backends
+    if result.get("timed_out"):
+        item["to"] = list(result["timed_out"])
+
+    extra = {
+        field: value for field, value in result.items()
+        if field not in _ENCODED_FIELDS and not field.endswith(("_result", "_score"))
+    }
+    if extra:
+        item["x"] = to_dynamodb(extra)
+    return item
+
+def _agreement(value, version):
+    if value is None:
+        return None
+    return (value if version == 2 else value.split('#')[0]) == "1"
+
+def decode(item):
+    """Converts a stored item of any schema version back into a result dict."""
+    version = int(item.get("v", 1))
+    if version == 1:
+        return from_dynamodb(item)
+    if version not in (2, SCHEMA_VERSION):
+        raise ValueError(f"Unsupported result schema version {version}")
+
+    result = {"image_id": item[KEY_ATTRIBUTE]}
+    backends = item.get("b", {})
+    for name in sorted(backends):
+        entry = backends[name]
+        result[f"{name}_result"] = LABELS.get(entry[0], entry[0])
+        result[f"{name}_score"] = from_dynamodb(entry[1]) if len(entry) > 1 else None
+
+    content_hash = item.get("ch")
+    result.update({
+        "content_hash": bytes(getattr(content_hash, 'value', content_hash)).hex() if content_hash else None,
+        "agreement": _agreement(item.get("ag"), version),
+        "confidence": from_dynamodb(item["c"]),
+        "is_human": item["hd"].startswith("1#"),
+        "timed_out": list(item.get("to", [])),
+        "unavailable": sorted(name for name, entry in backends.items() if entry[0] == LABEL_CODES["unavailable"]),
+        "backends_run": sorted(backends),
+        "timestamp": isoformat(int(item["ts"]))
+    })
+    result.update(from_dynamodb(item.get("x", {})))
+    return result
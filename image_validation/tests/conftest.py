@@ -0,0 +1,80 @@
+"""Shared fixtures: the Lambda modules on the path, and AWS mocked with moto.
+
+Run from image_validation/: pip install -r tests/requirements.txt && python -m pytest tests
+"""
+import os
+import sys
+
+# Settings read at import time; writes are buffered and only flushed by the tests
+os.environ.update({
+    'AWS_DEFAULT_REGION': 'us-east-1',
+    'AWS_ACCESS_KEY_ID': 'testing',
+    'AWS_SECRET_ACCESS_KEY': 'testing',
+    'TABLE_NAME': 'results',
+    'BUCKET_NAME': 'images-test',
+    'PHASH_INDEX_BUCKET': 'index-test',
+    'RESULT_WRITE_MODE': 'buffered',
+    'RESULT_FLUSH_AGE_SECONDS': '60',
+    'RESULT_MAX_RETRIES': '1'
+})
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'infra'))
+
+import pytest
+from moto import mock_aws
+
+from utils import aws_clients
+
+def _reset_clients():
+    # Clients are cached per container; each test gets fresh ones bound to its mock
+    aws_clients._session = None
+    aws_clients._clients.clear()
+    aws_clients._resources.clear()
+    aws_clients._tables.clear()
+
+def _create_results_table():
+    aws_clients.get_client('dynamodb').create_table(
+        TableName='results',
+        BillingMode='PAY_PER_REQUEST',
+        AttributeDefinitions=[
+            {'AttributeName': name, 'AttributeType': kind}
+            for name, kind in [('ImageKey', 'S'), ('ag', 'S'), ('hd', 'S'), ('ts', 'N')]
+        ],
+        KeySchema=[{'AttributeName': 'ImageKey', 'KeyType': 'HASH'}],
+        GlobalSecondaryIndexes=[
+            {
+                'IndexName': index,
+                'KeySchema': [{'AttributeName': hash_key, 'KeyType': 'HASH'},
+                              {'AttributeName': 'ts', 'KeyType': 'RANGE'}],
+                'Projection': {'ProjectionType': 'ALL'}
+            }
+            for index, hash_key in [('AgreementTime', 'ag'), ('HumanDay', 'hd')]
+        ]
+    )
+
+def _create_claims_table(name):
+    aws_clients.get_client('dynamodb').create_table(
+        TableName=name,
+        BillingMode='PAY_PER_REQUEST',
+        AttributeDefinitions=[{'AttributeName': 'ClaimKey', 'AttributeType': 'S'}],
+        KeySchema=[{'AttributeName': 'ClaimKey', 'KeyType': 'HASH'}]
+    )
+
+@pytest.fixture
+def aws():
+    with mock_aws():
+        _reset_clients()
+        yield
+    _reset_clients()
+
+@pytest.fixture
+def results_table(aws):
+    _create_results_table()
+    return aws_clients.get_table('results')
+
+@pytest.fixture
+def claims_table(aws, monkeypatch):
+    from utils import idempotency
+
+    _create_claims_table('claims')
+    monkeypatch.setattr(idempotency, 'IDEMPOTENCY_TABLE_NAME', 'claims')
+    return aws_clients.get_table('claims')
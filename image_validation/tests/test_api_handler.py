@@ -0,0 +1,67 @@
+import io
+import json
+import base64
+from types import SimpleNamespace
+
+import pytest
+from PIL import Image
+
+import api_handler
+from utils import idempotency, jobs
+
+def png(size=64):
+    buffer = io.BytesIO()
+    Image.new('RGB', (size, size)).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+def classify_event(query=None, headers=None):
+    return {
+        "httpMethod": "POST",
+        "resource": "/classify",
+        "headers": dict({"Content-Type": "image/png"}, **(headers or {})),
+        "queryStringParameters": query,
+        "body": base64.b64encode(png()).decode(),
+        "isBase64Encoded": True
+    }
+
+@pytest.fixture
+def no_jobs(monkeypatch):
+    monkeypatch.setattr(jobs, 'JOBS_TABLE_NAME', None)
+    assert not jobs.is_enabled()
+
+def test_explicit_async_without_jobs_is_a_client_error(no_jobs):
+    response = api_handler.lambda_handler(classify_event({"mode": "async"}), SimpleNamespace(aws_request_id="r1"))
+
+    assert response["statusCode"] == 400
+    assert "not enabled" in json.loads(response["body"])["error"]
+
+@pytest.mark.parametrize("event", [
+    classify_event(headers={"Prefer": "respond-async"}),
+    classify_event({"mode": "sync"})
+])
+def test_async_preferences_without_jobs_are_served_synchronously(no_jobs, monkeypatch, event):
+    monkeypatch.setattr(api_handler, 'CLASSIFY_MODE', 'async')
+    headers = {k.lower(): v for k, v in event["headers"].items()}
+
+    assert api_handler._wants_async(event, headers) is False
+
+def test_async_is_honoured_with_jobs(monkeypatch):
+    monkeypatch.setattr(jobs, 'JOBS_TABLE_NAME', 'jobs')
+
+    assert api_handler._wants_async(classify_event(), {"prefer": "respond-async"}) is True
+
+@pytest.mark.parametrize("settled, status, body", [
+    (True, 200, "duplicate"),
+    (False, 409, "busy")
+])
+def test_sync_upload_already_claimed_is_not_classified_again(no_jobs, claims_table, monkeypatch, settled, status, body):
+    monkeypatch.setattr(api_handler, 'classify_and_store_result', lambda *args, **kwargs: pytest.fail("classified"))
+    key = idempotency.object_key(api_handler.BUCKET_NAME, "uploads/r2.png")
+    idempotency.claim(key, "other")
+    if settled:
+        idempotency.complete(key, "other")
+
+    response = api_handler.lambda_handler(classify_event(), SimpleNamespace(aws_request_id="r2"))
+
+    assert response["statusCode"] == status
+    assert json.loads(response["body"]) == {"image_id": "uploads/r2.png", "status": body}
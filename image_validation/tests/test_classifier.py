@@ -0,0 +1,53 @@
+import pytest
+
+import classifier
+from fanout import ERROR
+from resilience import UNAVAILABLE
+from utils.result_schema import BACKEND_NAMES
+
+@pytest.fixture
+def backends(monkeypatch):
+    scores = {"sagemaker": 0.9, "rekognition": 0.8, "onnx": 0.75}
+    monkeypatch.setattr(classifier, '_resilient_backends',
+                        {name: (lambda payload, name=name: scores[name]) for name in scores})
+    monkeypatch.setattr(classifier, 'ENABLED_BACKENDS', ["sagemaker", "rekognition"])
+    monkeypatch.setattr(classifier, 'INFERENCE_POLICY', 'fanout')
+    monkeypatch.setattr(classifier, 'FALLBACK_BACKEND', 'onnx')
+    return scores
+
+def test_fallback_is_not_run_when_the_backends_answer(backends):
+    verdict = classifier.run_inference(None)
+
+    assert verdict["backends_run"] == ["rekognition", "sagemaker"]
+    assert "fallback" not in verdict
+    assert classifier.is_complete(verdict)
+
+@pytest.mark.parametrize("failure", [UNAVAILABLE, ERROR])
+def test_fallback_answers_when_a_remote_backend_fails(backends, failure):
+    backends["sagemaker"] = failure
+    verdict = classifier.run_inference(None)
+
+    assert verdict["fallback"] == "onnx"
+    assert verdict["onnx_result"] == "human"
+    assert verdict["is_human"] is True
+    # Stored and acknowledged, but not cached as a full verdict
+    assert classifier.is_settled(verdict)
+    assert not classifier.is_complete(verdict)
+
+def test_failed_fallback_leaves_the_verdict_unsettled(backends):
+    backends["sagemaker"] = UNAVAILABLE
+    backends["rekognition"] = UNAVAILABLE
+    backends["onnx"] = ERROR
+    verdict = classifier.run_inference(None)
+
+    assert "fallback" not in verdict
+    assert not classifier.is_settled(verdict)
+
+def test_no_fallback_when_disabled(backends, monkeypatch):
+    monkeypatch.setattr(classifier, 'FALLBACK_BACKEND', '')
+    backends["sagemaker"] = UNAVAILABLE
+
+    assert classifier.run_inference(None)["onnx_result"] is None
+
+def test_backend_names_match_the_stored_result_schema():
+    assert sorted(classifier.BACKENDS) == list(BACKEND_NAMES)
@@ -0,0 +1,94 @@
+import os
+import sys
+import json
+import threading
+import subprocess
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+CLIENT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'client')
+sys.path.insert(0, CLIENT_DIR)
+
+import cli
+from stub_server import StubHandler
+
+@pytest.fixture
+def stub(monkeypatch):
+    """The stub API on a free local port, answering without added latency."""
+    monkeypatch.setattr(StubHandler, 'latency', 0.0)
+    monkeypatch.setattr(StubHandler, 'jitter', 0.0)
+    monkeypatch.setattr(StubHandler, 'error_rate', 0.0)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+@pytest.fixture
+def images(tmp_path):
+    root = tmp_path / "images"
+    (root / "nested").mkdir(parents=True)
+    for position in range(30):
+        folder = root / "nested" if position % 3 == 0 else root
+        (folder / f"{position:03d}.jpg").write_bytes(b"\xff\xd8\xff\xe0" + bytes([position]) * 64)
+    (root / "notes.txt").write_text("not an image")
+    return root
+
+def checkpoint_entries(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f]
+
+def test_bulk_upload_sends_every_image_once(stub, images, tmp_path):
+    checkpoint = tmp_path / "progress.jsonl"
+    summary = cli.bulk_upload(stub, str(images), workers=8, retries=2, checkpoint_path=str(checkpoint),
+                              report_every=60)
+
+    assert summary["succeeded"] == 30
+    assert summary["failed"] == 0
+    assert summary["p50_ms"] <= summary["p95_ms"] <= summary["p99_ms"]
+    entries = checkpoint_entries(checkpoint)
+    assert len({entry["path"] for entry in entries}) == 30
+    assert all(entry["ok"] and entry["image_id"].startswith("uploads/") for entry in entries)
+
+def test_rerun_resumes_from_the_checkpoint(stub, images, tmp_path):
+    checkpoint = tmp_path / "progress.jsonl"
+    done = sorted(cli.iter_images(str(images)))[:12]
+    with open(checkpoint, "w") as f:
+        for path in done:
+            f.write(json.dumps({"path": path, "ok": True}) + "\n")
+        f.write('{"path": "trunc')  # A run killed mid-write
+
+    summary = cli.bulk_upload(stub, str(images), workers=4, retries=0, checkpoint_path=str(checkpoint),
+                              report_every=60)
+
+    assert summary["skipped"] == 12
+    assert summary["succeeded"] == 18
+
+def test_transient_errors_are_retried(stub, images, tmp_path, monkeypatch):
+    monkeypatch.setattr(StubHandler, 'error_rate', 0.5)
+    summary = cli.bulk_upload(stub, str(images), workers=8, retries=30,
+                              checkpoint_path=str(tmp_path / "progress.jsonl"), report_every=60)
+
+    assert summary["succeeded"] == 30
+    assert summary["retries"] > 0
+
+def test_manifest_paths_are_relative_to_the_manifest(images, tmp_path):
+    manifest = images / "manifest.txt"
+    manifest.write_text("# backfill\n001.jpg\n\nnested/000.jpg\n")
+
+    assert list(cli.iter_images(str(manifest))) == [str(images / "001.jpg"), str(images / "nested/000.jpg")]
+
+def test_command_line_bulk_mode(stub, images, tmp_path):
+    checkpoint = tmp_path / "progress.jsonl"
+    completed = subprocess.run(
+        [sys.executable, os.path.join(CLIENT_DIR, "cli.py"), "--base-url", stub, "--bulk", str(images),
+         "--workers", "4", "--checkpoint", str(checkpoint)],
+        capture_output=True, text=True, timeout=60
+    )
+
+    assert completed.returncode == 0, completed.stderr
+    summary = json.loads(completed.stdout.strip().splitlines()[-1])
+    assert summary["succeeded"] == 30
+    assert len(checkpoint_entries(checkpoint)) == 30
@@ -0,0 +1,80 @@
+import time
+from datetime import datetime, timedelta
+
+from utils import dynamodb_utils, result_schema
+from utils.dynamodb_utils import ResultWriter
+
+def item(key):
+    return {"ImageKey": key, "v": 3, "ts": 1, "hd": "1#2024-06-01", "c": 1, "b": {}}
+
+def failing_writer(**kwargs):
+    writer = ResultWriter('results', 'ImageKey', flush_age=60, **kwargs)
+    writer._write_batch = lambda items: [entry["ImageKey"] for entry in items]
+    return writer
+
+def test_flush_writes_buffered_items(results_table):
+    writer = ResultWriter('results', 'ImageKey', flush_age=60)
+    for key in ("a", "b", "c"):
+        writer.add(item(key))
+
+    assert writer.flush() == []
+    assert results_table.scan()["Count"] == 3
+
+def test_flush_reports_items_that_could_not_be_written(aws):
+    # No table: every attempt fails
+    writer = ResultWriter('missing', 'ImageKey', flush_age=60, max_retries=0)
+    writer.add(item("a"))
+
+    assert writer.flush() == ["a"]
+    assert writer.flush() == []
+
+def test_size_triggered_flush_failures_are_reported_by_the_next_flush():
+    writer = failing_writer(flush_size=2)
+    for key in ("a", "b", "c"):
+        writer.add(item(key))
+
+    assert sorted(writer.flush()) == ["a", "b", "c"]
+    assert writer.flush() == []
+
+def test_age_triggered_flush_failures_are_reported_by_the_next_flush():
+    writer = failing_writer()
+    writer.flush_age = 0.05
+    writer.add(item("a"))
+
+    deadline = time.monotonic() + 2
+    while writer._buffer and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert writer.flush() == ["a"]
+
+def test_duplicate_keys_in_a_batch_keep_the_latest(results_table):
+    writer = ResultWriter('results', 'ImageKey', flush_age=60)
+    writer.add(dict(item("a"), c=1))
+    writer.add(dict(item("a"), c=2))
+
+    assert writer.flush() == []
+    assert results_table.get_item(Key={"ImageKey": "a"})["Item"]["c"] == 2
+
+def store(table, image_id, agreement, is_human, days_ago):
+    result = {"image_id": image_id, "content_hash": None, "confidence": 0.5, "agreement": agreement,
+              "is_human": is_human, "timed_out": []}
+    table.put_item(Item=result_schema.encode(result, stored_at=time.time() - days_ago * 86400))
+
+def test_agreement_query_pages_across_day_partitions(results_table):
+    for day in range(6):
+        store(results_table, f"uploads/{day}.jpg", agreement=day % 2 == 0, is_human=True, days_ago=day)
+
+    results, cursor = dynamodb_utils.query_by_agreement(True, limit=2)
+    assert [r["image_id"] for r in results] == ["uploads/0.jpg", "uploads/2.jpg"]
+    assert all(r["agreement"] is True for r in results)
+
+    results, cursor = dynamodb_utils.query_by_agreement(True, limit=2, cursor=cursor)
+    assert [r["image_id"] for r in results] == ["uploads/4.jpg"]
+    assert cursor is None
+
+def test_iter_results_reads_both_verdicts_in_the_window(results_table):
+    for day in range(10):
+        store(results_table, f"uploads/{day}.jpg", agreement=True, is_human=day % 2 == 0, days_ago=day)
+
+    since = datetime.utcnow() - timedelta(days=4, hours=12)
+    ids = {r["image_id"] for r in dynamodb_utils.iter_results(since=since, page_size=2)}
+    assert ids == {f"uploads/{day}.jpg" for day in range(5)}
@@ -0,0 +1,40 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import fanout
+from fanout import TIMEOUT, run_backends
+
+def sleeper(seconds, value):
+    def backend(payload):
+        time.sleep(seconds)
+        return value
+    return backend
+
+def test_deadline_starts_when_the_call_runs(monkeypatch):
+    # One thread: the second call waits for the first, which must not count against its deadline
+    monkeypatch.setattr(fanout, '_executor', ThreadPoolExecutor(max_workers=1))
+    results, timed_out = run_backends(
+        {"a": sleeper(0.2, 1), "b": sleeper(0.2, 2)}, None, timeouts={"a": 0.3, "b": 0.3}, budget=2
+    )
+
+    assert results == {"a": 1, "b": 2}
+    assert timed_out == []
+
+def test_queued_calls_are_still_bounded_by_the_budget(monkeypatch):
+    monkeypatch.setattr(fanout, '_executor', ThreadPoolExecutor(max_workers=1))
+    start = time.monotonic()
+    results, timed_out = run_backends(
+        {"a": sleeper(0.5, 1), "b": sleeper(0.1, 2)}, None, timeouts={"a": 0.2, "b": 0.2}, budget=0.3
+    )
+
+    assert results == {"a": TIMEOUT, "b": TIMEOUT}
+    assert sorted(timed_out) == ["a", "b"]
+    assert time.monotonic() - start < 0.45
+
+def test_failures_are_reported_as_errors():
+    def broken(payload):
+        raise RuntimeError("boom")
+
+    results, timed_out = run_backends({"a": broken, "b": sleeper(0, 0.5)}, None)
+    assert results == {"a": fanout.ERROR, "b": 0.5}
+    assert timed_out == []
@@ -0,0 +1,62 @@
+import struct
+import zlib
+
+import pytest
+
+import image_format
+import image_payload
+from image_payload import ImagePayload
+from utils import aws_clients
+
+BUCKET = "images-test"
+
+def png(width, height, size):
+    """PNG header bytes padded to `size`; only the header is ever sniffed."""
+    ihdr = struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)
+    chunk = struct.pack('>I', len(ihdr)) + b'IHDR' + ihdr + struct.pack('>I', zlib.crc32(b'IHDR' + ihdr))
+    data = b'\x89PNG\r\n\x1a\n' + chunk
+    return data + b'\0' * (size - len(data))
+
+@pytest.fixture
+def s3_gets(aws, monkeypatch):
+    """Uploads go to the mocked bucket; returns the arguments of every GetObject call."""
+    s3 = aws_clients.get_client('s3')
+    s3.create_bucket(Bucket=BUCKET)
+    calls = []
+    get_object = s3.get_object
+
+    def counting_get_object(**kwargs):
+        calls.append(kwargs)
+        return get_object(**kwargs)
+    monkeypatch.setattr(s3, 'get_object', counting_get_object)
+    monkeypatch.setattr(image_payload, 'get_client', lambda name: s3)
+    return s3, calls
+
+def test_object_is_validated_and_downloaded_in_one_get(s3_gets):
+    s3, calls = s3_gets
+    data = png(640, 480, 3 * image_format.SNIFF_BYTES)
+    s3.put_object(Bucket=BUCKET, Key="uploads/a.png", Body=data)
+
+    payload = ImagePayload.from_s3(BUCKET, "uploads/a.png")
+    info = payload.image_info()
+
+    assert (info.format, info.width, info.height) == ('png', 640, 480)
+    assert payload.get_bytes() == data
+    assert len(calls) == 1 and 'Range' not in calls[0]
+
+def test_rejected_object_is_not_kept(s3_gets):
+    s3, calls = s3_gets
+    s3.put_object(Bucket=BUCKET, Key="uploads/b.gif", Body=b'GIF89a' + b'\0' * image_format.SNIFF_BYTES)
+
+    payload = ImagePayload.from_s3(BUCKET, "uploads/b.gif")
+    with pytest.raises(image_format.UnsupportedFormat):
+        payload.image_info()
+    assert not payload.has_bytes
+    assert len(calls) == 1
+
+def test_empty_object_is_rejected(s3_gets):
+    s3, _ = s3_gets
+    s3.put_object(Bucket=BUCKET, Key="uploads/c.png", Body=b'')
+
+    with pytest.raises(image_format.UnsupportedFormat, match="empty"):
+        ImagePayload.from_s3(BUCKET, "uploads/c.png").image_info()
@@ -0,0 +1,107 @@
+import json
+import threading
+
+import pytest
+
+import image_processor
+from utils import dynamodb_utils, idempotency
+
+BUCKET = "images-test"
+
+@pytest.fixture
+def classified(monkeypatch):
+    """Replaces inference with a fixed verdict saved through the real (buffered) writer."""
+    calls = []
+
+    def classify_object(bucket_name, image_key):
+        calls.append(image_key)
+        result = {"image_id": image_key, "content_hash": "00" * 32, "confidence": 0.85, "agreement": True,
+                  "is_human": False, "timed_out": [], "sagemaker_result": "not_human", "sagemaker_score": 0.1}
+        return result, dynamodb_utils.save_classification_result(result)
+
+    monkeypatch.setattr(image_processor, 'classify_object', classify_object)
+    image_processor._unsettled.clear()
+    return calls
+
+@pytest.fixture
+def failing_writes(monkeypatch):
+    writer = dynamodb_utils._writer
+    monkeypatch.setattr(writer, '_write_batch', lambda items: [item["ImageKey"] for item in items])
+
+def claim_status(image_key):
+    return idempotency.get_status(idempotency.object_key(BUCKET, image_key))
+
+def sqs_event(*image_keys):
+    return {"Records": [
+        {
+            "messageId": f"m{position}",
+            "eventSource": "aws:sqs",
+            "body": json.dumps({"Records": [{"s3": {"bucket": {"name": BUCKET}, "object": {"key": key}}}]})
+        }
+        for position, key in enumerate(image_keys)
+    ]}
+
+def test_claim_is_completed_only_after_the_flush(results_table, claims_table, classified):
+    assert image_processor.process_object(BUCKET, "uploads/a.jpg")
+    # Buffered, not yet written: the claim must not say done
+    assert claim_status("uploads/a.jpg") == idempotency.IN_PROGRESS
+
+    assert image_processor.flush_and_measure() == []
+    assert claim_status("uploads/a.jpg") == idempotency.DONE
+    assert results_table.get_item(Key={"ImageKey": "uploads/a.jpg"}).get("Item")
+
+def test_failed_flush_releases_the_claim(results_table, claims_table, classified, failing_writes):
+    assert image_processor.process_object(BUCKET, "uploads/a.jpg")
+
+    assert image_processor.flush_and_measure() == ["uploads/a.jpg"]
+    assert claim_status("uploads/a.jpg") is None
+
+def test_redelivery_after_a_failed_flush_classifies_again(results_table, claims_table, classified, monkeypatch):
+    writer = dynamodb_utils._writer
+    write_batch = writer._write_batch
+    monkeypatch.setattr(writer, '_write_batch', lambda items: [item["ImageKey"] for item in items])
+
+    response = image_processor.lambda_handler(sqs_event("uploads/a.jpg", "uploads/b.jpg"), None)
+    assert sorted(f["itemIdentifier"] for f in response["batchItemFailures"]) == ["m0", "m1"]
+
+    monkeypatch.setattr(writer, '_write_batch', write_batch)
+    response = image_processor.lambda_handler(sqs_event("uploads/a.jpg"), None)
+    assert response == {"batchItemFailures": []}
+    # Messages in a batch run concurrently, so only the count per key is fixed
+    assert sorted(classified) == ["uploads/a.jpg", "uploads/a.jpg", "uploads/b.jpg"]
+    assert results_table.get_item(Key={"ImageKey": "uploads/a.jpg"}).get("Item")
+    assert claim_status("uploads/a.jpg") == idempotency.DONE
+
+def test_duplicate_delivery_is_skipped_once_done(results_table, claims_table, classified):
+    image_processor.lambda_handler(sqs_event("uploads/a.jpg"), None)
+    response = image_processor.lambda_handler(sqs_event("uploads/a.jpg"), None)
+
+    assert response == {"batchItemFailures": []}
+    assert classified == ["uploads/a.jpg"]
+
+def test_failed_classification_releases_the_claim_at_once(results_table, claims_table, monkeypatch):
+    def incomplete(bucket_name, image_key):
+        return {}, False
+    monkeypatch.setattr(image_processor, 'classify_object', incomplete)
+    image_processor._unsettled.clear()
+
+    assert not image_processor.process_object(BUCKET, "uploads/a.jpg")
+    assert claim_status("uploads/a.jpg") is None
+    assert image_processor._unsettled == []
+
+def test_busy_claim_is_waited_out_for_an_inline_classification(results_table, claims_table, classified):
+    key = idempotency.object_key(BUCKET, "uploads/a.jpg")
+    idempotency.claim(key, "api")
+    # The API's run finishes well past a few seconds but within its request budget
+    assert image_processor.BUSY_WAIT_SECONDS > image_processor.REQUEST_BUDGET_SECONDS
+    threading.Timer(0.3, idempotency.complete, (key, "api")).start()
+
+    assert image_processor.process_object(BUCKET, "uploads/a.jpg")
+    assert classified == []
+
+def test_claim_still_busy_after_the_wait_is_left_to_a_redelivery(results_table, claims_table, classified, monkeypatch):
+    monkeypatch.setattr(image_processor, 'BUSY_WAIT_SECONDS', 0.2)
+    idempotency.claim(idempotency.object_key(BUCKET, "uploads/a.jpg"), "api")
+
+    assert not image_processor.process_object(BUCKET, "uploads/a.jpg")
+    assert classified == []
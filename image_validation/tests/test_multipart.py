@@ -0,0 +1,68 @@
+import pytest
+
+from multipart import MultipartError, PartTooLarge, extract_file, iter_parts, parse_boundary
+
+BOUNDARY = "----form7MA4YWxk"
+CONTENT_TYPE = f"multipart/form-data; boundary={BOUNDARY}"
+
+def form(*parts, boundary=BOUNDARY):
+    body = b""
+    for name, filename, data in parts:
+        disposition = f'form-data; name="{name}"' + (f'; filename="{filename}"' if filename else "")
+        body += (f"--{boundary}\r\nContent-Disposition: {disposition}\r\n"
+                 f"Content-Type: application/octet-stream\r\n\r\n").encode() + data + b"\r\n"
+    return body + f"--{boundary}--\r\n".encode()
+
+def test_extracts_the_named_field_without_copying():
+    image = b"\xff\xd8\xff\xe0" + bytes(range(256)) * 4
+    body = form(("note", None, b"hello"), ("image", "a.jpg", image))
+
+    data = extract_file(body, CONTENT_TYPE, "image", len(image))
+    assert isinstance(data, memoryview)
+    assert data.obj is body
+    assert bytes(data) == image
+
+def test_part_data_may_contain_crlf_and_dashes():
+    image = b"\r\n--not-the-boundary\r\n--" + BOUNDARY.encode()[:-1]
+    body = form(("image", "a.jpg", image))
+
+    assert bytes(extract_file(body, CONTENT_TYPE, "image", 1024)) == image
+
+def test_yields_every_part_with_its_headers():
+    body = form(("a", None, b"1"), ("b", "b.png", b"22"))
+
+    parts = [(name, filename, headers["content-type"], bytes(data))
+             for name, filename, headers, data in iter_parts(body, BOUNDARY.encode(), 100)]
+    assert parts == [("a", None, "application/octet-stream", b"1"),
+                     ("b", "b.png", "application/octet-stream", b"22")]
+
+def test_missing_field_returns_none():
+    assert extract_file(form(("other", None, b"x")), CONTENT_TYPE, "image", 100) is None
+
+def test_raw_bodies_are_the_file():
+    body = b"\x89PNG\r\n\x1a\nrest"
+    assert bytes(extract_file(body, "image/png", "image", 100)) == body
+    with pytest.raises(PartTooLarge):
+        extract_file(body, "application/octet-stream", "image", 4)
+
+def test_oversized_part_is_rejected():
+    body = form(("image", "a.jpg", b"x" * 5000))
+    with pytest.raises(PartTooLarge):
+        extract_file(body, CONTENT_TYPE, "image", 1000)
+
+def test_quoted_boundary():
+    assert parse_boundary('multipart/form-data; boundary="a b"') == b"a b"
+
+@pytest.mark.parametrize("content_type", ["application/json", "multipart/form-data"])
+def test_rejects_non_multipart_or_missing_boundary(content_type):
+    with pytest.raises(MultipartError):
+        parse_boundary(content_type)
+
+@pytest.mark.parametrize("body", [
+    b"no boundary here",
+    f"--{BOUNDARY}\r\nContent-Disposition: form-data; name=\"image\"\r\n\r\nunterminated".encode(),
+    f"--{BOUNDARY}XX".encode(),
+])
+def test_malformed_bodies_are_rejected(body):
+    with pytest.raises(MultipartError):
+        extract_file(body, CONTENT_TYPE, "image", 1000)
@@ -0,0 +1,145 @@
+import io
+import gzip
+import random
+
+import pytest
+
+from utils import aws_clients, near_duplicate
+from utils.near_duplicate import MultiIndexHash
+
+BUCKET = "index-test"
+
+def test_index_finds_the_closest_hash_within_the_distance():
+    index = MultiIndexHash(chunks=3)
+    index.insert(0b1111, "a")
+    index.insert(0b1111 << 40, "b")
+
+    assert index.search(0b0111, 4)[:2] == ("a", 1)
+    assert index.search((0b1111 << 40) ^ 0b11, 4)[:2] == ("b", 2)
+    assert index.search(0b1111 << 20, 4) is None
+
+def test_snapshot_round_trip():
+    rng = random.Random(3)
+    index = MultiIndexHash(chunks=3)
+    for position in range(500):
+        index.insert(rng.getrandbits(64), f"{position:064x}")
+    buffer = io.BytesIO()
+    index.save(buffer)
+    buffer.seek(0)
+
+    loaded = MultiIndexHash.load(buffer)
+    assert list(loaded.hashes) == list(index.hashes)
+    assert loaded.search(index.hashes[7], 0)[0] == f"{7:064x}"
+
+@pytest.fixture
+def shared_index(aws, monkeypatch):
+    aws_clients.get_client('s3').create_bucket(Bucket=BUCKET)
+    monkeypatch.setattr(near_duplicate, 'PHASH_INDEX_BUCKET', BUCKET)
+    monkeypatch.setattr(near_duplicate, '_index', None)
+    monkeypatch.setattr(near_duplicate, '_pending', [])
+    monkeypatch.setattr(near_duplicate, '_pending_since', None)
+    monkeypatch.setattr(near_duplicate, '_early', [])
+    monkeypatch.setattr(near_duplicate, '_load_started', False)
+    monkeypatch.setattr(near_duplicate, '_load_failed_at', None)
+    monkeypatch.setattr(near_duplicate, '_loaded', near_duplicate.threading.Event())
+    return aws_clients.get_client('s3')
+
+def keys(s3):
+    return sorted(obj['Key'] for obj in s3.list_objects_v2(Bucket=BUCKET).get('Contents', []))
+
+def load_now():
+    near_duplicate._get_index(wait=0)
+    assert near_duplicate._loaded.wait(5)
+
+def test_persist_writes_only_new_entries_as_a_delta(shared_index):
+    load_now()
+    near_duplicate.remember(1, "aa" * 32)
+    near_duplicate.remember(2, "bb" * 32)
+    near_duplicate.persist()
+
+    (delta,) = [key for key in keys(shared_index) if key.startswith(near_duplicate.PHASH_DELTA_PREFIX)]
+    body = shared_index.get_object(Bucket=BUCKET, Key=delta)['Body'].read()
+    with gzip.GzipFile(fileobj=io.BytesIO(body)) as fp:
+        assert len(MultiIndexHash.load(fp)) == 2
+    assert near_duplicate._pending == []
+
+def test_load_merges_deltas_and_compacts_them(shared_index, monkeypatch):
+    monkeypatch.setattr(near_duplicate, 'PHASH_COMPACT_DELTAS', 2)
+    load_now()
+    for value in (1, 2):
+        near_duplicate.remember(value << 32, f"{value:064x}")
+        near_duplicate.persist()
+    assert len(keys(shared_index)) == 2
+
+    index = near_duplicate._read_snapshot()
+    assert len(index) == 2
+    assert keys(shared_index) == [near_duplicate.PHASH_INDEX_KEY]
+    assert len(near_duplicate._read_snapshot()) == 2
+
+def test_lookups_miss_instead_of_waiting_for_a_slow_load(shared_index, monkeypatch):
+    release = near_duplicate.threading.Event()
+    monkeypatch.setattr(near_duplicate, '_read_snapshot', lambda: release.wait(5) and MultiIndexHash())
+
+    assert near_duplicate.find_near_duplicate(1) is None
+    near_duplicate.remember(1, "aa" * 32)
+
+    release.set()
+    assert near_duplicate._loaded.wait(5)
+    # Entries remembered during the load are kept
+    assert near_duplicate.find_near_duplicate(1) == ("aa" * 32, 0)
+
+def test_flush_persists_once_enough_entries_are_pending(shared_index, monkeypatch):
+    monkeypatch.setattr(near_duplicate, 'PHASH_PERSIST_EVERY', 2)
+    load_now()
+    near_duplicate.remember(1, "aa" * 32)
+    near_duplicate.flush()
+    assert keys(shared_index) == []
+
+    near_duplicate.remember(2, "bb" * 32)
+    near_duplicate.flush()
+    assert len(keys(shared_index)) == 1
+    assert near_duplicate._pending == []
+
+def test_flush_persists_entries_that_have_waited_too_long(shared_index, monkeypatch):
+    monkeypatch.setattr(near_duplicate, 'PHASH_PERSIST_MAX_AGE_SECONDS', 0)
+    load_now()
+    near_duplicate.remember(1, "aa" * 32)
+    near_duplicate.flush()
+    assert len(keys(shared_index)) == 1
+
+def test_flush_can_wait_for_a_cold_load(shared_index, monkeypatch):
+    release = near_duplicate.threading.Event()
+    monkeypatch.setattr(near_duplicate, '_read_snapshot', lambda: release.wait(5) and MultiIndexHash())
+    near_duplicate._get_index(wait=0)
+
+    near_duplicate.threading.Timer(0.1, release.set).start()
+    near_duplicate.flush(wait_for_load=True)
+    assert near_duplicate._index is not None
+
+def test_a_failed_load_is_retried_instead_of_leaving_the_index_empty(shared_index, monkeypatch):
+    monkeypatch.setattr(near_duplicate, 'PHASH_LOAD_RETRY_SECONDS', 0)
+    snapshots = iter([RuntimeError("read timed out"), MultiIndexHash()])
+
+    def read_snapshot():
+        snapshot = next(snapshots)
+        if isinstance(snapshot, Exception):
+            raise snapshot
+        return snapshot
+    monkeypatch.setattr(near_duplicate, '_read_snapshot', read_snapshot)
+
+    near_duplicate.remember(1, "aa" * 32)
+    for _ in range(50):
+        if not near_duplicate._load_started:
+            break
+        near_duplicate.time.sleep(0.01)
+    assert near_duplicate._index is None
+
+    load_now()
+    assert near_duplicate.find_near_duplicate(1) == ("aa" * 32, 0)
+
+def test_an_unset_index_bucket_fails_loudly(monkeypatch):
+    monkeypatch.setattr(near_duplicate, 'PHASH_INDEX_BUCKET', '')
+    if near_duplicate.Image is None:
+        pytest.skip("Pillow is not installed")
+    with pytest.raises(RuntimeError):
+        near_duplicate.is_enabled()
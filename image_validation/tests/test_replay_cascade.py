@@ -0,0 +1,24 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'tools'))
+
+from replay_cascade import replay
+
+def result(sagemaker, rekognition=None):
+    stored = {"sagemaker_score": sagemaker, "backends_run": ["sagemaker"]}
+    if rekognition is not None:
+        stored.update({"rekognition_score": rekognition, "backends_run": ["rekognition", "sagemaker"]})
+    return stored
+
+def test_results_without_an_onnx_score_are_eligible():
+    report = replay([result(0.95, 0.9), result(0.05, 0.9), result(0.5, 0.2)], "sagemaker", 0.3, 0.9)
+
+    assert report["eligible_results"] == 3
+    assert report["second_backend_calls_skipped"] == 2
+    assert report["verdicts_changed"] == 1
+
+def test_results_with_only_the_primary_are_skipped():
+    report = replay([result(0.95), result(0.95, 0.9)], "sagemaker", 0.3, 0.9)
+
+    assert report["eligible_results"] == 1
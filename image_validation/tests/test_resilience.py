@@ -0,0 +1,101 @@
+import time
+
+from fanout import TIMEOUT
+from resilience import CircuitBreaker, ResilientBackend, UNAVAILABLE
+
+def open_breaker(reset_timeout=0.05):
+    breaker = CircuitBreaker("test", failure_threshold=2, reset_timeout=reset_timeout)
+    breaker.record_failure()
+    breaker.record_failure()
+    return breaker
+
+def test_opens_after_consecutive_failures():
+    breaker = CircuitBreaker("test", failure_threshold=2, reset_timeout=60)
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+
+def test_lets_one_probe_through_after_the_reset_timeout():
+    breaker = open_breaker()
+    time.sleep(0.06)
+
+    assert breaker.allow()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert not breaker.allow()
+
+def test_successful_probe_closes():
+    breaker = open_breaker()
+    time.sleep(0.06)
+    breaker.allow()
+    breaker.record_success()
+
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow()
+
+def test_failed_probe_reopens_for_another_timeout():
+    breaker = open_breaker()
+    time.sleep(0.06)
+    breaker.allow()
+    breaker.record_failure()
+
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+
+def test_shed_probe_lets_the_next_call_probe():
+    breaker = open_breaker()
+    time.sleep(0.06)
+    breaker.allow()
+    breaker.record_shed()
+
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.allow()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+
+def test_shed_outside_a_probe_changes_nothing():
+    breaker = CircuitBreaker("test", failure_threshold=2, reset_timeout=60)
+    breaker.record_shed()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+def scripted(*outcomes):
+    outcomes = list(outcomes)
+    calls = []
+
+    def backend(payload):
+        calls.append(payload)
+        return outcomes.pop(0)
+    return backend, calls
+
+def test_backend_shed_during_a_probe_does_not_wedge_the_breaker():
+    backend, calls = scripted(UNAVAILABLE, 0.9)
+    wrapped = ResilientBackend("test", backend, hedge=False, breaker=open_breaker(), timeout=1)
+    time.sleep(0.06)
+
+    assert wrapped("a") == UNAVAILABLE
+    assert wrapped.breaker.state == CircuitBreaker.OPEN
+    # The reset timeout has already passed, so the next call probes straight away
+    assert wrapped("b") == 0.9
+    assert wrapped.breaker.state == CircuitBreaker.CLOSED
+    assert calls == ["a", "b"]
+
+def test_open_circuit_skips_the_backend():
+    backend, calls = scripted()
+    wrapped = ResilientBackend("test", backend, hedge=False, breaker=open_breaker(reset_timeout=60))
+
+    assert wrapped("a") == UNAVAILABLE
+    assert calls == []
+
+def test_slow_backend_times_out_and_counts_as_a_failure():
+    def slow(payload):
+        time.sleep(0.2)
+        return 0.5
+    wrapped = ResilientBackend("test", slow, hedge=False, timeout=0.05,
+                               breaker=CircuitBreaker("test", failure_threshold=1, reset_timeout=60))
+
+    assert wrapped("a") == TIMEOUT
+    assert wrapped.breaker.state == CircuitBreaker.OPEN
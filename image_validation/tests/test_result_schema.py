@@ -0,0 +1,96 @@
+from decimal import Decimal
+
+import pytest
+
+from utils import result_schema
+
+STORED_AT = 1717243200.123  # 2024-06-01T12:00:00.123Z
+
+def make_result(**overrides):
+    result = {
+        "image_id": "uploads/a.jpg",
+        "content_hash": "ab" * 32,
+        "sagemaker_result": "human",
+        "sagemaker_score": 0.912345678,
+        "rekognition_result": "not_human",
+        "rekognition_score": 0.25,
+        "agreement": False,
+        "confidence": 0.5,
+        "is_human": True,
+        "timed_out": [],
+        "unavailable": [],
+        "backends_run": ["rekognition", "sagemaker"]
+    }
+    result.update(overrides)
+    return result
+
+def test_round_trip_keeps_every_field():
+    item = result_schema.encode(make_result(), stored_at=STORED_AT)
+    decoded = result_schema.decode(item)
+
+    expected = make_result(sagemaker_score=0.9123, timestamp="2024-06-01T12:00:00.123")
+    assert decoded == expected
+
+def test_index_keys_are_sharded_by_day():
+    item = result_schema.encode(make_result(), stored_at=STORED_AT)
+
+    assert item["hd"] == "1#2024-06-01"
+    assert item["ag"] == "0#2024-06-01"
+    assert item["ts"] == 1717243200123
+
+def test_agreement_is_absent_when_fewer_than_two_backends_answered():
+    result = make_result(agreement=None, rekognition_result=None, rekognition_score=None,
+                         backends_run=["sagemaker"])
+    item = result_schema.encode(result, stored_at=STORED_AT)
+
+    assert "ag" not in item
+    assert "rekognition" not in item["b"]
+    decoded = result_schema.decode(item)
+    assert decoded["agreement"] is None
+    assert "rekognition_result" not in decoded
+
+def test_failures_and_timeouts_round_trip():
+    result = make_result(sagemaker_result="timeout", sagemaker_score=None,
+                         rekognition_result="unavailable", rekognition_score=None,
+                         agreement=None, timed_out=["sagemaker"], unavailable=["rekognition"])
+    item = result_schema.encode(result, stored_at=STORED_AT)
+
+    assert item["b"] == {"sagemaker": ["t"], "rekognition": ["u"]}
+    assert item["to"] == ["sagemaker"]
+    decoded = result_schema.decode(item)
+    assert decoded["sagemaker_result"] == "timeout"
+    assert decoded["timed_out"] == ["sagemaker"]
+    assert decoded["unavailable"] == ["rekognition"]
+
+def test_unknown_fields_are_kept_verbatim():
+    item = result_schema.encode(make_result(fallback="onnx", extra={"ratio": 0.5}), stored_at=STORED_AT)
+
+    assert item["x"] == {"fallback": "onnx", "extra": {"ratio": Decimal("0.5")}}
+    decoded = result_schema.decode(item)
+    assert decoded["fallback"] == "onnx"
+    assert decoded["extra"] == {"ratio": 0.5}
+
+@pytest.mark.parametrize("flag, agreement", [("1", True), ("0", False)])
+def test_version_2_items_with_an_unsharded_agreement_decode(flag, agreement):
+    item = result_schema.encode(make_result(), stored_at=STORED_AT)
+    item.update({"v": 2, "ag": flag})
+
+    assert result_schema.decode(item)["agreement"] is agreement
+
+def test_unversioned_items_decode_as_written():
+    item = {"image_id": "uploads/old.jpg", "confidence": Decimal("0.85"), "is_human": False}
+
+    assert result_schema.decode(item) == {"image_id": "uploads/old.jpg", "confidence": 0.85, "is_human": False}
+
+def test_newer_versions_are_rejected():
+    item = result_schema.encode(make_result(), stored_at=STORED_AT)
+    item["v"] = result_schema.SCHEMA_VERSION + 1
+
+    with pytest.raises(ValueError):
+        result_schema.decode(item)
+
+def test_dynamodb_number_conversion_round_trips():
+    value = {"a": 1.5, "b": [2, 0.25], "c": "s"}
+
+    assert result_schema.to_dynamodb(value) == {"a": Decimal("1.5"), "b": [2, Decimal("0.25")], "c": "s"}
+    assert result_schema.from_dynamodb(result_schema.to_dynamodb(value)) == value
@@ -0,0 +1,283 @@
+"""Exports classification results to gzipped JSON-lines or Parquet shards for analysis.
+
+A full export is a DynamoDB parallel scan: the table is split into
+--segments segments, each read by its own worker (threads by default,
+processes with --processes when decoding rather than DynamoDB is the
+bottleneck). An incremental export (--since) reads only the results stored
+since then, one HumanDay index partition per worker, without a scan.
+
+Every segment or partition streams into its own shards, one page at a time,
+so memory stays bounded by a page plus a Parquet row group per worker.
+Shards are written under a .part name and renamed when complete, and each
+completed shard checkpoints the segment's position in _checkpoints/. Rerun
+the same command after a failure to resume; unfinished shards are discarded
+and re-read, so the output has every result exactly once.
+
+When the export finishes, manifest.json lists the shards, the row count and
+`until`; pass that as --since for the next incremental export.
+
+Usage:
+    python tools/export_results.py --table <results-table> --output exports/full --segments 16
+    python tools/export_results.py --table <results-table> --output exports/june \\
+        --since 2024-06-01T00:00:00 --format parquet
+    python tools/export_results.py --table results --output out --endpoint-url http://localhost:8000
+
+Parquet needs pyarrow (pip install pyarrow).
+"""
+import os
+import sys
+import glob
+import gzip
+import json
+import time
+import random
+import argparse
+from datetime import datetime, timedelta, timezone
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'infra'))
+
+from utils import result_schema
+from utils.aws_clients import get_table
+from utils.dynamodb_utils import HUMAN_DAY_INDEX
+
+# Shards are closed at the first page boundary past this many rows
+SHARD_ROWS = 250000
+ROW_GROUP_ROWS = 50000
+MAX_RETRIES = 8
+THROTTLE_CODES = {'ProvisionedThroughputExceededException', 'ThrottlingException', 'RequestLimitExceeded'}
+
+CHECKPOINT_DIR = '_checkpoints'
+EXPORT_FILE = '_export.json'
+MANIFEST_FILE = 'manifest.json'
+
+# Parquet columns; JSON-lines rows carry the same fields plus any extras
+LIST_COLUMNS = ['timed_out', 'unavailable', 'backends_run']
+
+def parquet_schema():
+    import pyarrow as pa
+
+    fields = [
+        ('image_id', pa.string()),
+        ('timestamp', pa.string()),
+        ('is_human', pa.bool_()),
+        ('agreement', pa.bool_()),
+        ('confidence', pa.float64()),
+        ('content_hash', pa.string())
+    ]
+    for name in result_schema.BACKEND_NAMES:
+        fields += [(f'{name}_result', pa.string()), (f'{name}_score', pa.float64())]
+    fields += [(column, pa.list_(pa.string())) for column in LIST_COLUMNS]
+    return pa.schema(fields)
+
+def _write_json(path, value):
+    # Atomic, so a crash never leaves a truncated checkpoint behind
+    partial = f"{path}.tmp"
+    with open(partial, 'w') as f:
+        json.dump(value, f)
+    os.replace(partial, path)
+
+def _read_json(path):
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+class ShardWriter:
+    """Writes one shard under a .part name, renamed into place by `close()`."""
+
+    def __init__(self, path, fmt, row_group_rows=ROW_GROUP_ROWS):
+        self.path = path
+        self.partial = f"{path}.part"
+        self.fmt = fmt
+        self.row_group_rows = row_group_rows
+        self.rows = 0
+        self._buffer = []
+        if fmt == 'parquet':
+            import pyarrow.parquet as pq
+
+            self._schema = parquet_schema()
+            self._file = pq.ParquetWriter(self.partial, self._schema, compression='zstd')
+        else:
+            self._file = gzip.open(self.partial, 'wt', compresslevel=6)
+
+    def write(self, rows):
+        self.rows += len(rows)
+        if self.fmt != 'parquet':
+            self._file.writelines(json.dumps(row, separators=(',', ':')) + '\n' for row in rows)
+            return
+        self._buffer.extend(rows)
+        if len(self._buffer) >= self.row_group_rows:
+            self._flush_row_group()
+
+    def _flush_row_group(self):
+        import pyarrow as pa
+
+        if self._buffer:
+            self._file.write_table(pa.Table.from_pylist(self._buffer, schema=self._schema))
+            self._buffer = []
+
+    def close(self):
+        if self.fmt == 'parquet':
+            self._flush_row_group()
+        self._file.close()
+        os.replace(self.partial, self.path)
+
+def _read_page(unit, start_key, page_size):
+    kwargs = {}
+    if start_key:
+        kwargs["ExclusiveStartKey"] = start_key
+    if page_size:
+        kwargs["Limit"] = page_size
+    table = get_table(unit["table"])
+    if unit["kind"] == "scan":
+        return table.scan(Segment=unit["segment"], TotalSegments=unit["total_segments"], **kwargs)
+
+    from boto3.dynamodb.conditions import Key
+    return table.query(
+        IndexName=HUMAN_DAY_INDEX,
+        KeyConditionExpression=Key('hd').eq(unit["partition"]) & Key('ts').between(unit["since_ms"], unit["until_ms"]),
+        **kwargs
+    )
+
+def _read_page_with_retries(unit, start_key, page_size):
+    # The client already retries throttling; this rides out longer throttling without losing the segment
+    for attempt in range(MAX_RETRIES + 1):
+        try:
+            return _read_page(unit, start_key, page_size)
+        except Exception as e:
+            code = getattr(e, 'response', {}).get('Error', {}).get('Code')
+            if code not in THROTTLE_CODES or attempt == MAX_RETRIES:
+                raise
+            time.sleep(random.uniform(0, min(20.0, 0.5 * (2 ** attempt))))
+
+def export_unit(unit, options):
+    """Exports one scan segment or index partition, resuming from its checkpoint. Returns its stats."""
+    output, fmt = options["output"], options["format"]
+    checkpoint_path = os.path.join(output, CHECKPOINT_DIR, f"{unit['id']}.json")
+    state = _read_json(checkpoint_path) or {"key": None, "shard": 0, "rows": 0, "shards": [], "done": False}
+    if state["done"]:
+        return {"id": unit["id"], "rows": state["rows"], "shards": state["shards"], "pages": 0}
+
+    # Shards unfinished at the last checkpoint are read again from there
+    for partial in glob.glob(os.path.join(output, f"{unit['id']}-*.part")):
+        os.remove(partial)
+
+    extension = '.parquet' if fmt == 'parquet' else '.jsonl.gz'
+    writer, key, pages = None, state["key"], 0
+    while True:
+        response = _read_page_with_retries(unit, key, options["page_size"])
+        pages += 1
+        items = response.get("Items", [])
+        if items:
+            if writer is None:
+                name = f"{unit['id']}-{state['shard']:05d}{extension}"
+                writer = ShardWriter(os.path.join(output, name), fmt, options["row_group_rows"])
+            writer.write([result_schema.decode(item) for item in items])
+
+        key = response.get("LastEvaluatedKey")
+        if key is None or (writer is not None and writer.rows >= options["shard_rows"]):
+            if writer is not None:
+                writer.close()
+                state["rows"] += writer.rows
+                state["shards"].append(os.path.basename(writer.path))
+                state["shard"] += 1
+                writer = None
+            state["key"] = result_schema.from_dynamodb(key) if key else None
+            state["done"] = key is None
+            _write_json(checkpoint_path, state)
+            if key is None:
+                return {"id": unit["id"], "rows": state["rows"], "shards": state["shards"], "pages": pages}
+
+def _utc(moment):
+    return moment.replace(tzinfo=timezone.utc) if moment.tzinfo is None else moment
+
+def plan_units(table, segments, since=None, until=None):
+    """The export's units of work: scan segments, or HumanDay partitions when `since` is given."""
+    if since is None:
+        return [
+            {"id": f"segment-{segment:04d}", "kind": "scan", "table": table,
+             "segment": segment, "total_segments": segments}
+            for segment in range(segments)
+        ]
+
+    since_ms = int(_utc(since).timestamp() * 1000)
+    until_ms = int(_utc(until).timestamp() * 1000)
+    units = []
+    day = _utc(since).replace(hour=0, minute=0, second=0, microsecond=0)
+    while day <= _utc(until):
+        for is_human in (True, False):
+            partition = result_schema.human_day(is_human, day.strftime('%Y-%m-%d'))
+            units.append({"id": f"day-{partition.replace('#', '-')}", "kind": "query", "table": table,
+                          "partition": partition, "since_ms": since_ms, "until_ms": until_ms})
+        day += timedelta(days=1)
+    return units
+
+def run_export(table, output, segments=8, workers=None, processes=False, fmt='jsonl', since=None,
+               shard_rows=SHARD_ROWS, row_group_rows=ROW_GROUP_ROWS, page_size=None):
+    """Runs (or resumes) an export into `output` and returns its manifest."""
+    os.makedirs(os.path.join(output, CHECKPOINT_DIR), exist_ok=True)
+
+    # The window and the way the table is split are fixed by the first run, so a resume matches it
+    settings = {"table": table, "segments": segments, "format": fmt,
+                "since": since.isoformat() if since else None,
+                "until": datetime.now(timezone.utc).isoformat()}
+    existing = _read_json(os.path.join(output, EXPORT_FILE))
+    if existing is not None:
+        changed = [name for name in ("table", "segments", "format", "since") if existing[name] != settings[name]]
+        if changed:
+            raise ValueError(f"{output} holds an export with different {', '.join(changed)}; use a new output directory")
+        settings = existing
+    else:
+        _write_json(os.path.join(output, EXPORT_FILE), settings)
+
+    until = datetime.fromisoformat(settings["until"])
+    units = plan_units(table, segments, since, until)
+    options = {"output": output, "format": fmt, "shard_rows": shard_rows,
+               "row_group_rows": row_group_rows, "page_size": page_size}
+
+    start = time.perf_counter()
+    pool_class = ProcessPoolExecutor if processes else ThreadPoolExecutor
+    with pool_class(max_workers=workers or min(len(units), 32)) as pool:
+        stats = list(pool.map(export_unit, units, [options] * len(units)))
+    elapsed = time.perf_counter() - start
+
+    manifest = {
+        "table": table,
+        "format": fmt,
+        "since": settings["since"],
+        "until": settings["until"],
+        "rows": sum(s["rows"] for s in stats),
+        "shards": sorted(shard for s in stats for shard in s["shards"]),
+        "units": len(units),
+        "pages": sum(s["pages"] for s in stats),
+        "seconds": round(elapsed, 2)
+    }
+    _write_json(os.path.join(output, MANIFEST_FILE), manifest)
+    return manifest
+
+def main():
+    parser = argparse.ArgumentParser(description="Export classification results to JSON-lines or Parquet shards")
+    parser.add_argument("--table", required=True, help="DynamoDB results table")
+    parser.add_argument("--output", required=True, help="Output directory; rerun with the same one to resume")
+    parser.add_argument("--segments", type=int, default=8, help="Parallel scan segments")
+    parser.add_argument("--workers", type=int, help="Concurrent segments (default: all, up to 32)")
+    parser.add_argument("--processes", action="store_true", help="Run segments in processes instead of threads")
+    parser.add_argument("--format", choices=["jsonl", "parquet"], default="jsonl")
+    parser.add_argument("--since", type=datetime.fromisoformat,
+                        help="Only results stored since then (UTC unless an offset is given), read from the index")
+    parser.add_argument("--shard-rows", type=int, default=SHARD_ROWS)
+    parser.add_argument("--page-size", type=int, help="Items per request (default: DynamoDB's 1 MB pages)")
+    parser.add_argument("--endpoint-url", help="DynamoDB endpoint, e.g. DynamoDB Local")
+    args = parser.parse_args()
+
+    if args.endpoint_url:
+        os.environ['AWS_ENDPOINT_URL'] = args.endpoint_url
+
+    manifest = run_export(args.table, args.output, args.segments, args.workers, args.processes, args.format,
+                          args.since, shard_rows=args.shard_rows, page_size=args.page_size)
+    print(f"Exported {manifest['rows']} results to {len(manifest['shards'])} shards in {manifest['seconds']} s; "
+          f"next incremental export: --since {manifest['until']}")
+
+if __name__ == "__main__":
+    main()
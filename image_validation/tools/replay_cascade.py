@@ -0,0 +1,95 @@
+"""Replays stored classification results through the cascade policy offline.
+
+Reports how many second-backend calls the cascade would have skipped and
+how often its early-exit verdict would differ from the full fan-out
+verdict. Only results where the primary and at least one other backend
+recorded raw scores are used, and the full verdict is taken over the
+backends that ran for that result (its `backends_run`).
+
+Results are read from the table's HumanDay index for a time window (the
+last 7 days by default), never by scanning the whole table.
+
+Usage:
+    python tools/replay_cascade.py --table <results-table> --primary sagemaker --low 0.3 --high 0.9
+    python tools/replay_cascade.py --table <results-table> --since 2024-05-01 --until 2024-05-31
+    python tools/replay_cascade.py --jsonl results.jsonl --sweep
+"""
+import os
+import sys
+import json
+import argparse
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'infra'))
+
+import classifier
+from utils import dynamodb_utils
+
+def query_table(table_name, since, until):
+    dynamodb_utils.TABLE_NAME = table_name
+    return dynamodb_utils.iter_results(since, until)
+
+def read_jsonl(path):
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+def replay(results, primary, low, high):
+    eligible = skipped = changed = 0
+    for result in results:
+        # Not every backend runs for every result (e.g. onnx), so compare against those that did
+        ran = result.get("backends_run") or classifier.BACKENDS
+        scores = {name: result.get(f"{name}_score") for name in ran}
+        scores = {name: score for name, score in scores.items() if score is not None}
+        if primary not in scores or len(scores) < 2:
+            continue
+        eligible += 1
+
+        primary_score = float(scores[primary])
+        if classifier.is_ambiguous(primary_score, low, high):
+            continue
+        skipped += 1
+
+        full_verdict = any(classifier.to_label(float(score)) == "human" for score in scores.values())
+        if (classifier.to_label(primary_score) == "human") != full_verdict:
+            changed += 1
+
+    return {
+        "primary": primary,
+        "band": [low, high],
+        "eligible_results": eligible,
+        "second_backend_calls_skipped": skipped,
+        "skip_rate": round(skipped / eligible, 4) if eligible else 0.0,
+        "verdicts_changed": changed,
+        "change_rate": round(changed / eligible, 4) if eligible else 0.0
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Estimate cascade savings from stored results")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--table", help="DynamoDB results table to query")
+    source.add_argument("--jsonl", help="JSON-lines export of results")
+    parser.add_argument("--primary", default=classifier.CASCADE_PRIMARY, choices=sorted(classifier.BACKENDS))
+    parser.add_argument("--low", type=float, default=classifier.CASCADE_BAND_LOW)
+    parser.add_argument("--high", type=float, default=classifier.CASCADE_BAND_HIGH)
+    parser.add_argument("--sweep", action="store_true", help="Evaluate a grid of ambiguity bands")
+    parser.add_argument("--since", type=datetime.fromisoformat, help="Start of the window (UTC), with --table")
+    parser.add_argument("--until", type=datetime.fromisoformat, help="End of the window (UTC), with --table")
+    args = parser.parse_args()
+
+    results = list(query_table(args.table, args.since, args.until) if args.table else read_jsonl(args.jsonl))
+
+    if not args.sweep:
+        print(json.dumps(replay(results, args.primary, args.low, args.high), indent=2))
+        return
+
+    lows = [0.1, 0.2, 0.3, 0.4, 0.5]
+    highs = [0.7, 0.8, 0.9, 0.95]
+    report = [replay(results, args.primary, low, high) for low in lows for high in highs if low < high]
+    for row in report:
+        print(f"band {row['band']}: skips {row['skip_rate']:.1%} of second calls, changes {row['change_rate']:.2%} of verdicts")
+    print(json.dumps(report))
+
+if __name__ == "__main__":
+    main()
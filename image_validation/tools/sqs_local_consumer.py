@@ -0,0 +1,75 @@
+"""Drives image_processor.lambda_handler from a local SQS stand-in (ElasticMQ or moto server).
+
+Emulates the Lambda event source mapping: receives up to --batch-size
+messages, wraps them in an SQS event, invokes the handler and deletes only
+the messages not listed in batchItemFailures.
+
+Usage:
+    AWS_ENDPOINT_URL=http://localhost:4566 TABLE_NAME=results \\
+        python tools/sqs_local_consumer.py --queue-url http://localhost:9324/000000000000/uploads
+"""
+import os
+import sys
+import time
+import uuid
+import boto3
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'infra'))
+
+def to_lambda_record(message, queue_arn):
+    return {
+        "messageId": message["MessageId"],
+        "receiptHandle": message["ReceiptHandle"],
+        "body": message["Body"],
+        "attributes": message.get("Attributes", {}),
+        "messageAttributes": {},
+        "eventSource": "aws:sqs",
+        "eventSourceARN": queue_arn
+    }
+
+class LocalContext:
+    def __init__(self):
+        self.aws_request_id = str(uuid.uuid4())
+
+def main():
+    parser = argparse.ArgumentParser(description="Local SQS batch consumer for the image processor")
+    parser.add_argument("--queue-url", required=True)
+    parser.add_argument("--endpoint-url", default=os.environ.get("SQS_ENDPOINT_URL", "http://localhost:9324"))
+    parser.add_argument("--batch-size", type=int, default=10)
+    parser.add_argument("--wait-seconds", type=int, default=5)
+    parser.add_argument("--once", action="store_true", help="Process a single batch and exit")
+    args = parser.parse_args()
+
+    import image_processor
+
+    sqs = boto3.client("sqs", endpoint_url=args.endpoint_url)
+    queue_arn = sqs.get_queue_attributes(
+        QueueUrl=args.queue_url, AttributeNames=["QueueArn"]
+    )["Attributes"]["QueueArn"]
+
+    while True:
+        messages = sqs.receive_message(
+            QueueUrl=args.queue_url,
+            MaxNumberOfMessages=min(args.batch_size, 10),
+            WaitTimeSeconds=args.wait_seconds,
+            AttributeNames=["All"]
+        ).get("Messages", [])
+
+        if messages:
+            event = {"Records": [to_lambda_record(m, queue_arn) for m in messages]}
+            start = time.perf_counter()
+            response = image_processor.lambda_handler(event, LocalContext())
+            failed = {f["itemIdentifier"] for f in response.get("batchItemFailures", [])}
+
+            for message in messages:
+                if message["MessageId"] not in failed:
+                    sqs.delete_message(QueueUrl=args.queue_url, ReceiptHandle=message["ReceiptHandle"])
+
+            print(f"batch={len(messages)} failed={len(failed)} elapsed={time.perf_counter() - start:.3f}s")
+
+        if args.once:
+            break
+
+if __name__ == "__main__":
+    main()